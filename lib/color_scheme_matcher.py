@@ -27,12 +27,15 @@ from __future__ import absolute_import
 import sublime
 import codecs
 import re
-from .file_strip.json import sanitize_json
+import time
+from .file_strip.json import load_json
 from .st_colormod import Color
+from .rgba import RGBA
 from .tmtheme import ColorSRGBX11
+from .tmtheme_reader import read_tmtheme
+from . import scheme_cache
 from os import path
 from collections import namedtuple
-from plistlib import readPlistFromBytes
 
 NEW_SCHEMES = int(sublime.version()) >= 3150
 FONT_STYLE = "font_style" if int(sublime.version()) >= 3151 else "fontStyle"
@@ -41,14 +44,14 @@ GLOBAL_OPTIONS = "globals" if int(sublime.version()) >= 3152 else "defaults"
 CONVERT_TURN = 360
 CONVERT_GRAD = 90 / 100
 
-# XML
-XML_COMMENT_RE = re.compile(br"^[\r\n\s]*<!--[\s\S]*?-->[\s\r\n]*|<!--[\s\S]*?-->")
-
 RE_CAMEL_CASE = re.compile('[A-Z]')
 
 HEX = {"hex": True, "alpha": True}
 HEX_NA = {"hex": True, "alpha": False}
 
+# Bump when the `tmTheme` conversion changes so cached conversions are redone.
+CONVERT_VERSION = "1"
+
 
 def packages_path(pth):
     """Get packages path."""
@@ -62,6 +65,12 @@ def to_snake(m):
     return '_' + m.group(0).lower()
 
 
+def tmtheme_digest(content):
+    """Get the cache key for `tmTheme` content (the conversion also depends on the Sublime version)."""
+
+    return scheme_cache.content_hash(content, CONVERT_VERSION, GLOBAL_OPTIONS, FONT_STYLE)
+
+
 def sublime_format_path(pth):
     """Format path for sublime internal use."""
 
@@ -71,27 +80,97 @@ def sublime_format_path(pth):
     return pth.replace("\\", "/")
 
 
+def convert_tmtheme_setting(scheme, item):
+    """Convert a `tmTheme` settings entry to the new format, adding it to the scheme."""
+
+    if item.get('scope', None) is None and item.get('name', None) is None:
+        for k, v in item["settings"].items():
+            try:
+                v = ColorSRGBX11(v).to_string(hex=True)
+            except Exception:
+                pass
+            scheme[GLOBAL_OPTIONS][RE_CAMEL_CASE.sub(to_snake, k)] = v
+    if 'settings' in item and item.get('scope') is not None:
+        rule = {}
+        name = item.get('name')
+        if name is not None:
+            rule['name'] = name
+        scope = item.get('scope')
+        if scope is not None:
+            rule["scope"] = scope
+        fg = item['settings'].get('foreground')
+        if fg is not None:
+            rule['foreground'] = ColorSRGBX11(fg).to_string(hex=True)
+        bg = item['settings'].get('background')
+        if bg is not None:
+            rule['background'] = ColorSRGBX11(bg).to_string(hex=True)
+        selfg = item["settings"].get("selectionForeground")
+        if selfg is not None:
+            rule["selection_foreground"] = ColorSRGBX11(selfg).to_string(hex=True)
+        font_style = item["settings"].get('fontStyle')
+        if font_style is not None:
+            rule[FONT_STYLE] = font_style
+        scheme['rules'].append(rule)
+
+
+def convert_tmtheme(source):
+    """Read `tmTheme` bytes or binary file object straight into the new format."""
+
+    scheme = {
+        "variables": {},
+        GLOBAL_OPTIONS: {},
+        "rules": []
+    }
+
+    for k, v in read_tmtheme(source, lambda item: convert_tmtheme_setting(scheme, item)).items():
+        scheme[k] = v
+    return scheme
+
+
+def load_converted_tmtheme(resource, content, cache_dir=None, digest=None):
+    """
+    Get `tmTheme` content in the new format, using (and filling) the converted scheme cache if given a cache folder.
+
+    `digest` is the content's `tmtheme_digest`, if already known.
+    """
+
+    if cache_dir is None:
+        return convert_tmtheme(content)
+
+    if digest is None:
+        digest = tmtheme_digest(content)
+    obj = scheme_cache.load(cache_dir, resource, digest)
+    if obj is not None:
+        return obj
+
+    obj = convert_tmtheme(content)
+    try:
+        scheme_cache.save(cache_dir, resource, digest, obj)
+    except Exception:
+        pass
+    return obj
+
+
 class SchemeColors(
     namedtuple(
         'SchemeColors',
         [
             'fg', 'fg_simulated', 'bg', "bg_simulated", "style", "color_gradient",
             "fg_selector", "bg_selector", "style_selectors", "color_gradient_selector"
-        ],
-        verbose=False
+        ]
     )
 ):
     """Scheme colors."""
 
 
-class SchemeSelectors(namedtuple('SchemeSelectors', ['name', 'scope'], verbose=False)):
+class SchemeSelectors(namedtuple('SchemeSelectors', ['name', 'scope'])):
     """Scheme selectors."""
 
 
 class ColorSchemeMatcher(object):
     """Determine color scheme colors and style for text in a Sublime view buffer."""
 
-    def __init__(self, scheme_file, color_filter=None):
+    def __init__(self, scheme_file, color_filter=None, cache_dir=None, track_stats=False):
         """Initialize."""
         if color_filter is None:
             color_filter = self.filter
@@ -109,21 +188,58 @@ class ColorSchemeMatcher(object):
             try:
                 content = sublime.load_binary_resource(sublime_format_path(self.color_scheme))
             except IOError:
+                content = None
+            self.legacy = True
+            if content is None:
                 # Fallback if file was created manually and not yet found in resources
                 with open(packages_path(self.color_scheme), 'rb') as f:
-                    content = f.read()
-            self.legacy = True
-            self.convert_format(readPlistFromBytes(XML_COMMENT_RE.sub(b'', content)))
+                    self.read_tmtheme(f)
+            else:
+                self.load_tmtheme(content, cache_dir)
         self.overrides = []
         if NEW_SCHEMES:
             self.merge_overrides()
         self.scheme_file = scheme_file
         self.matched = {}
         self.variables = {}
+        self.track_stats = track_stats
+        self.reset_stats()
         self.parse_scheme()
         self.scheme_obj = color_filter(self.scheme_obj)
         self.setup_matcher()
 
+    @classmethod
+    def cache_tmthemes(cls, cache_dir, resources=None):
+        """Convert and cache the `tmTheme` resources that aren't cached yet, and return how many were converted."""
+
+        if resources is None:
+            resources = sublime.find_resources('*.tmTheme')
+        count = 0
+        for resource in resources:
+            try:
+                content = sublime.load_binary_resource(resource)
+            except IOError:
+                continue
+            digest = tmtheme_digest(content)
+            if scheme_cache.is_cached(cache_dir, resource, digest):
+                continue
+            try:
+                load_converted_tmtheme(resource, content, cache_dir, digest)
+            except Exception:
+                continue
+            count += 1
+        return count
+
+    def load_tmtheme(self, content, cache_dir=None):
+        """Load `tmTheme` content, using (and filling) the converted scheme cache if given a cache folder."""
+
+        self.scheme_obj = load_converted_tmtheme(self.color_scheme, content, cache_dir)
+
+    def read_tmtheme(self, source):
+        """Read `tmTheme` bytes or binary file object straight into the new format."""
+
+        self.scheme_obj = convert_tmtheme(source)
+
     def convert_format(self, obj):
         """Convert `tmTheme` object to new format."""
 
@@ -139,34 +255,12 @@ class ColorSchemeMatcher(object):
             self.scheme_obj[k] = v
 
         for item in obj["settings"]:
-            if item.get('scope', None) is None and item.get('name', None) is None:
-                for k, v in item["settings"].items():
-                    try:
-                        v = ColorSRGBX11(v).to_string(hex=True)
-                    except Exception:
-                        pass
-                    self.scheme_obj[GLOBAL_OPTIONS][RE_CAMEL_CASE.sub(to_snake, k)] = v
-            if 'settings' in item and item.get('scope') is not None:
-                rule = {}
-                name = item.get('name')
-                if name is not None:
-                    rule['name'] = name
-                scope = item.get('scope')
-                if scope is not None:
-                    rule["scope"] = scope
-                fg = item['settings'].get('foreground')
-                if fg is not None:
-                    rule['foreground'] = ColorSRGBX11(fg).to_string(hex=True)
-                bg = item['settings'].get('background')
-                if bg is not None:
-                    rule['background'] = ColorSRGBX11(bg).to_string(hex=True)
-                selfg = item["settings"].get("selectionForeground")
-                if selfg is not None:
-                    rule["selection_foreground"] = ColorSRGBX11(selfg).to_string(hex=True)
-                font_style = item["settings"].get('fontStyle')
-                if font_style is not None:
-                    rule[FONT_STYLE] = font_style
-                self.scheme_obj['rules'].append(rule)
+            self.convert_setting(item)
+
+    def convert_setting(self, item):
+        """Convert a `tmTheme` settings entry to the new format."""
+
+        convert_tmtheme_setting(self.scheme_obj, item)
 
     def merge_overrides(self):
         """Merge override schemes."""
@@ -190,7 +284,7 @@ class ColorSchemeMatcher(object):
                 # Though it is unlikely this would ever get executed as `find_resources`
                 # probably wouldn't have seen it either.
                 with codecs.open(packages_path(override), 'r', encoding='utf-8') as f:
-                    ojson = sublime.decode_value(sanitize_json(f.read()))
+                    ojson = load_json(f.read())
 
             for k, v in ojson.get('variables', {}).items():
                 self.scheme_obj['variables'][k] = v
@@ -210,7 +304,7 @@ class ColorSchemeMatcher(object):
             self.color_scheme.startswith('Packages/')
         ):
             with codecs.open(packages_path(self.color_scheme), 'r', encoding='utf-8') as f:
-                ojson = sublime.decode_value(sanitize_json(f.read()))
+                ojson = load_json(f.read())
 
                 for k, v in ojson.get('variables', {}).items():
                     self.scheme_obj['variables'][k] = v
@@ -414,13 +508,9 @@ class ColorSchemeMatcher(object):
             if not color.startswith('#'):
                 continue
 
-            rgb = Color(color.replace(" ", ""))
-            if not simple_strip:
-                if bground is None:
-                    bground = self.special_colors['background']['color_simulated']
-                rgb.compose(Color(bground if bground != "" else "#FFFFFF"))
-
-            gradient.append((color, rgb.to_string(**HEX)))
+            # Simulated colors have always kept their transparency (the composited color was never
+            # used), and `color_simulated` is read that way, so they are only normalized.
+            gradient.append((color, RGBA.from_hex(color.replace(" ", "")).to_hex(alpha=True)))
         if gradient:
             color, color_sim = gradient[0]
             return color, color_sim, gradient
@@ -442,13 +532,9 @@ class ColorSchemeMatcher(object):
         if not color.startswith('#'):
             return None, None
 
-        rgb = Color(color.replace(" ", ""))
-        if not simple_strip:
-            if bground is None:
-                bground = self.special_colors['background']['color_simulated']
-            rgb.compose(Color(bground if bground != "" else "#FFFFFF"))
-
-        return color, rgb.to_string(**HEX)
+        # Simulated colors have always kept their transparency (the composited color was never
+        # used), and `color_simulated` is read that way, so they are only normalized.
+        return color, RGBA.from_hex(color.replace(" ", "")).to_hex(alpha=True)
 
     def get_special_color(self, name, simulate_transparency=False):
         """
@@ -470,6 +556,31 @@ class ColorSchemeMatcher(object):
 
         return self.scheme_file
 
+    def stats(self):
+        """
+        Get the `guess_color` statistics, counted while `track_stats` is enabled.
+
+        - `guess_color`: calls.
+        - `hits` and `misses`: lookups of the scope in the cache of matched scopes.
+        - `score_selector`: calls to `sublime.score_selector` (made on cache misses).
+        - `foreground_adjust`: `foreground_adjust` evaluations.
+        - `time`: cumulative time of the calls in seconds.
+        """
+
+        return dict(self._stats)
+
+    def reset_stats(self):
+        """Reset the `guess_color` statistics."""
+
+        self._stats = {
+            "guess_color": 0,
+            "hits": 0,
+            "misses": 0,
+            "score_selector": 0,
+            "foreground_adjust": 0,
+            "time": 0.0
+        }
+
     def guess_color(self, scope_key, selected=False, explicit_background=False, no_bold=False, no_italic=False):
         """
         Guess the colors and style of the text for the given Sublime scope.
@@ -486,6 +597,11 @@ class ColorSchemeMatcher(object):
         background would show through.
         """
 
+        track = self.track_stats
+        if track:
+            start = time.perf_counter()
+            self._stats['guess_color'] += 1
+
         color = self.special_colors['foreground']['color']
         color_sim = self.special_colors['foreground']['color_simulated']
         color_gradient = None
@@ -506,6 +622,8 @@ class ColorSchemeMatcher(object):
             "glow": SchemeSelectors("", "")
         }
         if scope_key in self.matched:
+            if track:
+                self._stats['hits'] += 1
             color = self.matched[scope_key]["color"]
             color_sim = self.matched[scope_key]["color_simulated"]
             color_gradient = self.matched[scope_key]["color_gradient"]
@@ -521,6 +639,9 @@ class ColorSchemeMatcher(object):
             style_selectors = selectors["style"]
             color_gradient_selector = selectors['color_gradient']
         else:
+            if track:
+                self._stats['misses'] += 1
+                self._stats['score_selector'] += len(self.colors)
             best_match_bg = 0
             best_match_fg = 0
             best_match_style = 0
@@ -598,6 +719,8 @@ class ColorSchemeMatcher(object):
 
             if fgadj is not None:
                 for c in (color_gradient if color_gradient is not None else [color]):
+                    if track:
+                        self._stats['foreground_adjust'] += 1
                     color_list = []
                     try:
                         content = 'color({} {})'.format(c, fgadj)
@@ -641,6 +764,9 @@ class ColorSchemeMatcher(object):
                 bgcolor_sim = self.special_colors['selection']['color_simulated']
                 bg_selector = SchemeSelectors("selection", "selection")
 
+        if track:
+            self._stats['time'] += time.perf_counter() - start
+
         return SchemeColors(
             color, color_sim, bgcolor, bgcolor_sim, style, color_gradient,
             color_selector, bg_selector, style_selectors, color_gradient_selector
@@ -6,8 +6,9 @@ Copyright (c) 2013 - 2015 Isaac Muse <isaacmuse@gmail.com>
 """
 from __future__ import absolute_import
 import sublime
-from .st_colormod import Color
-from mdpopups.coloraide import util
+from .rgba import RGBA, clamp, round_half_up
+from . import tmtheme_writer
+import math
 import re
 
 NEW_SCHEMES = int(sublime.version()) >= 3150
@@ -30,27 +31,21 @@ RE_SNAKE_CASE = re.compile('_(.)')
 def to_camel(m):
     """Convert to camel case."""
 
-    return m.group(1).Upper()
+    return m.group(1).upper()
 
 
-def get_tmtheme(scheme):
-    """Get old tmtheme style."""
+def get_tmtheme_root(scheme):
+    """Get the old tmtheme style top level keys (everything but `settings`)."""
 
-    tmtheme = {
-        "settings": [
-            {
-                "settings": {}
-            }
-        ]
-    }
+    return {k: v for k, v in scheme.items() if k not in ('variables', 'rules', GLOBAL_OPTIONS, 'settings')}
 
-    for k, v in scheme.get(GLOBAL_OPTIONS, {}).items():
-        tmtheme["settings"]["settings"][RE_SNAKE_CASE.sub(to_camel, k)] = v
 
-    for k, v in scheme.items():
-        if k in ('variables', 'rules', GLOBAL_OPTIONS):
-            continue
-        tmtheme[k] = v
+def iter_tmtheme_settings(scheme):
+    """Yield the old tmtheme style `settings` entries one at a time."""
+
+    yield {
+        "settings": {RE_SNAKE_CASE.sub(to_camel, k): v for k, v in scheme.get(GLOBAL_OPTIONS, {}).items()}
+    }
 
     for rule in scheme["rules"]:
         entry = {}
@@ -61,7 +56,7 @@ def get_tmtheme(scheme):
         if scope:
             entry['scope'] = scope
 
-        entry['settings'] = {}
+        settings = {}
 
         foreground = rule.get('foreground')
         background = rule.get('background')
@@ -69,98 +64,110 @@ def get_tmtheme(scheme):
         selection_foreground = rule.get('selection_foreground')
 
         if foreground and isinstance(foreground, str):
-            entry['settings']['foreground'] = foreground
+            settings['foreground'] = foreground
         if selection_foreground:
-            entry['selectionForeground'] = selection_foreground
+            settings['selectionForeground'] = selection_foreground
         if background:
-            entry['settings']['background'] = background
+            settings['background'] = background
         if fontstyle:
-            entry['settings']['fontStyle'] = fontstyle
+            settings['fontStyle'] = fontstyle
 
-        tmtheme['settings'].append(entry)
+        entry['settings'] = settings
+        yield entry
+
+
+def get_tmtheme(scheme):
+    """Get old tmtheme style."""
 
+    tmtheme = get_tmtheme_root(scheme)
+    tmtheme['settings'] = list(iter_tmtheme_settings(scheme))
     return tmtheme
 
 
+def write_tmtheme(scheme, f):
+    """Write the scheme as an old style tmtheme to the binary file object `f`."""
+
+    tmtheme_writer.write_tmtheme(f, get_tmtheme_root(scheme), iter_tmtheme_settings(scheme))
+
+
+def save_tmtheme(scheme, path):
+    """Write the scheme as an old style tmtheme to the file, replacing it only once it is complete."""
+
+    tmtheme_writer.save_tmtheme(path, get_tmtheme_root(scheme), iter_tmtheme_settings(scheme))
+
+
 class _Filters:
-    """Color filters."""
+    """Color filters (each returns a new color)."""
 
     @staticmethod
     def colorize(color, deg):
         """Colorize the color with the given hue."""
 
-        if color.is_nan('hsl.hue'):
-            return
-        color.set('hsl.hue', deg % 360)
+        h, s, l = color.hsl()
+        if math.isnan(h):
+            return color
+        return RGBA.from_hsl(deg % 360, s, l, color.alpha)
 
     @staticmethod
     def hue(color, deg):
         """Shift the hue."""
 
-        if color.is_nan('hsl.hue'):
-            return
-        h = color.get('hsl.hue')
+        h, s, l = color.hsl()
+        if math.isnan(h):
+            return color
         h += deg
-        h = color.set('hsl.hue', h % 360)
+        return RGBA.from_hsl(h % 360, s, l, color.alpha)
 
     @staticmethod
     def contrast(color, factor):
         """Adjust contrast."""
 
-        r, g, b = [util.round_half_up(util.clamp(c * 255, 0, 255)) for c in util.no_nan(color.coords())]
+        r, g, b = color.to_bytes()
         # Algorithm can't handle any thing beyond +/-255 (or a factor from 0 - 2)
         # Convert factor between (-255, 255)
-        f = (util.clamp(factor, 0.0, 2.0) - 1.0) * 255.0
+        f = (clamp(factor, 0.0, 2.0) - 1.0) * 255.0
         f = (259 * (f + 255)) / (255 * (259 - f))
 
         # Increase/decrease contrast accordingly.
-        r = util.clamp(util.round_half_up((f * (r - 128)) + 128), 0, 255)
-        g = util.clamp(util.round_half_up((f * (g - 128)) + 128), 0, 255)
-        b = util.clamp(util.round_half_up((f * (b - 128)) + 128), 0, 255)
-        color.red = r / 255
-        color.green = g / 255
-        color.blue = b / 255
+        r = clamp(round_half_up((f * (r - 128)) + 128), 0, 255)
+        g = clamp(round_half_up((f * (g - 128)) + 128), 0, 255)
+        b = clamp(round_half_up((f * (b - 128)) + 128), 0, 255)
+        return RGBA(r / 255, g / 255, b / 255, color.alpha)
 
     @staticmethod
     def invert(color):
         """Invert the color."""
 
-        r, g, b = [int(util.round_half_up(util.clamp(c * 255, 0, 255))) for c in util.no_nan(color.coords())]
+        r, g, b = color.to_bytes()
         r ^= 0xFF
         g ^= 0xFF
         b ^= 0xFF
-        color.red = r / 255
-        color.green = g / 255
-        color.blue = b / 255
+        return RGBA(r / 255, g / 255, b / 255, color.alpha)
 
     @staticmethod
     def saturation(color, factor):
         """Saturate or unsaturate the color by the given factor."""
 
-        s = util.no_nan(color.get('hsl.saturation')) / 100.0
-        s = util.clamp(s + factor - 1.0, 0.0, 1.0)
-        color.set('hsl.saturation', s * 100)
+        h, s, l = color.hsl()
+        s = clamp(s + factor - 1.0, 0.0, 1.0)
+        return RGBA.from_hsl(h, s, l, color.alpha)
 
     @staticmethod
     def grayscale(color):
         """Convert the color with a grayscale filter."""
 
         luminance = color.luminance()
-        color.red = luminance
-        color.green = luminance
-        color.blue = luminance
+        return RGBA(luminance, luminance, luminance, color.alpha)
 
     @staticmethod
     def sepia(color):
         """Apply a sepia filter to the color."""
 
-        red, green, blue = util.no_nan(color.coords())
-        r = util.clamp((red * .393) + (green * .769) + (blue * .189), 0, 1)
-        g = util.clamp((red * .349) + (green * .686) + (blue * .168), 0, 1)
-        b = util.clamp((red * .272) + (green * .534) + (blue * .131), 0, 1)
-        color.red = r
-        color.green = g
-        color.blue = b
+        red, green, blue = color[:3]
+        r = clamp((red * .393) + (green * .769) + (blue * .189), 0, 1)
+        g = clamp((red * .349) + (green * .686) + (blue * .168), 0, 1)
+        b = clamp((red * .272) + (green * .534) + (blue * .131), 0, 1)
+        return RGBA(r, g, b, color.alpha)
 
     @staticmethod
     def _get_overage(c):
@@ -206,9 +213,10 @@ class _Filters:
         Brightness is determined by perceived luminance.
         """
 
-        red, green, blue = [util.round_half_up(util.clamp(c * 255, 0, 255)) for c in util.no_nan(color.coords())]
+        red, green, blue = color.to_bytes()
         channels = ["r", "g", "b"]
-        total_lumes = util.clamp(util.clamp(color.luminance(), 0, 1) * 255 + (255.0 * factor) - 255.0, 0.0, 255.0)
+        luminance = clamp(color.luminance(), 0, 1)
+        total_lumes = clamp(luminance * 255 + (255.0 * factor) - 255.0, 0.0, 255.0)
 
         if total_lumes == 255.0:
             # white
@@ -218,7 +226,7 @@ class _Filters:
             r, g, b = 0, 0, 0
         else:
             # Adjust Brightness
-            pts = (total_lumes - util.clamp(color.luminance(), 0, 1) * 255)
+            pts = (total_lumes - luminance * 255)
             slots = set(channels)
             components = [float(red) + pts, float(green) + pts, float(blue) + pts]
             count = 0
@@ -229,12 +237,10 @@ class _Filters:
                     components = list(cls._distribute_overage(components, overage, slots))
                 count += 1
 
-            r = util.clamp(util.round_half_up(components[0]), 0, 255) / 255.0
-            g = util.clamp(util.round_half_up(components[1]), 0, 255) / 255.0
-            b = util.clamp(util.round_half_up(components[2]), 0, 255) / 255.0
-        color.red = r
-        color.green = g
-        color.blue = b
+            r = clamp(round_half_up(components[0]), 0, 255) / 255.0
+            g = clamp(round_half_up(components[1]), 0, 255) / 255.0
+            b = clamp(round_half_up(components[2]), 0, 255) / 255.0
+        return RGBA(r, g, b, color.alpha)
 
 
 class ColorTweaker(object):
@@ -253,13 +259,14 @@ class ColorTweaker(object):
                     self.filters.append([m.group(3), 0.0, m.group(4) if m.group(4) else "all"])
 
     def _apply_filter(self, color, f_name, value=None):
-        """Apply the filter."""
+        """Apply the filter and return the filtered color."""
 
-        if isinstance(color, Color):
+        if isinstance(color, RGBA):
             if value is None:
-                getattr(_Filters, f_name)(color)
+                return getattr(_Filters, f_name)(color)
             else:
-                getattr(_Filters, f_name)(color, value)
+                return getattr(_Filters, f_name)(color, value)
+        return color
 
     def _filter_colors(self, *args, **kwargs):
         """Filter the colors."""
@@ -279,12 +286,12 @@ class ColorTweaker(object):
 
         try:
             assert (fg is not None)
-            rgba_fg = Color(fg)
+            rgba_fg = RGBA.from_hex(fg)
         except Exception:
             rgba_fg = fg
         try:
             assert (bg is not None)
-            rgba_bg = Color(bg)
+            rgba_bg = RGBA.from_hex(bg)
         except Exception:
             rgba_bg = bg
 
@@ -294,28 +301,27 @@ class ColorTweaker(object):
             context = f[2]
             if name in ("grayscale", "sepia", "invert"):
                 if context != "bg":
-                    self._apply_filter(rgba_fg, name)
+                    rgba_fg = self._apply_filter(rgba_fg, name)
                 if context != "fg":
-                    self._apply_filter(rgba_bg, name)
+                    rgba_bg = self._apply_filter(rgba_bg, name)
             elif name in ("saturation", "brightness", "hue", "colorize", "contrast"):
                 if context != "bg":
-                    self._apply_filter(rgba_fg, name, value)
+                    rgba_fg = self._apply_filter(rgba_fg, name, value)
                 if context != "fg":
-                    self._apply_filter(rgba_bg, name, value)
+                    rgba_bg = self._apply_filter(rgba_bg, name, value)
             elif (
-                name == "glow" and dual_colors and isinstance(rgba_fg, Color) and
+                name == "glow" and dual_colors and isinstance(rgba_fg, RGBA) and
                 (bg is None or bg.strip() == "" or bg == "none")
             ):
-                rgba = Color(rgba_fg)
-                rgba.compose(self.bground if self.bground != "" else "#FFFFFF", in_place=True)
-                bg = rgba.to_string(hex=True, alpha=False) + ("%02X" % int((255.0 * value)))
+                rgba = rgba_fg.compose(RGBA.from_hex(self.bground if self.bground != "" else "#FFFFFF"))
+                bg = rgba.to_hex(alpha=False) + ("%02X" % int((255.0 * value)))
                 try:
-                    rgba_bg = Color(bg)
+                    rgba_bg = RGBA.from_hex(bg)
                 except Exception:
                     rgba_bg = bg
         return (
-            rgba_fg.to_string(hex=True) if isinstance(rgba_fg, Color) else rgba_fg,
-            rgba_bg.to_string(hex=True) if isinstance(rgba_bg, Color) else rgba_bg
+            rgba_fg.to_hex() if isinstance(rgba_fg, RGBA) else rgba_fg,
+            rgba_bg.to_hex() if isinstance(rgba_bg, RGBA) else rgba_bg
         )
 
     def tweak(self, fg=None, bg=None):
@@ -377,13 +383,14 @@ class ColorSchemeTweaker(object):
     """Tweak the color scheme with the provided filter(s)."""
 
     def _apply_filter(self, color, f_name, value=None):
-        """Apply the filter."""
+        """Apply the filter and return the filtered color."""
 
-        if isinstance(color, Color):
+        if isinstance(color, RGBA):
             if value is None:
-                getattr(_Filters, f_name)(color)
+                return getattr(_Filters, f_name)(color)
             else:
-                getattr(_Filters, f_name)(color, value)
+                return getattr(_Filters, f_name)(color, value)
+        return color
 
     def _filter_colors(self, *args, **kwargs):
         """Filter the colors."""
@@ -403,12 +410,12 @@ class ColorSchemeTweaker(object):
 
         try:
             assert (fg is not None)
-            rgba_fg = Color(fg)
+            rgba_fg = RGBA.from_hex(fg)
         except Exception:
             rgba_fg = fg
         try:
             assert (bg is not None)
-            rgba_bg = Color(bg)
+            rgba_bg = RGBA.from_hex(bg)
         except Exception:
             rgba_bg = bg
 
@@ -418,28 +425,27 @@ class ColorSchemeTweaker(object):
             context = f[2]
             if name in ("grayscale", "sepia", "invert"):
                 if context != "bg":
-                    self._apply_filter(rgba_fg, name)
+                    rgba_fg = self._apply_filter(rgba_fg, name)
                 if context != "fg":
-                    self._apply_filter(rgba_bg, name)
+                    rgba_bg = self._apply_filter(rgba_bg, name)
             elif name in ("saturation", "brightness", "hue", "colorize", "contrast"):
                 if context != "bg":
-                    self._apply_filter(rgba_fg, name, value)
+                    rgba_fg = self._apply_filter(rgba_fg, name, value)
                 if context != "fg":
-                    self._apply_filter(rgba_bg, name, value)
+                    rgba_bg = self._apply_filter(rgba_bg, name, value)
             elif (
-                name == "glow" and dual_colors and isinstance(rgba_fg, Color) and
+                name == "glow" and dual_colors and isinstance(rgba_fg, RGBA) and
                 (bg is None or bg.strip() == "" or bg == "none")
             ):
-                rgba = Color(rgba_fg)
-                rgba.compose(self.bground if self.bground != "" else "#FFFFFF", in_place=True)
-                bg = rgba.to_string(hex=True, alpha=False) + ("%02X" % int((255.0 * value)))
+                rgba = rgba_fg.compose(RGBA.from_hex(self.bground if self.bground != "" else "#FFFFFF"))
+                bg = rgba.to_hex(alpha=False) + ("%02X" % int((255.0 * value)))
                 try:
-                    rgba_bg = Color(bg)
+                    rgba_bg = RGBA.from_hex(bg)
                 except Exception:
                     rgba_bg = bg
         return (
-            rgba_fg.to_string(hex=True) if isinstance(rgba_fg, Color) else rgba_fg,
-            rgba_bg.to_string(hex=True) if isinstance(rgba_bg, Color) else rgba_bg
+            rgba_fg.to_hex() if isinstance(rgba_fg, RGBA) else rgba_fg,
+            rgba_bg.to_hex() if isinstance(rgba_bg, RGBA) else rgba_bg
         )
 
     def tweak(self, scheme, filters, tmtheme=False):
@@ -467,16 +473,16 @@ class ColorSchemeTweaker(object):
                     value = v
                 scheme[GLOBAL_OPTIONS][k] = value
 
-            self.bground = Color(
+            self.bground = RGBA.from_hex(
                 self.process_color(
                     scheme[GLOBAL_OPTIONS].get("background", '#FFFFFF')
                 )
-            ).to_string(hex=True, alpha=False)
-            self.fground = Color(
+            ).to_hex(alpha=False)
+            self.fground = RGBA.from_hex(
                 self.process_color(
                     scheme[GLOBAL_OPTIONS].get("foreground", '#000000')
                 )
-            ).to_string(hex=True)
+            ).to_hex()
 
             for rule in scheme['rules']:
                 fg = rule.get("foreground", None)
@@ -37,6 +37,19 @@ PY_PATTERN = re.compile(
     re.DOTALL
 )
 
+# Stream states
+CODE = 0
+STRING = 1
+LINE_COMMENT = 2
+BLOCK_COMMENT = 3
+
+RE_CPP_CODE = re.compile(r'''["'/]''')
+RE_CPP_STRING = {
+    '"': re.compile(r'["\\]'),
+    "'": re.compile(r"['\\]")
+}
+RE_LINE_END = re.compile(r'[\r\n]')
+
 
 def _strip_regex(pattern, text, preserve_lines):
     """Generic function that strips out comments pased on the given pattern."""
@@ -44,7 +57,7 @@ def _strip_regex(pattern, text, preserve_lines):
     def remove_comments(group, preserve_lines=False):
         """Remove comments."""
 
-        return ''.join([x[0] for x in LINE_PRESERVE.findall(group)]) if preserve_lines else ''
+        return ''.join(LINE_PRESERVE.findall(group)) if preserve_lines else ''
 
     def evaluate(m, preserve_lines):
         """Search for comments."""
@@ -77,6 +90,90 @@ def _python(text, preserve_lines=False):
     )
 
 
+def strip_stream(chunks, preserve_lines=False):
+    """
+    Strip C/C++ style comments from an iterable of text chunks, yielding the stripped chunks.
+
+    Comments and string literals can span chunks. Nothing beyond the chunk being
+    processed (and, at most, a single character carried over) is held in memory.
+    """
+
+    state = CODE
+    quote = None
+    pending = ''
+    for chunk in chunks:
+        text = pending + chunk if pending else chunk
+        pending = ''
+        out = []
+        pos = 0
+        n = len(text)
+        while pos < n:
+            if state == CODE:
+                m = RE_CPP_CODE.search(text, pos)
+                if m is None:
+                    out.append(text[pos:])
+                    break
+                i = m.start()
+                c = text[i]
+                if c != '/':
+                    out.append(text[pos:i + 1])
+                    quote = c
+                    state = STRING
+                    pos = i + 1
+                elif i + 1 == n:
+                    # Could be the start of a comment; wait for the next chunk.
+                    out.append(text[pos:i])
+                    pending = c
+                    break
+                elif text[i + 1] in '/*':
+                    out.append(text[pos:i])
+                    state = LINE_COMMENT if text[i + 1] == '/' else BLOCK_COMMENT
+                    pos = i + 2
+                else:
+                    out.append(text[pos:i + 1])
+                    pos = i + 1
+            elif state == STRING:
+                m = RE_CPP_STRING[quote].search(text, pos)
+                if m is None:
+                    out.append(text[pos:])
+                    break
+                i = m.start()
+                if text[i] == quote:
+                    out.append(text[pos:i + 1])
+                    state = CODE
+                    pos = i + 1
+                elif i + 1 == n:
+                    # Escape is split between chunks.
+                    out.append(text[pos:i])
+                    pending = text[i]
+                    break
+                else:
+                    out.append(text[pos:i + 2])
+                    pos = i + 2
+            elif state == LINE_COMMENT:
+                m = RE_LINE_END.search(text, pos)
+                if m is None:
+                    break
+                state = CODE
+                pos = m.start()
+            else:
+                i = text.find('*/', pos)
+                # Keep a trailing `*` or `\r` in case the comment end or a line break is split between chunks.
+                end = i if i != -1 else (n - 1 if text.endswith(('*', '\r')) else n)
+                if preserve_lines:
+                    out.extend(LINE_PRESERVE.findall(text, pos, end))
+                if i == -1:
+                    pending = text[end:]
+                    break
+                state = CODE
+                pos = i + 2
+        if out:
+            yield ''.join(out)
+
+    if pending and state != BLOCK_COMMENT:
+        yield pending
+
+
 class CommentException(Exception):
     """Comment exception."""
 
@@ -4,8 +4,10 @@ File Strip.
 Licensed under MIT
 Copyright (c) 2012 Isaac Muse <isaacmuse@gmail.com>
 """
+import json
 import re
-from .comments import Comments
+from json.decoder import scanstring
+from .comments import Comments, LINE_PRESERVE, strip_stream
 
 JSON_PATTERN = re.compile(
     r'''(?x)
@@ -30,6 +32,60 @@ JSON_PATTERN = re.compile(
     re.DOTALL
 )
 
+# Single pass sanitizer: strings are matched only to skip over them, while comments and dangling
+# commas (a comma followed by nothing but white space and comments before a closing bracket)
+# are matched to be removed. Everything else is left to the regular expression engine to skip.
+SANITIZE_PATTERN = re.compile(
+    r'''(?x)
+        "(?:\\.|[^"\\])*"                 # double quoted string
+      | '(?:\\.|[^'\\])*'                 # single quoted string
+      | (?P<comments>
+            /\*[^*]*\*+(?:[^/*][^*]*\*+)*/  # multi-line comments
+          | //[^\r\n]*                      # single line comments
+        )
+      | (?P<comma>,)(?=                     # dangling comma
+            (?:
+                \s
+              | /\*[^*]*\*+(?:[^/*][^*]*\*+)*/
+              | //[^\r\n]*(?![^\r\n])         # (whole line, so a bracket in it isn't matched)
+            )*
+            [\]}]
+        )
+    '''
+)
+
+# Cheap check for a comma before a closing bracket (possibly in a string, which is fine).
+RE_DANGLING_COMMA = re.compile(r',\s*[\]}]')
+
+CHUNK_SIZE = 64 * 1024
+
+RE_WS = re.compile(r'[ \t\r\n]*')
+RE_WS_COMMENTS = re.compile(r'(?:[ \t\r\n]+|//[^\r\n]*|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/)*')
+RE_NUMBER = re.compile(r'-?(?:0|[1-9]\d*)(\.\d+)?([eE][-+]?\d+)?')
+RE_NUMBER_CHARS = re.compile(r'[-+0-9.eE]*')
+LITERALS = (
+    ('true', True), ('false', False), ('null', None),
+    ('NaN', float('nan')), ('Infinity', float('inf')), ('-Infinity', float('-inf'))
+)
+
+# Decoder states
+VALUE = 0           # Expecting a value
+VALUE_OR_CLOSE = 1  # Expecting a value or the end of an array
+KEY = 2             # Expecting a key
+KEY_OR_CLOSE = 3    # Expecting a key or the end of an object
+COLON = 4           # Expecting `:`
+NEXT = 5            # Expecting `,` or the end of the current container
+END = 6             # Done, expecting only white space
+CLOSE = 7           # Expecting the end of an (empty) container after a dangling comma
+
+# How often sanitizing or parsing for comments could be skipped.
+STATS = {
+    "sanitize": 0,
+    "clean": 0,
+    "load": 0,
+    "load_direct": 0
+}
+
 
 def strip_dangling_commas(text, preserve_lines=False):
     """Strip dangling commas."""
@@ -64,7 +120,317 @@ def strip_comments(text, preserve_lines=False):
     return Comments('json', preserve_lines).strip(text)
 
 
+def is_clean(text):
+    """Quick check for text with nothing to sanitize: no `/` and no comma before a closing bracket."""
+
+    return text.find('/') == -1 and RE_DANGLING_COMMA.search(text) is None
+
+
 def sanitize_json(text, preserve_lines=False):
-    """Sanitize the JSON file by removing comments and dangling commas."""
+    """
+    Sanitize the JSON file by removing comments and dangling commas.
+
+    Both are removed in a single pass. Text is copied in spans between the removed parts,
+    so if nothing needs removing, the text is returned as is. With `preserve_lines`, the
+    line breaks of removed comments are kept.
+    """
+
+    STATS["sanitize"] += 1
+    if is_clean(text):
+        STATS["clean"] += 1
+        return text
+
+    parts = []
+    last = 0
+    for m in SANITIZE_PATTERN.finditer(text):
+        kind = m.lastgroup
+        if kind is None:
+            # String
+            continue
+        parts.append(text[last:m.start()])
+        if preserve_lines and kind == 'comments':
+            parts.extend(LINE_PRESERVE.findall(m.group(0)))
+        last = m.end()
+
+    if not parts:
+        return text
+    parts.append(text[last:])
+    return ''.join(parts)
+
+
+def parse_json(text):
+    """
+    Load JSON with comments and dangling commas in a single pass.
+
+    Errors report the line and column in the given text.
+    """
+
+    decoder = JsonStreamDecoder(trailing_commas=True, comments=True)
+    decoder.buffer = text
+    return decoder.close()
+
+
+def load_json(text):
+    """Load JSON, trying it as plain JSON first and only parsing it with `parse_json` if that fails."""
+
+    STATS["load"] += 1
+    try:
+        obj = json.loads(text)
+    except ValueError:
+        return parse_json(text)
+    STATS["load_direct"] += 1
+    return obj
+
+
+def stats():
+    """Get a summary of how often sanitizing or parsing for comments could be skipped."""
+
+    return "%d/%d sanitized JSON files needed no changes, %d/%d loaded JSON files were plain JSON" % (
+        STATS["clean"], STATS["sanitize"], STATS["load_direct"], STATS["load"]
+    )
+
+
+def reset_stats():
+    """Reset the counts."""
+
+    for k in STATS:
+        STATS[k] = 0
+
+
+class JsonStreamDecoder(object):
+    """
+    Incremental JSON decoder.
+
+    Feed it text with `feed` and get the decoded value with `close`. Values are built as the
+    text arrives, so only the part of the text that hasn't been decoded yet is held in memory.
+    With `trailing_commas`, a comma is allowed before a closing bracket (like `sanitize_json`,
+    this includes a lone comma in an otherwise empty container), and with `comments`, C style
+    comments are skipped like white space.
+    """
+
+    def __init__(self, trailing_commas=False, comments=False):
+        """Initialize."""
+
+        self.trailing_commas = trailing_commas
+        self.comments = comments
+        self.ws = RE_WS_COMMENTS if comments else RE_WS
+        self.buffer = ''
+        self.stack = []
+        self.state = VALUE
+        self.value = None
+        # Position of the buffer start in the whole text, for error messages.
+        self.offset = 0
+        self.line = 1
+        self.line_start = 0
+
+    def feed(self, text):
+        """Feed text to the decoder."""
+
+        self.buffer = self.buffer + text if self.buffer else text
+        self.decode(False)
+
+    def close(self):
+        """Finish decoding and return the value."""
+
+        self.decode(True)
+        if self.state != END:
+            self.error("Expecting value" if not self.stack else "Unterminated container", len(self.buffer))
+        return self.value
+
+    def error(self, msg, pos):
+        """Raise an error at the given buffer position."""
+
+        buf = self.buffer
+        line = self.line + buf.count('\n', 0, pos)
+        nl = buf.rfind('\n', 0, pos)
+        col = (pos - nl) if nl != -1 else (self.offset + pos - self.line_start + 1)
+        raise ValueError("%s: line %d column %d (char %d)" % (msg, line, col, self.offset + pos))
+
+    def consume(self, pos):
+        """Drop the decoded part of the buffer."""
+
+        buf = self.buffer
+        lines = buf.count('\n', 0, pos)
+        if lines:
+            self.line += lines
+            self.line_start = self.offset + buf.rfind('\n', 0, pos) + 1
+        self.offset += pos
+        self.buffer = buf[pos:]
+
+    def add_value(self, value):
+        """Add a completed value to the current container."""
+
+        if not self.stack:
+            self.value = value
+            self.state = END
+            return
+        top = self.stack[-1]
+        if top[1] is None:
+            top[0].append(value)
+        else:
+            top[0][top[1]] = value
+        self.state = NEXT
+
+    def decode(self, final):
+        """Decode as much of the buffer as possible."""
+
+        buf = self.buffer
+        n = len(buf)
+        pos = 0
+        stack = self.stack
+        ws = self.ws
+        while True:
+            end = ws.match(buf, pos).end()
+            if end >= n:
+                # White space (or a comment) may continue in the next chunk.
+                if final:
+                    pos = end
+                break
+            pos = end
+            c = buf[pos]
+            state = self.state
+
+            if c == '/' and self.comments:
+                if not final and n - pos < 2:
+                    break
+                if buf.startswith('/*', pos):
+                    if not final:
+                        break
+                    self.error("Unterminated comment", pos)
+
+            if state == NEXT:
+                top = stack[-1]
+                is_list = top[1] is None
+                if c == ',':
+                    if is_list:
+                        self.state = VALUE_OR_CLOSE if self.trailing_commas else VALUE
+                    else:
+                        self.state = KEY_OR_CLOSE if self.trailing_commas else KEY
+                    pos += 1
+                elif c == (']' if is_list else '}'):
+                    stack.pop()
+                    self.add_value(top[0])
+                    pos += 1
+                else:
+                    self.error("Expecting ',' delimiter", pos)
+
+            elif state == COLON:
+                if c != ':':
+                    self.error("Expecting ':' delimiter", pos)
+                self.state = VALUE
+                pos += 1
+
+            elif state == CLOSE:
+                top = stack[-1]
+                if top[1] is None and c != ']':
+                    self.error("Expecting value", pos)
+                elif top[1] is not None and c != '}':
+                    self.error("Expecting property name enclosed in double quotes", pos)
+                stack.pop()
+                self.add_value(top[0])
+                pos += 1
+
+            elif c == ',' and self.trailing_commas and state in (KEY_OR_CLOSE, VALUE_OR_CLOSE) and not stack[-1][0]:
+                # A dangling comma in an empty container
+                self.state = CLOSE
+                pos += 1
+
+            elif state in (KEY, KEY_OR_CLOSE):
+                if c == '}' and state == KEY_OR_CLOSE:
+                    self.add_value(stack.pop()[0])
+                    pos += 1
+                elif c == '"':
+                    end = self.scan_string(buf, pos, final)
+                    if end is None:
+                        break
+                    stack[-1][1], pos = end
+                    self.state = COLON
+                else:
+                    self.error("Expecting property name enclosed in double quotes", pos)
+
+            elif state in (VALUE, VALUE_OR_CLOSE):
+                if c == ']' and state == VALUE_OR_CLOSE:
+                    self.add_value(stack.pop()[0])
+                    pos += 1
+                elif c == '{':
+                    stack.append([{}, ''])
+                    self.state = KEY_OR_CLOSE
+                    pos += 1
+                elif c == '[':
+                    stack.append([[], None])
+                    self.state = VALUE_OR_CLOSE
+                    pos += 1
+                elif c == '"':
+                    end = self.scan_string(buf, pos, final)
+                    if end is None:
+                        break
+                    value, pos = end
+                    self.add_value(value)
+                else:
+                    end = self.scan_scalar(buf, pos, final)
+                    if end is None:
+                        break
+                    value, pos = end
+                    self.add_value(value)
+
+            else:
+                self.error("Extra data", pos)
+
+        self.consume(pos)
+
+    def scan_string(self, buf, pos, final):
+        """Scan a string, returning the value and end, or `None` if more text is needed."""
+
+        try:
+            return scanstring(buf, pos + 1, True)
+        except ValueError as e:
+            # A string cut off by the end of the buffer, or an escape split by it.
+            if not final and ('Unterminated' in str(e) or getattr(e, 'pos', len(buf)) >= len(buf) - 6):
+                return None
+            self.error(getattr(e, 'msg', str(e)), getattr(e, 'pos', pos))
+
+    def scan_scalar(self, buf, pos, final):
+        """Scan a number or literal, returning the value and end, or `None` if more text is needed."""
+
+        n = len(buf)
+        # A number may continue in the next chunk.
+        if not final and RE_NUMBER_CHARS.match(buf, pos).end() == n:
+            return None
+        m = RE_NUMBER.match(buf, pos)
+        if m is not None:
+            end = m.end()
+            if m.group(1) or m.group(2):
+                return float(m.group(0)), end
+            return int(m.group(0)), end
+
+        for name, value in LITERALS:
+            if buf.startswith(name, pos):
+                return value, pos + len(name)
+            if not final and n - pos < len(name) and name.startswith(buf[pos:]):
+                return None
+        self.error("Expecting value", pos)
+
+
+def iter_chunks(f, chunk_size=CHUNK_SIZE):
+    """Read a file object in chunks."""
+
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def load_json_stream(f, chunk_size=CHUNK_SIZE):
+    """
+    Load JSON with comments and dangling commas from a text file object.
+
+    The text is read, stripped of comments and decoded incrementally, so neither the
+    whole text nor a stripped copy of it is ever held in memory. Line numbers in errors
+    match the original text.
+    """
 
-    return strip_dangling_commas(Comments('json', preserve_lines).strip(text), preserve_lines)
+    decoder = JsonStreamDecoder(trailing_commas=True)
+    for chunk in strip_stream(iter_chunks(f, chunk_size), preserve_lines=True):
+        decoder.feed(chunk)
+    return decoder.close()
@@ -0,0 +1,124 @@
+"""
+Latency statistics.
+
+Per phase timings of the tweak commands, kept in memory as rolling histograms (the last `SAMPLES`
+timings of each command's phase). Recording is disabled by default: `start` then returns a recorder
+that does nothing, so the timers cost no more than a method call.
+"""
+from collections import deque
+import time
+
+SAMPLES = 256
+
+# Histogram bucket upper bounds in milliseconds.
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_enabled = False
+_samples = {}
+
+
+class Recorder(object):
+    """Record the phases of a command."""
+
+    def __init__(self, command):
+        """Initialize."""
+
+        self.command = command
+        self.begin = self.last = time.perf_counter()
+
+    def mark(self, phase):
+        """Record the time since the last mark, or the start, as the given phase."""
+
+        now = time.perf_counter()
+        record(self.command, phase, now - self.last)
+        self.last = now
+
+    def done(self):
+        """Record the total time of the command."""
+
+        record(self.command, 'total', time.perf_counter() - self.begin)
+
+
+class NullRecorder(object):
+    """Recorder used when disabled."""
+
+    def mark(self, phase):
+        """Do nothing."""
+
+    def done(self):
+        """Do nothing."""
+
+
+NULL_RECORDER = NullRecorder()
+
+
+def enable(enabled=True):
+    """Enable or disable recording."""
+
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def is_enabled():
+    """Check if recording is enabled."""
+
+    return _enabled
+
+
+def start(command):
+    """Start recording a command."""
+
+    return Recorder(command) if _enabled else NULL_RECORDER
+
+
+def record(command, phase, seconds):
+    """Record a timing."""
+
+    key = (command, phase)
+    samples = _samples.get(key)
+    if samples is None:
+        samples = _samples[key] = deque(maxlen=SAMPLES)
+    samples.append(seconds)
+
+
+def reset():
+    """Clear the timings."""
+
+    _samples.clear()
+
+
+def percentile(ordered, percent):
+    """Get the nearest rank percentile of sorted samples."""
+
+    return ordered[min(len(ordered) - 1, max(0, int(round(percent / 100.0 * len(ordered))) - 1))]
+
+
+def summary():
+    """
+    Summarize the timings.
+
+    Returns `{command: {phase: {...}}}`, where each phase has the sample `count`, the `mean`, `p50`, `p95`
+    and `max` in milliseconds, and a `histogram` of sample counts per bucket (`"<=1ms"`, ..., `">5000ms"`).
+    """
+
+    results = {}
+    for (command, phase), samples in _samples.items():
+        ordered = sorted(s * 1000.0 for s in samples)
+        histogram = {}
+        for value in ordered:
+            for bound in BUCKETS:
+                if value <= bound:
+                    name = '<=%dms' % bound
+                    break
+            else:
+                name = '>%dms' % BUCKETS[-1]
+            histogram[name] = histogram.get(name, 0) + 1
+        results.setdefault(command, {})[phase] = {
+            "count": len(ordered),
+            "mean": sum(ordered) / len(ordered),
+            "p50": percentile(ordered, 50),
+            "p95": percentile(ordered, 95),
+            "max": ordered[-1],
+            "histogram": histogram
+        }
+    return results
@@ -0,0 +1,139 @@
+"""
+On demand profiling.
+
+Runs tweak commands under `cProfile` (and `tracemalloc`, when available) and saves the results:
+`<time>-<command>.pstats` for `pstats`/snakeviz and the like, and `<time>-<command>.txt` with the top
+functions and allocations. `cProfile`, `pstats` and `tracemalloc` are only imported when something
+is actually profiled.
+"""
+import functools
+import io
+import os
+import time
+import traceback
+
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+
+# Calls still to be profiled and how: `(remaining, folder, memory, callback)`
+_armed = [0, None, True, None]
+
+# Calls being profiled, so calls they make aren't profiled again.
+_active = [0]
+
+
+def arm(folder, count=1, memory=True, callback=None):
+    """Profile the next `count` calls of `profiled` functions, saving to the folder."""
+
+    _armed[:] = [count, folder, memory, callback]
+
+
+def disarm():
+    """Stop profiling calls."""
+
+    _armed[:] = [0, None, True, None]
+
+
+def remaining():
+    """Get how many more calls will be profiled."""
+
+    return _armed[0]
+
+
+def profiled(name):
+    """Decorate a function to be profiled when armed."""
+
+    def decorator(fn):
+        """Decorator."""
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            """Profile the call if armed."""
+
+            if not _armed[0] or _active[0]:
+                return fn(*args, **kwargs)
+            _armed[0] -= 1
+            folder, memory, callback = _armed[1:]
+            if not _armed[0]:
+                disarm()
+            return profile(folder, name, fn, args, kwargs, memory, callback)
+        return wrapper
+    return decorator
+
+
+def profile(folder, name, fn, args=(), kwargs=None, memory=True, callback=None):
+    """
+    Profile the call and save the results.
+
+    The callback gets the saved file paths and `None`, or `None` and the exception if saving
+    failed. Without a callback, a failure to save is printed. Allocations are traced unless
+    `memory` is false; if tracing was already started, it is left running, and no peak is given.
+    """
+
+    import cProfile
+
+    tracemalloc = None
+    if memory:
+        try:
+            import tracemalloc
+        except ImportError:
+            # Not available before Python 3.4
+            pass
+    tracing = tracemalloc is not None and tracemalloc.is_tracing()
+
+    prof = cProfile.Profile()
+    if tracemalloc is not None and not tracing:
+        tracemalloc.start(10)
+    _active[0] += 1
+    prof.enable()
+    try:
+        return fn(*args, **(kwargs or {}))
+    finally:
+        prof.disable()
+        _active[0] -= 1
+        snapshot = None
+        peak = None
+        if tracemalloc is not None:
+            snapshot = tracemalloc.take_snapshot()
+            if not tracing:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        # Failing to save mustn't replace an exception from the call.
+        try:
+            paths = save(folder, name, prof, snapshot, peak)
+        except Exception as e:
+            if callback is None:
+                traceback.print_exc()
+            else:
+                callback(None, e)
+        else:
+            if callback is not None:
+                callback(paths, None)
+
+
+def save(folder, name, prof, snapshot=None, peak=None):
+    """Save the profile and a report, and return their paths."""
+
+    import pstats
+
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    now = time.time()
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now))
+    base = os.path.join(folder, '%s-%03d-%s' % (stamp, now % 1 * 1000, name))
+    prof.dump_stats(base + '.pstats')
+
+    out = io.StringIO()
+    out.write('Profile of %s\n\n' % name)
+    stats = pstats.Stats(prof, stream=out)
+    stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    if snapshot is not None:
+        if peak is None:
+            out.write('Top allocations\n\n')
+        else:
+            out.write('Top allocations (peak %.1f KiB)\n\n' % (peak / 1024.0))
+        for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+            out.write('%s\n' % stat)
+    with open(base + '.txt', 'w') as f:
+        f.write(out.getvalue())
+    return [base + '.pstats', base + '.txt']
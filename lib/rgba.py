@@ -0,0 +1,161 @@
+"""
+Lightweight sRGB color.
+
+Scheme colors are almost always plain hex sRGB, and the matcher and tweaker only need to
+parse them, run simple filters, composite alpha and write them back out. `RGBA` does just
+that with plain floats, avoiding a full `Color` object (and its color space machinery) per
+operation. Results mirror those of the `Color` object operations they replace.
+"""
+from collections import namedtuple
+import math
+import re
+
+RE_HEX = re.compile(r'(?i)^#(?:([0-9a-f]{6})([0-9a-f]{2})?|([0-9a-f]{3})([0-9a-f])?)$')
+
+HEX_BYTE = ['%02x' % i for i in range(256)]
+
+# The Y row of the linear sRGB to XYZ (D65) matrix
+LUMINANCE = (0.21263900587151027, 0.715168678767756, 0.07219231536073371)
+
+NAN = float('nan')
+
+
+def clamp(value, mn, mx):
+    """Clamp the value to the given minimum and maximum."""
+
+    return max(mn, min(mx, value))
+
+
+def round_half_up(n):
+    """Round half up."""
+
+    return int(math.floor(n + 0.5))
+
+
+def luminance(rgb):
+    """Get the relative luminance of gamma encoded sRGB coordinates."""
+
+    lum = 0.0
+    for c, factor in zip(rgb, LUMINANCE):
+        a = abs(c)
+        lum += factor * math.copysign(a / 12.92 if a <= 0.04045 else ((a + 0.055) / 1.055) ** 2.4, c)
+    return lum
+
+
+def to_byte(c):
+    """Convert a channel in the range [0, 1] to an 8 bit integer, clipping if needed."""
+
+    return round_half_up(clamp(c, 0.0, 1.0) * 255.0)
+
+
+class RGBA(namedtuple('RGBA', ['red', 'green', 'blue', 'alpha'])):
+    """Immutable sRGB color with channels in the range [0, 1]."""
+
+    __slots__ = ()
+
+    def __new__(cls, red, green, blue, alpha=1.0):
+        """Create the color."""
+
+        return super(RGBA, cls).__new__(cls, red, green, blue, alpha)
+
+    @classmethod
+    def from_hex(cls, value):
+        """Create a color from `#RGB`, `#RGBA`, `#RRGGBB`, or `#RRGGBBAA`."""
+
+        m = RE_HEX.match(value)
+        if m is None:
+            raise ValueError("'{}' is not a valid hex color".format(value))
+        if m.group(1):
+            h = m.group(1)
+            a = m.group(2)
+            return cls(
+                int(h[0:2], 16) / 255.0,
+                int(h[2:4], 16) / 255.0,
+                int(h[4:6], 16) / 255.0,
+                int(a, 16) / 255.0 if a else 1.0
+            )
+        h = m.group(3)
+        a = m.group(4)
+        return cls(
+            int(h[0] * 2, 16) / 255.0,
+            int(h[1] * 2, 16) / 255.0,
+            int(h[2] * 2, 16) / 255.0,
+            int(a * 2, 16) / 255.0 if a else 1.0
+        )
+
+    @classmethod
+    def from_hsl(cls, hue, saturation, lightness, alpha=1.0):
+        """Create a color from HSL (hue in degrees, saturation and lightness in the range [0, 1])."""
+
+        if math.isnan(hue):
+            hue = 0.0
+        hue = hue % 360.0
+        a = saturation * min(lightness, 1.0 - lightness)
+
+        def f(n):
+            """Calculate the channel."""
+
+            k = (n + hue / 30.0) % 12.0
+            return lightness - a * max(-1.0, min(k - 3.0, 9.0 - k, 1.0))
+
+        return cls(f(0), f(8), f(4), alpha)
+
+    def to_hex(self, alpha=None):
+        """
+        Convert to a lowercase hex string.
+
+        Alpha is included if `alpha` is `True`, or if it is `None` and the color is transparent.
+        """
+
+        value = '#' + HEX_BYTE[to_byte(self.red)] + HEX_BYTE[to_byte(self.green)] + HEX_BYTE[to_byte(self.blue)]
+        if alpha or (alpha is None and self.alpha < 1.0):
+            value += HEX_BYTE[to_byte(self.alpha)]
+        return value
+
+    def to_bytes(self):
+        """Get the red, green, and blue channels as 8 bit integers."""
+
+        return to_byte(self.red), to_byte(self.green), to_byte(self.blue)
+
+    def hsl(self):
+        """Get the HSL hue (`NaN` if achromatic), saturation and lightness (saturation and lightness are [0, 1])."""
+
+        r, g, b = self.red, self.green, self.blue
+        mx = max(r, g, b)
+        mn = min(r, g, b)
+        lightness = (mx + mn) / 2.0
+        c = mx - mn
+        hue = NAN
+        saturation = 0.0
+        if c != 0.0:
+            if mx == r:
+                hue = (g - b) / c + (6.0 if g < b else 0.0)
+            elif mx == g:
+                hue = (b - r) / c + 2.0
+            else:
+                hue = (r - g) / c + 4.0
+            hue *= 60.0
+            saturation = 0.0 if lightness in (0.0, 1.0) else (mx - lightness) / min(lightness, 1.0 - lightness)
+        return hue, saturation, lightness
+
+    def luminance(self):
+        """Get the relative luminance."""
+
+        return luminance(self[:3])
+
+    def compose(self, backdrop):
+        """Composite this color over the backdrop (simple alpha compositing, normal blending)."""
+
+        a = self.alpha
+        if a >= 1.0:
+            return self
+        ab = backdrop.alpha
+        ao = a + ab * (1.0 - a)
+        if ao == 0.0:
+            return RGBA(0.0, 0.0, 0.0, 0.0)
+        return RGBA(
+            (self.red * a + backdrop.red * ab * (1.0 - a)) / ao,
+            (self.green * a + backdrop.green * ab * (1.0 - a)) / ao,
+            (self.blue * a + backdrop.blue * ab * (1.0 - a)) / ao,
+            ao
+        )
@@ -0,0 +1,73 @@
+"""
+Converted color scheme cache.
+
+Stores `tmTheme` files converted to the new color scheme format as JSON so they don't have to
+be converted again. Entries are keyed by the source resource path and a hash of its content
+(and anything else that affects the conversion): `<path hash>.<content hash>.json`. Saving an
+entry removes any stale entries for the same resource.
+"""
+import hashlib
+import json
+import os
+
+EXT = '.json'
+
+
+def content_hash(content, *extra):
+    """Hash the source content along with any extra strings that affect the conversion."""
+
+    h = hashlib.sha1(content)
+    for value in extra:
+        h.update(b'\0' + value.encode('utf-8'))
+    return h.hexdigest()
+
+
+def path_hash(resource):
+    """Hash the resource path."""
+
+    return hashlib.sha1(resource.encode('utf-8')).hexdigest()
+
+
+def cache_file(cache_dir, resource, digest):
+    """Get the cache file for the resource and content hash."""
+
+    return os.path.join(cache_dir, path_hash(resource) + '.' + digest + EXT)
+
+
+def is_cached(cache_dir, resource, digest):
+    """Check if there is a cache entry for the resource and content hash."""
+
+    return os.path.exists(cache_file(cache_dir, resource, digest))
+
+
+def load(cache_dir, resource, digest):
+    """Load the cached scheme for the resource and content hash, or `None` if there isn't a usable one."""
+
+    try:
+        with open(cache_file(cache_dir, resource, digest), 'r', encoding='utf-8') as f:
+            obj = json.load(f)
+    except Exception:
+        return None
+    return obj if isinstance(obj, dict) else None
+
+
+def save(cache_dir, resource, digest, obj):
+    """Save the scheme for the resource and content hash, replacing stale entries for the resource."""
+
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    target = cache_file(cache_dir, resource, digest)
+    temp = target + '.tmp'
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, separators=(',', ':'))
+    os.replace(temp, target)
+
+    prefix = path_hash(resource) + '.'
+    name = os.path.basename(target)
+    for entry in os.listdir(cache_dir):
+        if entry.startswith(prefix) and entry.endswith(EXT) and entry != name:
+            try:
+                os.remove(os.path.join(cache_dir, entry))
+            except OSError:
+                pass
@@ -6,6 +6,7 @@ from mdpopups.coloraide.spaces import _parse
 from mdpopups.coloraide import util
 import functools
 import math
+from .rgba import luminance
 
 WHITE = [1.0] * 3
 BLACK = [0.0] * 3
@@ -27,29 +28,62 @@ TOKENS = {
     "separators": re.compile(r'(?:{comma}|{space}|{slash})'.format(**_parse.COLOR_PARTS))
 }
 
-RE_ADJUSTERS = {
-    "alpha": re.compile(
-        r'(?i)\s+a(?:lpha)?\(\s*(?:(\+\s+|\-\s+)?({percent}|{float})|(\*)?\s*({percent}|{float}))\s*\)'.format(
-            **_parse.COLOR_PARTS
-        )
-    ),
-    "saturation": re.compile(
-        r'(?i)\s+s(?:aturation)?\((\+\s|\-\s|\*)?\s*({percent})\s*\)'.format(**_parse.COLOR_PARTS)
-    ),
-    "lightness": re.compile(r'(?i)\s+l(?:ightness)?\((\+\s|\-\s|\*)?\s*({percent})\s*\)'.format(**_parse.COLOR_PARTS)),
-    "min-contrast_start": re.compile(r'(?i)\s+min-contrast\(\s*'),
-    "blend_start": re.compile(r'(?i)\s+blenda?\(\s*'),
-    "end": re.compile(r'(?i)\s*\)')
-}
+RE_ADJUSTER = re.compile(
+    r'(?i)(?:\s+(?:'
+    r'(?P<alpha>a(?:lpha)?\(\s*(?:(?P<alpha_op>\+\s+|\-\s+)?(?P<alpha_value>{percent}|{float})|'
+    r'(?P<alpha_mult>\*)?\s*(?P<alpha_mult_value>{percent}|{float}))\s*\))|'
+    r'(?P<saturation>s(?:aturation)?\((?P<saturation_op>\+\s|\-\s|\*)?\s*(?P<saturation_value>{percent})\s*\))|'
+    r'(?P<lightness>l(?:ightness)?\((?P<lightness_op>\+\s|\-\s|\*)?\s*(?P<lightness_value>{percent})\s*\))|'
+    r'(?P<min_contrast>min-contrast\(\s*)|'
+    r'(?P<blend>blend(?P<blenda>a)?\(\s*)'
+    r')|(?P<end>\s*\)))'.format(**_parse.COLOR_PARTS)
+)
 
 RE_HUE = re.compile(r'(?i){angle}'.format(**_parse.COLOR_PARTS))
 RE_COLOR_START = re.compile(r'(?i)color\(\s*')
 RE_BLEND_END = re.compile(r'(?i)\s+({percent})(?:\s+(rgb|hsl|hwb))?\s*\)'.format(**_parse.COLOR_PARTS))
 RE_BRACKETS = re.compile(r'(?:(\()|(\))|[^()]+)')
 RE_MIN_CONTRAST_END = re.compile(r'(?i)\s+({float})\s*\)'.format(**_parse.COLOR_PARTS))
+RE_MATCH_PREFIX = re.compile(r'(?i)\#|[a-z][-a-z0-9]*(\()?')
 RE_VARS = re.compile(r'(?i)(?:(?<=^)|(?<=[\s\t\(,/]))(var\(\s*([-\w][-\w\d]*)\s*\))(?!\()(?=[\s\t\),/]|$)')
 
 
+# Color spaces that can match a color starting with the given prefix (lowercase).
+# `None` is used for a bare identifier (color names). Anything else is tried against all color spaces.
+MATCH_DISPATCH = {
+    "#": ("srgb",),
+    None: ("srgb",),
+    "rgb(": ("srgb",),
+    "rgba(": ("srgb",),
+    "hsl(": ("hsl",),
+    "hsla(": ("hsl",),
+    "hwb(": ("hwb",),
+    "lab(": ("lab",),
+    "lch(": ("lch",)
+}
+
+
+@functools.lru_cache(maxsize=256)
+def bracket_table(string):
+    """
+    Map the index of every `(` to the index just past its matching `)`.
+
+    The whole string is indexed in a single pass so that `bracket_match`, `validate_vars`
+    and `ColorMod` can all look up closing brackets instead of rescanning. Unbalanced
+    brackets are left out of the table. The result is cached as the same string is
+    inspected repeatedly while parsing nested color-mod expressions, so it must not be modified.
+    """
+
+    table = {}
+    stack = []
+    for m in RE_BRACKETS.finditer(string):
+        if m.group(1):
+            stack.append(m.start(1))
+        elif m.group(2) and stack:
+            table[stack.pop()] = m.end(2)
+    return table
+
+
 def bracket_match(match, string, start, fullmatch):
     """
     Make sure we can acquire a complete `func()` before we replace variables.
@@ -58,17 +92,9 @@ def bracket_match(match, string, start, fullmatch):
     """
 
     end = None
-    if match.match(string, start):
-        brackets = 1
-        for m in RE_BRACKETS.finditer(string, start + 6):
-            if m.group(2):
-                brackets -= 1
-            elif m.group(1):
-                brackets += 1
-
-            if brackets == 0:
-                end = m.end(2)
-                break
+    m = match.match(string, start)
+    if m:
+        end = bracket_table(string).get(string.index('(', start))
     return end if (not fullmatch or end == len(string)) else None
 
 
@@ -105,17 +131,7 @@ def validate_vars(var, good_vars):
                 # Validate things like `rgb()`, `contrast()` etc.
                 m = TOKENS["functions"].match(v, start)
                 if m:
-                    end = None
-                    brackets = 1
-                    for m in RE_BRACKETS.finditer(v, start + 6):
-                        if m.group(2):
-                            brackets -= 1
-                        elif m.group(1):
-                            brackets += 1
-
-                        if brackets == 0:
-                            end = m.end(0)
-                            break
+                    end = bracket_table(v).get(m.end(0) - 1)
                     if end is None:
                         break
                     start = end
@@ -153,6 +169,96 @@ def handle_vars(string, variables, parents=None):
     return RE_VARS.sub(functools.partial(_var_replace, var=temp_vars, parents=parent_vars), string)
 
 
+def _contrast(lum1, lum2):
+    """Get the contrast ratio of two luminance values."""
+
+    return (lum1 + 0.05) / (lum2 + 0.05) if lum1 > lum2 else (lum2 + 0.05) / (lum1 + 0.05)
+
+
+def _to_8bit(rgb):
+    """Get the 8 bit channels of sRGB coordinates, or `None` if they don't map exactly to 8 bit."""
+
+    channels = []
+    for c in rgb:
+        value = c * 255.0
+        channel = int(round(value))
+        if abs(value - channel) > 1e-6 or not 0 <= channel <= 255:
+            return None
+        channels.append(channel)
+    return tuple(channels)
+
+
+def _min_contrast(rgb1, rgb2, target):
+    """
+    Solve `min-contrast` for sRGB coordinates.
+
+    Moving HWB whiteness (or blackness) up while scaling the other down in proportion is the same
+    as mixing the gamma encoded sRGB color with white (or black), so the search is done directly on
+    the sRGB coordinates with only a luminance calculation per step. The steps, rounding and choice
+    of the final color follow the original HWB bisection, though without the HWB round trip's
+    floating point error a channel can, rarely, round to the next 8 bit step.
+
+    Returns the new sRGB coordinates, or `None` if the color should be left as is.
+    """
+
+    lum2 = luminance(rgb2)
+    ratio = _contrast(luminance(rgb1), lum2)
+
+    # Already meet the minimum contrast or the request is impossible
+    if ratio > target or target < 1:
+        return None
+
+    is_dark = lum2 < 0.5
+    if is_dark:
+        # Raise whiteness: mix with white
+        edge = 1.0
+        orig_mix = min(rgb1) * 100.0
+    else:
+        # Raise blackness: mix with black
+        edge = 0.0
+        orig_mix = (1.0 - max(rgb1)) * 100.0
+    min_mix = orig_mix
+    max_mix = 100.0
+    orig_ratio = ratio
+    last_ratio = 0
+    last_mix = 0
+
+    while abs(min_mix - max_mix) > 0.2:
+        mid_mix = round((max_mix + min_mix) / 2, 1)
+        factor = (mid_mix - orig_mix) / (100.0 - orig_mix)
+        ratio = _contrast(luminance([c + (edge - c) * factor for c in rgb1]), lum2)
+
+        if ratio < target:
+            min_mix = mid_mix
+        else:
+            max_mix = mid_mix
+
+        if (
+            (last_ratio < target and ratio > last_ratio) or
+            (ratio > target and ratio < last_ratio)
+        ):
+            last_ratio = ratio
+            last_mix = mid_mix
+
+    # Can't find a better color
+    if last_ratio < ratio and orig_ratio > last_ratio:
+        return None
+
+    # If we are lightening the color, then we'd like to round up to ensure we are over the luminance threshold
+    # as sRGB will clip off decimals. If we are darkening, then we want to just floor the values as the algorithm
+    # leans more to the light side.
+    factor = (last_mix - orig_mix) / (100.0 - orig_mix)
+    rnd = util.round_half_up if is_dark else math.floor
+    return tuple(rnd((c + (edge - c) * factor) * 255.0) / 255.0 for c in rgb1)
+
+
+@functools.lru_cache(maxsize=1024)
+def _min_contrast_8bit(rgb1, rgb2, target):
+    """Solve `min-contrast` for 8 bit sRGB channels and cache the result."""
+
+    return _min_contrast([c / 255.0 for c in rgb1], [c / 255.0 for c in rgb2], target)
+
+
 class ColorMod:
     """Color utilities."""
 
@@ -166,6 +272,14 @@ class ColorMod:
             "-": self._op_sub
         }
 
+        self.ADJUSTER_MAP = {
+            "alpha": self.process_alpha,
+            "saturation": self.process_hwb_hsl_channels,
+            "lightness": self.process_hwb_hsl_channels,
+            "min_contrast": self.process_min_contrast,
+            "blend": self.process_blend
+        }
+
         self.adjusting = False
         self._color = None
         self.fullmatch = fullmatch
@@ -208,6 +322,10 @@ class ColorMod:
         try:
             m = RE_COLOR_START.match(string, start)
             if m:
+                # Bail early if the `color(` is never closed, or doesn't span the whole string when it must.
+                end = bracket_table(string).get(string.index('(', start))
+                if end is None or (self.fullmatch and end != len(string)):
+                    raise ValueError("Found unterminated or invalid 'color('")
                 start = m.end(0)
                 m = RE_HUE.match(string, start)
                 if m:
@@ -241,30 +359,16 @@ class ColorMod:
                 self._color.fit(method="clip", in_place=True)
 
                 while not done:
-                    m = None
-                    name = None
-                    for key, pattern in RE_ADJUSTERS.items():
-                        name = key
-                        m = pattern.match(string, start)
-                        if m:
-                            start = m.end(0)
-                            break
+                    m = RE_ADJUSTER.match(string, start)
                     if m is None:
                         break
 
-                    if name == "alpha":
-                        start, hue = self.process_alpha(m, hue)
-                    elif name in ("saturation", "lightness"):
-                        start, hue = self.process_hwb_hsl_channels(name, m, hue)
-                    elif name == "min-contrast_start":
-                        start, hue = self.process_min_contrast(m, string, hue)
-                    elif name == "blend_start":
-                        start, hue = self.process_blend(m, string, hue)
-                    elif name == "end":
+                    name = m.lastgroup
+                    if name == "end":
                         done = True
                         start = m.end(0)
                     else:
-                        break
+                        start, hue = self.ADJUSTER_MAP[name](m, string, hue)
 
                     self._color.fit(method="clip", in_place=True)
             else:
@@ -303,31 +407,32 @@ class ColorMod:
         color, end = self._adjust(string, start=start)
         return color, end
 
-    def process_alpha(self, m, hue):
+    def process_alpha(self, m, string, hue):
         """Process alpha."""
 
-        if m.group(2):
-            value = m.group(2)
+        if m.group('alpha_value'):
+            value = m.group('alpha_value')
         else:
-            value = m.group(4)
+            value = m.group('alpha_mult_value')
         if value.endswith('%'):
             value = float(value.strip('%')) * _parse.SCALE_PERCENT
         else:
             value = float(value)
         op = ""
-        if m.group(1):
-            op = m.group(1).strip()
-        elif m.group(3):
-            op = m.group(3).strip()
+        if m.group('alpha_op'):
+            op = m.group('alpha_op').strip()
+        elif m.group('alpha_mult'):
+            op = m.group('alpha_mult').strip()
         self.alpha(value, op=op)
         return m.end(0), hue
 
-    def process_hwb_hsl_channels(self, name, m, hue):
+    def process_hwb_hsl_channels(self, m, string, hue):
         """Process HWB and HSL channels (except hue)."""
 
-        value = m.group(2)
+        name = m.lastgroup
+        value = m.group(name + '_value')
         value = float(value.strip('%'))
-        op = m.group(1).strip() if m.group(1) else ""
+        op = m.group(name + '_op').strip() if m.group(name + '_op') else ""
         getattr(self, name)(value, op=op, hue=hue)
         if not self._color.is_nan("hsl.hue"):
             hue = self._color.get("hsl.hue")
@@ -337,7 +442,7 @@ class ColorMod:
         """Process blend."""
 
         start = m.end(0)
-        alpha = m.group(0).strip().startswith('blenda')
+        alpha = m.group('blenda') is not None
         m = RE_COLOR_START.match(string, start)
         if m:
             color2, start = self._adjust(string, start=start)
@@ -370,7 +475,7 @@ class ColorMod:
         return start, hue
 
     def process_min_contrast(self, m, string, hue):
-        """Process blend."""
+        """Process min-contrast."""
 
         # Gather the min-contrast parameters
         start = m.end(0)
@@ -413,68 +518,19 @@ class ColorMod:
         this essentially fulfills the intention of their min-contrast.
         """
 
-        ratio = color1.contrast(color2)
-
-        # Already meet the minimum contrast or the request is impossible
-        if ratio > target or target < 1:
-            return
-
-        lum2 = color2.luminance()
+        rgb1 = util.no_nan((color1.convert("srgb") if color1.space() != "srgb" else color1).coords())
+        rgb2 = util.no_nan((color2.convert("srgb") if color2.space() != "srgb" else color2).coords())
 
-        is_dark = lum2 < 0.5
-        orig = color1.convert("hwb")
-        if is_dark:
-            primary = "whiteness"
-            secondary = "blackness"
-            min_mix = orig.whiteness
-            max_mix = 100.0
+        # Scheme colors are almost always 8 bit, so those results can be shared.
+        key1 = _to_8bit(rgb1)
+        key2 = _to_8bit(rgb2)
+        if key1 is not None and key2 is not None:
+            coords = _min_contrast_8bit(key1, key2, float(target))
         else:
-            primary = "blackness"
-            secondary = "whiteness"
-            min_mix = orig.blackness
-            max_mix = 100.0
-        orig_ratio = ratio
-        last_ratio = 0
-        last_mix = 0
-        last_other = 0
-
-        temp = orig.clone()
-        while abs(min_mix - max_mix) > 0.2:
-            mid_mix = round((max_mix + min_mix) / 2, 1)
-            mid_other = (
-                orig.get(secondary) -
-                ((mid_mix - orig.get(primary)) / (100.0 - orig.get(primary))) * orig.get(secondary)
-            )
-            temp.set(primary, mid_mix)
-            temp.set(secondary, mid_other)
-            ratio = temp.contrast(color2)
+            coords = _min_contrast(rgb1, rgb2, target)
 
-            if ratio < target:
-                min_mix = mid_mix
-            else:
-                max_mix = mid_mix
-
-            if (
-                (last_ratio < target and ratio > last_ratio) or
-                (ratio > target and ratio < last_ratio)
-            ):
-                last_ratio = ratio
-                last_mix = mid_mix
-                last_other = mid_other
-
-        # Can't find a better color
-        if last_ratio < ratio and orig_ratio > last_ratio:
-            return
-
-        # Use the best, last values
-        final = orig.new("hwb", [orig.hue, last_mix, last_other] if is_dark else [orig.hue, last_other, last_mix])
-        final = final.convert('srgb')
-        # If we are lightening the color, then we'd like to round up to ensure we are over the luminance threshold
-        # as sRGB will clip off decimals. If we are darkening, then we want to just floor the values as the algorithm
-        # leans more to the light side.
-        rnd = util.round_half_up if is_dark else math.floor
-        final = Color("srgb", [rnd(c * 255.0) / 255.0 for c in final.coords()], final.alpha)
-        color1.update(final)
+        if coords is not None:
+            color1.update(Color("srgb", list(coords), color1.alpha))
 
     def blend(self, color, percent, alpha=False, space="srgb"):
         """Blend color."""
@@ -554,6 +610,27 @@ class Color(ColorCSS):
             raise ValueError("Could not process the provided color")
         return obj
 
+    @classmethod
+    def _match_candidates(cls, string, start):
+        """
+        Get the color spaces that could match the color at `start` based on how it begins.
+
+        The first space to match is used. If the beginning isn't known, every space is tried, last
+        first, as the last space that matched used to win.
+        """
+
+        names = None
+        m = RE_MATCH_PREFIX.match(string, start)
+        if m:
+            # Hex colors and functions are keyed by their prefix, bare identifiers by `None`.
+            prefix = m.group(0).lower() if m.group(0) == '#' or m.group(1) else None
+            names = MATCH_DISPATCH.get(prefix)
+        if names:
+            candidates = [(name, cls.CS_MAP[name]) for name in names if name in cls.CS_MAP]
+            if candidates:
+                return candidates
+        return reversed(list(cls.CS_MAP.items()))
+
     @classmethod
     def _match(cls, string, start=0, fullmatch=False, filters=None, variables=None):
         """
@@ -590,13 +667,14 @@ class Color(ColorCSS):
         else:
             filters = set(filters) if filters is not None else set()
             obj = None
-            for space, space_class in cls.CS_MAP.items():
+            for space, space_class in cls._match_candidates(string, start):
                 if filters and space not in filters:
                     continue
                 value, match_end = space_class.match(string, start, fullmatch)
                 if value is not None:
                     color = space_class(*value)
                     obj = ColorMatch(color, start, match_end)
+                    break
             if obj is not None and end:
                 obj.end = end
             return obj
@@ -3,11 +3,10 @@ from mdpopups.coloraide import Color
 from mdpopups.coloraide.spaces.srgb.css import SRGB
 from mdpopups.coloraide.spaces import _parse
 from mdpopups.coloraide import util
+from .rgba import HEX_BYTE, round_half_up
 import copy
 import re
 
-RE_COMPRESS = re.compile(r'(?i)^#({hex})\1({hex})\2({hex})\3(?:({hex})\4)?$'.format(**_parse.COLOR_PARTS))
-
 name2hex_map = {
     "black": "#000000",
     "aliceblue": "#f0f8ff",
@@ -702,37 +701,29 @@ class SRGBX11(SRGB):
 
         options = kwargs
 
-        value = ''
         a = util.no_nan(self.alpha)
         alpha = alpha is not False and (alpha is True or a < 1.0)
-        hex_upper = options.get("upper", False)
-        compress = options.get("compress", False)
-        method = None if not isinstance(fit, str) else fit
-        coords = util.no_nan(parent.fit(method=method).coords())
 
-        template = "#{:02x}{:02x}{:02x}{:02x}" if alpha else "#{:02x}{:02x}{:02x}"
-        if hex_upper:
-            template = template.upper()
+        # Colors are nearly always in gamut already, so only fit the ones that aren't.
+        coords = parent.coords()
+        if not all(0.0 <= c <= 1.0 for c in coords):
+            method = None if not isinstance(fit, str) else fit
+            coords = util.no_nan(parent.fit(method=method).coords())
 
+        h = (
+            '#' +
+            HEX_BYTE[round_half_up(coords[0] * 255.0)] +
+            HEX_BYTE[round_half_up(coords[1] * 255.0)] +
+            HEX_BYTE[round_half_up(coords[2] * 255.0)]
+        )
         if alpha:
-            h = template.format(
-                int(util.round_half_up(coords[0] * 255.0)),
-                int(util.round_half_up(coords[1] * 255.0)),
-                int(util.round_half_up(coords[2] * 255.0)),
-                int(util.round_half_up(util.no_nan(self.alpha) * 255.0))
-            )
-        else:
-            h = template.format(
-                int(util.round_half_up(coords[0] * 255.0)),
-                int(util.round_half_up(coords[1] * 255.0)),
-                int(util.round_half_up(coords[2] * 255.0))
-            )
+            h += HEX_BYTE[round_half_up(a * 255.0)]
+        if options.get("upper", False):
+            h = h.upper()
 
         value = h
-        if compress:
-            m = RE_COMPRESS.match(value)
-            if m:
-                value = m.expand(r"#\1\2\3\4") if alpha else m.expand(r"#\1\2\3")
+        if options.get("compress", False) and all(h[i] == h[i + 1] for i in range(1, len(h), 2)):
+            value = '#' + h[1::2]
 
         if options.get("names"):
             length = len(h) - 1
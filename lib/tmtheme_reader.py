@@ -0,0 +1,161 @@
+"""
+Incremental `tmTheme` reader.
+
+Parses a `tmTheme` (XML property list) with `expat`, one chunk at a time, handing each entry
+of the top level `settings` array to a callback as soon as it is complete. Only the entry
+being read is held in memory, so a large scheme never exists as a full property list tree.
+XML comments are skipped by the parser; comments and white space before the XML declaration
+(which the XML spec doesn't allow, but `tmTheme` files have been seen with) are dropped.
+"""
+import xml.parsers.expat
+
+CHUNK_SIZE = 64 * 1024
+
+
+class TmThemeReader(object):
+    """
+    Incremental `tmTheme` reader.
+
+    Feed it data with `feed` and finish with `close`, which returns the top level dictionary
+    without the `settings` array. Each dictionary in `settings` is passed to `on_setting`.
+    """
+
+    def __init__(self, on_setting):
+        """Initialize."""
+
+        self.on_setting = on_setting
+        self.parser = xml.parsers.expat.ParserCreate()
+        self.parser.buffer_text = True
+        self.parser.StartElementHandler = self.start_element
+        self.parser.EndElementHandler = self.end_element
+        self.parser.CharacterDataHandler = self.character_data
+        # Each level is `[container, pending dictionary key, is top level settings array]`
+        self.stack = []
+        self.text = []
+        self.root = None
+        self.head = b''
+        self.started = False
+
+    def skip_head(self):
+        """
+        Drop white space and comments before the document start.
+
+        Returns the data to parse, or `None` if more data is needed to find the start.
+        """
+
+        head = self.head
+        while True:
+            head = head.lstrip()
+            if head.startswith(b'<!--'):
+                end = head.find(b'-->', 4)
+                if end == -1:
+                    self.head = head
+                    return None
+                head = head[end + 3:]
+            elif len(head) < 4 and b'<!--'.startswith(head):
+                self.head = head
+                return None
+            else:
+                self.head = b''
+                self.started = True
+                return head
+
+    def feed(self, data):
+        """Feed a chunk of bytes to the reader."""
+
+        if not self.started:
+            self.head += data
+            data = self.skip_head()
+            if data is None:
+                return
+        self.parser.Parse(data, False)
+
+    def close(self):
+        """Finish parsing and return the top level dictionary (without `settings`)."""
+
+        data = self.head if not self.started else b''
+        self.started = True
+        self.head = b''
+        self.parser.Parse(data, True)
+        return self.root if self.root is not None else {}
+
+    def start_element(self, tag, attrs):
+        """Handle element start."""
+
+        self.text = []
+        if tag == 'dict':
+            self.stack.append([{}, None, False])
+        elif tag == 'array':
+            is_settings = len(self.stack) == 1 and self.stack[0][1] == 'settings'
+            self.stack.append([[], None, is_settings])
+
+    def end_element(self, tag):
+        """Handle element end."""
+
+        if tag == 'key':
+            self.stack[-1][1] = ''.join(self.text)
+            return
+        elif tag in ('dict', 'array'):
+            value = self.stack.pop()[0]
+        elif tag == 'string':
+            value = ''.join(self.text)
+        elif tag == 'integer':
+            value = int(''.join(self.text))
+        elif tag == 'real':
+            value = float(''.join(self.text))
+        elif tag == 'true':
+            value = True
+        elif tag == 'false':
+            value = False
+        elif tag in ('date', 'data'):
+            value = ''.join(self.text).strip()
+        else:
+            return
+        self.add_value(value)
+
+    def character_data(self, data):
+        """Handle character data."""
+
+        self.text.append(data)
+
+    def add_value(self, value):
+        """Add a completed value to its parent, or hand it off if it is a `settings` entry."""
+
+        if not self.stack:
+            self.root = value
+            return
+
+        parent = self.stack[-1]
+        if isinstance(parent[0], dict):
+            key = parent[1]
+            parent[1] = None
+            # The top level `settings` have already been handed off.
+            if key is not None and not (len(self.stack) == 1 and key == 'settings'):
+                parent[0][key] = value
+        elif parent[2]:
+            if isinstance(value, dict):
+                self.on_setting(value)
+        else:
+            parent[0].append(value)
+
+
+def read_tmtheme(source, on_setting, chunk_size=CHUNK_SIZE):
+    """
+    Read a `tmTheme` from bytes or a binary file object.
+
+    Each entry of the `settings` array is passed to `on_setting`, and the remaining
+    top level dictionary is returned.
+    """
+
+    reader = TmThemeReader(on_setting)
+    if isinstance(source, bytes):
+        view = memoryview(source)
+        for index in range(0, len(source), chunk_size):
+            reader.feed(view[index:index + chunk_size].tobytes())
+    else:
+        while True:
+            data = source.read(chunk_size)
+            if not data:
+                break
+            reader.feed(data)
+    return reader.close()
@@ -0,0 +1,161 @@
+"""
+Direct `tmTheme` writer.
+
+Writes a `tmTheme` (XML property list) straight to a binary file object, one `settings` entry
+at a time, instead of building the whole tree and serializing it with `plistlib`. Entries of the
+known `tmTheme` shape (dictionaries of strings, one level of nested `settings`) are written with
+pre-built line templates; anything else falls back to a generic writer. The output is byte for
+byte what `plistlib` writes for the same data (sorted keys, tab indentation, `&`, `<`, and `>`
+escaped and `CR`/`CRLF` line endings converted to `LF`).
+"""
+import os
+import re
+
+PLIST_HEAD = (
+    b'<?xml version="1.0" encoding="UTF-8"?>\n'
+    b'<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">\n'
+    b'<plist version="1.0">\n'
+    b'<dict>\n'
+)
+PLIST_TAIL = b'</dict>\n</plist>\n'
+
+RE_ESCAPE = re.compile(r'[\x00-\x08\x0b-\x1f&<>]')
+RE_CONTROL = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Entries are written this many at a time to keep the number of `write` calls down.
+BATCH_SIZE = 64
+
+
+def escape(text):
+    """Escape text the way `plistlib` does."""
+
+    if RE_ESCAPE.search(text) is None:
+        return text
+    if RE_CONTROL.search(text) is not None:
+        raise ValueError("strings can't contain control characters; use bytes instead")
+    return text.replace(
+        '\r\n', '\n'
+    ).replace('\r', '\n').replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def write_value(value, level, out):
+    """Append the lines of a generic property list value at the given indentation level to `out`."""
+
+    indent = '\t' * level
+    if isinstance(value, str):
+        out.append('%s<string>%s</string>\n' % (indent, escape(value)))
+    elif isinstance(value, bool):
+        out.append(indent + ('<true/>\n' if value else '<false/>\n'))
+    elif isinstance(value, int):
+        out.append('%s<integer>%d</integer>\n' % (indent, value))
+    elif isinstance(value, float):
+        out.append('%s<real>%r</real>\n' % (indent, value))
+    elif isinstance(value, dict):
+        if not value:
+            out.append(indent + '<dict/>\n')
+            return
+        out.append(indent + '<dict>\n')
+        for k, v in sorted(value.items()):
+            if not isinstance(k, str):
+                raise TypeError("keys must be strings")
+            out.append('%s\t<key>%s</key>\n' % (indent, escape(k)))
+            write_value(v, level + 1, out)
+        out.append(indent + '</dict>\n')
+    elif isinstance(value, (list, tuple)):
+        if not value:
+            out.append(indent + '<array/>\n')
+            return
+        out.append(indent + '<array>\n')
+        for v in value:
+            write_value(v, level + 1, out)
+        out.append(indent + '</array>\n')
+    else:
+        raise TypeError("unsupported type: %s" % type(value))
+
+
+def write_setting(entry, out):
+    """
+    Append the lines of a `settings` array entry to `out`.
+
+    Entries are expected to be a dictionary of strings with a nested `settings` dictionary
+    of strings; other values are handed to `write_value`.
+    """
+
+    if not entry:
+        out.append('\t\t<dict/>\n')
+        return
+    out.append('\t\t<dict>\n')
+    for key, value in sorted(entry.items()):
+        out.append('\t\t\t<key>%s</key>\n' % escape(key))
+        if isinstance(value, str):
+            out.append('\t\t\t<string>%s</string>\n' % escape(value))
+        elif key == 'settings' and isinstance(value, dict):
+            if not value:
+                out.append('\t\t\t<dict/>\n')
+                continue
+            out.append('\t\t\t<dict>\n')
+            for k, v in sorted(value.items()):
+                out.append('\t\t\t\t<key>%s</key>\n' % escape(k))
+                if isinstance(v, str):
+                    out.append('\t\t\t\t<string>%s</string>\n' % escape(v))
+                else:
+                    write_value(v, 4, out)
+            out.append('\t\t\t</dict>\n')
+        else:
+            write_value(value, 3, out)
+    out.append('\t\t</dict>\n')
+
+
+def write_tmtheme(f, root, settings):
+    """
+    Write a `tmTheme` to the binary file object `f`.
+
+    `root` is the top level dictionary without `settings`, and `settings` is an iterable
+    of the `settings` array entries, which is consumed as it is written.
+    """
+
+    keys = sorted(k for k in root if k != 'settings')
+    keys.append('settings')
+    keys.sort()
+
+    f.write(PLIST_HEAD)
+    for key in keys:
+        out = ['\t<key>%s</key>\n' % escape(key)]
+        if key != 'settings':
+            write_value(root[key], 1, out)
+            f.write(''.join(out).encode('utf-8'))
+            continue
+
+        count = 0
+        out.append('\t<array>\n')
+        for entry in settings:
+            write_setting(entry, out)
+            count += 1
+            if count % BATCH_SIZE == 0:
+                f.write(''.join(out).encode('utf-8'))
+                del out[:]
+        if count:
+            out.append('\t</array>\n')
+        else:
+            out = ['\t<key>settings</key>\n\t<array/>\n']
+        f.write(''.join(out).encode('utf-8'))
+    f.write(PLIST_TAIL)
+
+
+def save_tmtheme(path, root, settings):
+    """
+    Write a `tmTheme` to the file, replacing it only once it is completely written.
+
+    The file is written to `<path>.tmp` and moved into place, so a failure part way through
+    leaves the old file as it was instead of a truncated one.
+    """
+
+    temp = path + '.tmp'
+    try:
+        with open(temp, 'wb') as f:
+            write_tmtheme(f, root, settings)
+        os.replace(temp, path)
+    except Exception:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
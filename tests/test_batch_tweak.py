@@ -0,0 +1,76 @@
+"""Test the batch color scheme tweaker."""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from tools import batch_tweak
+
+try:
+    import mdpopups
+except ImportError:
+    mdpopups = None
+
+SCHEME = {
+    "name": "Test",
+    "globals": {"background": "#272822", "foreground": "#f8f8f2"},
+    "rules": [{"scope": "comment", "foreground": "#75715e"}]
+}
+
+
+class TestBatch(unittest.TestCase):
+    """Test tweaking schemes in bulk."""
+
+    def setUp(self):
+        """Setup."""
+
+        self.folder = tempfile.mkdtemp()
+        self.output = os.path.join(self.folder, 'out')
+
+    def tearDown(self):
+        """Cleanup."""
+
+        sys.modules.pop('sublime', None)
+        shutil.rmtree(self.folder)
+
+    def scheme(self, *parts):
+        """Write the test scheme to the path under the folder and return the path."""
+
+        path = os.path.join(self.folder, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(SCHEME, f)
+        return path
+
+    def test_same_name(self):
+        """Test schemes with the same name fail instead of overwriting each other's variants."""
+
+        first = self.scheme('a', 'X.sublime-color-scheme')
+        second = self.scheme('b', 'X.sublime-color-scheme')
+        third = self.scheme('c', 'X.hidden-color-scheme')
+        variants = {'Dimmed': 'brightness(0.9)'}
+        results = batch_tweak.batch([first, second, first, third], variants, self.output, processes=1)
+        self.assertEqual([scheme for scheme, error in results["failed"] if first in error], [second, third])
+
+    @unittest.skipIf(mdpopups is None, 'mdpopups is not available')
+    def test_batch(self):
+        """Test variants are written, then skipped until forced."""
+
+        schemes = [self.scheme('a', 'X.sublime-color-scheme'), self.scheme('b', 'Y.sublime-color-scheme')]
+        variants = {'Dimmed': 'brightness(0.9)', 'Sepia': 'sepia'}
+        results = batch_tweak.batch(schemes, variants, self.output, processes=1)
+        self.assertEqual(results["failed"], [])
+        self.assertEqual(
+            sorted(os.path.basename(path) for path in results["written"]),
+            [
+                'X (Dimmed).sublime-color-scheme', 'X (Sepia).sublime-color-scheme',
+                'Y (Dimmed).sublime-color-scheme', 'Y (Sepia).sublime-color-scheme'
+            ]
+        )
+
+        results = batch_tweak.batch(schemes, variants, self.output, processes=1)
+        self.assertEqual((len(results["written"]), len(results["skipped"])), (0, 4))
+
+        results = batch_tweak.batch(schemes, variants, self.output, force=True, processes=1)
+        self.assertEqual((len(results["written"]), len(results["unchanged"])), (0, 4))
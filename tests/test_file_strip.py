@@ -0,0 +1,185 @@
+"""Test JSON sanitizing."""
+import io
+import json
+import random
+import unittest
+from lib.file_strip import json as json_strip
+from lib.file_strip.comments import Comments, strip_stream
+from lib.file_strip.json import sanitize_json, strip_comments, strip_dangling_commas
+
+SAMPLES = [
+    '{"a": [1, 2, ], "b": {"c": "//not a comment", }, }',
+    '[1, /* comment */ ]',
+    '[1, // comment\n]',
+    '{"a": "x,]", "b": "y,}", "c": "/* not */"}',
+    '// head\n{"a": 1 /* multi \n line */, "b": "it\'s"}\n',
+    '{"a": "escaped \\" // quote", }',
+    '[1 , \r\n /* a \r\n b */ \r\n ]',
+    '{"a": [[], {}, ], }',
+    '{}',
+    '[1, // not the end ]\n 2]'
+]
+
+
+class TestSanitizeJson(unittest.TestCase):
+    """Test JSON sanitizing."""
+
+    def test_sanitize(self):
+        """Test the single pass sanitizer gives the same result as stripping comments, then commas."""
+
+        for preserve_lines in (False, True):
+            for sample in SAMPLES:
+                expected = strip_dangling_commas(strip_comments(sample, preserve_lines), preserve_lines)
+                self.assertEqual(json.loads(sanitize_json(sample, preserve_lines)), json.loads(expected))
+
+    def test_preserve_lines(self):
+        """Test line breaks are preserved."""
+
+        for sample in SAMPLES:
+            self.assertEqual(sanitize_json(sample, True).count('\n'), sample.count('\n'))
+
+    def test_preserve_crlf(self):
+        """Test `CRLF` line endings in comments are preserved whole."""
+
+        text = '{\r\n/* a\r\n b */\r\n"a": 1 // c\r\n}'
+        self.assertEqual(strip_comments(text, True), '{\r\n\r\n\r\n"a": 1 \r\n}')
+        self.assertEqual(''.join(strip_stream([text], True)), '{\r\n\r\n\r\n"a": 1 \r\n}')
+        self.assertEqual(Comments('python', True).strip('a = 1  # c\r\n# d\r\n'), 'a = 1  \r\n\r\n')
+
+    def test_unchanged(self):
+        """Test clean JSON is returned as is."""
+
+        text = '{"a": [1, 2], "b": "//, ]"}'
+        self.assertIs(sanitize_json(text), text)
+
+    def test_load(self):
+        """Test loading tries plain JSON first and counts how often sanitizing was skipped."""
+
+        json_strip.reset_stats()
+        self.assertEqual(json_strip.load_json('{"a": "http://x"}'), {"a": "http://x"})
+        self.assertEqual(json_strip.load_json('{"a": [1, ], // c\n}'), {"a": [1]})
+        self.assertEqual(json_strip.STATS, {"sanitize": 0, "clean": 0, "load": 2, "load_direct": 1})
+
+
+class TestStream(unittest.TestCase):
+    """Test streaming comment stripping and decoding."""
+
+    def chunks(self, text, size):
+        """Split text into chunks."""
+
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    def test_strip_stream(self):
+        """Test the streaming stripper matches the regular stripper for any chunk size."""
+
+        for preserve_lines in (False, True):
+            for sample in SAMPLES:
+                expected = Comments('json', preserve_lines).strip(sample)
+                for size in (1, 2, 3, 7, 100):
+                    self.assertEqual(''.join(strip_stream(self.chunks(sample, size), preserve_lines)), expected)
+
+    def test_load_stream(self):
+        """Test stream loading matches sanitizing and loading for any chunk size."""
+
+        for sample in SAMPLES + ['[-0, 0.5, 10, 1E+2, true, false, null, "\\u00e9\\""]', ' 12 ']:
+            expected = json.loads(sanitize_json(sample))
+            for size in (1, 2, 3, 7, 100):
+                self.assertEqual(json_strip.load_json_stream(io.StringIO(sample), size), expected)
+
+    def test_stream_errors(self):
+        """Test errors are reported like `json.loads` does."""
+
+        for sample in ('{"a" 1}', '[1 2]', '[1]]', '{"a":\n  tru}', '"abc', '[\n\n  1, x]', ''):
+            with self.assertRaises(ValueError) as expected:
+                json.loads(sample)
+            for size in (1, 100):
+                decoder = json_strip.JsonStreamDecoder()
+                with self.assertRaises(ValueError) as actual:
+                    for chunk in self.chunks(sample, size):
+                        decoder.feed(chunk)
+                    decoder.close()
+                self.assertEqual(str(actual.exception), str(expected.exception))
+
+
+SEPARATORS = ['', ' ', '\n', '\r\n', '\t', '/* c */', '// c\n', '/* a\n * b, ] */', ' /**/ ', '//, }\n']
+STRINGS = ['', 'a', '//', '/* x */', '*/', ', ]', '}', 'quote " and \\ slash', '\u00e9\u4e2d', 'line\nbreak', "it's"]
+
+
+class TestParseJson(unittest.TestCase):
+    """Test the one pass parser against sanitizing and loading."""
+
+    def value(self, rand, depth=0):
+        """Generate a random value."""
+
+        kind = rand.randint(0, 8 if depth < 4 else 4)
+        if kind == 0:
+            return rand.randint(-1000, 1000)
+        elif kind == 1:
+            return rand.choice([0.5, -2.25, 1e10, 3.0])
+        elif kind == 2:
+            return rand.choice([True, False, None])
+        elif kind in (3, 4):
+            return rand.choice(STRINGS)
+        elif kind in (5, 6):
+            return [self.value(rand, depth + 1) for _ in range(rand.randint(0, 4))]
+        return {rand.choice(STRINGS) + str(i): self.value(rand, depth + 1) for i in range(rand.randint(0, 4))}
+
+    def dump(self, rand, value):
+        """Dump a value with random white space, comments and dangling commas."""
+
+        def sep():
+            """Get a random separator."""
+
+            return rand.choice(SEPARATORS)
+
+        if isinstance(value, (list, dict)):
+            if isinstance(value, list):
+                items = [sep() + self.dump(rand, v) + sep() for v in value]
+            else:
+                items = [
+                    sep() + json.dumps(k) + sep() + ':' + sep() + self.dump(rand, v) + sep() for k, v in value.items()
+                ]
+            brackets = '[]' if isinstance(value, list) else '{}'
+            dangling = ',' + sep() if items and rand.random() < 0.5 else ''
+            return brackets[0] + ','.join(items) + dangling + sep() + brackets[1]
+        return json.dumps(value, ensure_ascii=rand.random() < 0.5)
+
+    def sanitize_and_load(self, text):
+        """Load the way it used to be done."""
+
+        try:
+            return json.loads(sanitize_json(text))
+        except ValueError:
+            return ValueError
+
+    def parse(self, text):
+        """Parse with the one pass parser."""
+
+        try:
+            return json_strip.parse_json(text)
+        except ValueError:
+            return ValueError
+
+    def test_fuzz(self):
+        """Test valid and mutated documents give the same result (or both fail)."""
+
+        rand = random.Random(0)
+        for _ in range(500):
+            value = self.value(rand)
+            text = rand.choice(SEPARATORS) + self.dump(rand, value) + rand.choice(SEPARATORS)
+            self.assertEqual(self.parse(text), value)
+            self.assertEqual(self.sanitize_and_load(text), value)
+
+            pos = rand.randint(0, len(text))
+            if rand.random() < 0.5:
+                text = text[:pos] + text[pos + 1:]
+            else:
+                text = text[:pos] + rand.choice(',/*[]{}":a1 \n') + text[pos:]
+            self.assertEqual(self.parse(text), self.sanitize_and_load(text), text)
+
+    def test_error_position(self):
+        """Test errors report the position in the original text."""
+
+        with self.assertRaises(ValueError) as e:
+            json_strip.parse_json('{\n  // comment, with "quotes"\n  "a": 1, /* x */\n  "b" 2\n}')
+        self.assertEqual(str(e.exception), "Expecting ':' delimiter: line 4 column 7 (char 54)")
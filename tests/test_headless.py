@@ -0,0 +1,65 @@
+"""Test the headless `sublime` stand-in."""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from tools import headless
+
+
+class TestHeadless(unittest.TestCase):
+    """Test the headless `sublime` stand-in."""
+
+    def setUp(self):
+        """Setup."""
+
+        self.data = tempfile.mkdtemp()
+        for package, name, content in (
+            ('User', 'Test.sublime-settings', b'{\r\n    "a": [1, ], // comment\r\n}\r\n'),
+            ('Another', 'sub/Test.sublime-settings', b'{}'),
+            ('Default', 'Test.sublime-settings', b'{}')
+        ):
+            pth = os.path.join(self.data, 'Packages', package, name)
+            os.makedirs(os.path.dirname(pth), exist_ok=True)
+            with open(pth, 'wb') as f:
+                f.write(content)
+        self.sublime = headless.install(self.data, '4169')
+
+    def tearDown(self):
+        """Cleanup."""
+
+        sys.modules.pop('sublime', None)
+        sys.modules.pop('sublime_plugin', None)
+        shutil.rmtree(self.data)
+
+    def test_resources(self):
+        """Test resources are found in load order and loaded."""
+
+        self.assertIs(sys.modules['sublime'], self.sublime)
+        self.assertEqual(
+            self.sublime.find_resources('Test.sublime-settings'),
+            [
+                'Packages/Default/Test.sublime-settings',
+                'Packages/Another/sub/Test.sublime-settings',
+                'Packages/User/Test.sublime-settings'
+            ]
+        )
+        text = self.sublime.load_resource('Packages/User/Test.sublime-settings')
+        self.assertNotIn('\r', text)
+        self.assertEqual(self.sublime.decode_value(text), {"a": [1]})
+        self.assertEqual(self.sublime.load_binary_resource('Packages/Another/sub/Test.sublime-settings'), b'{}')
+        with self.assertRaises(IOError):
+            self.sublime.load_resource('Packages/User/Missing.sublime-settings')
+
+    def test_score_selector(self):
+        """Test deeper and more specific matches score higher, and exclusions don't match."""
+
+        scope = 'source.python meta.function string.quoted.double'
+        score = self.sublime.score_selector
+        self.assertEqual(score(scope, 'comment'), 0)
+        self.assertEqual(score(scope, 'string - meta.function'), 0)
+        self.assertEqual(score(scope, 'meta.class string'), 0)
+        self.assertGreater(score(scope, 'string'), score(scope, 'meta.function'))
+        self.assertGreater(score(scope, 'string.quoted'), score(scope, 'string'))
+        self.assertGreater(score(scope, 'source string'), score(scope, 'string'))
+        self.assertEqual(score(scope, 'comment, string'), score(scope, 'string'))
@@ -4,17 +4,24 @@ from . import validate_json_format
 import os
 import fnmatch
 
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Version control, tool and cache folders (see `.gitignore`) aren't part of the package.
+EXCLUDE = (
+    '.svn', '.git', '.tox', '.nox', '.venv', 'venv', '__pycache__', '.pytest_cache', '.mypy_cache', '.ruff_cache'
+)
+
 
 class TestSettings(unittest.TestCase):
     """Test JSON settings."""
 
-    def _get_json_files(self, pattern, folder='.'):
+    def _get_json_files(self, pattern, folder=ROOT):
         """Get JSON files."""
 
         for root, dirnames, filenames in os.walk(folder):
             for filename in fnmatch.filter(filenames, pattern):
                 yield os.path.join(root, filename)
-            dirnames[:] = [d for d in dirnames if d not in ('.svn', '.git', '.tox')]
+            dirnames[:] = [d for d in dirnames if d not in EXCLUDE]
 
     def test_json_settings(self):
         """Test each JSON file."""
@@ -28,9 +35,14 @@ class TestSettings(unittest.TestCase):
             '*.sublime-color-scheme'
         )
 
-        for pattern in patterns:
-            for f in self._get_json_files(pattern):
-                self.assertFalse(
-                    validate_json_format.CheckJsonFormat(False, True).check_format(f),
-                    "%s does not comform to expected format!" % f
-                )
+        files = [f for pattern in patterns for f in self._get_json_files(pattern)]
+        report = validate_json_format.check_files(files, False, True)
+        failed = [entry for entry in report["files"] if entry["violations"]]
+        self.assertFalse(
+            failed,
+            "\n".join(
+                "%s does not comform to expected format: %s" % (
+                    entry["file"], ', '.join(v["code"] for v in entry["violations"])
+                ) for entry in failed
+            )
+        )
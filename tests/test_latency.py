@@ -0,0 +1,43 @@
+"""Test the latency statistics."""
+import unittest
+from lib import latency
+
+
+class TestLatency(unittest.TestCase):
+    """Test the latency statistics."""
+
+    def tearDown(self):
+        """Cleanup."""
+
+        latency.enable(False)
+        latency.reset()
+
+    def test_disabled(self):
+        """Test nothing is recorded when disabled."""
+
+        recorder = latency.start('run')
+        recorder.mark('lock')
+        recorder.done()
+        self.assertIs(recorder, latency.NULL_RECORDER)
+        self.assertEqual(latency.summary(), {})
+
+    def test_summary(self):
+        """Test timings are summarized per command and phase, keeping the most recent ones."""
+
+        latency.enable()
+        recorder = latency.start('run')
+        recorder.mark('lock')
+        recorder.mark('filter')
+        recorder.done()
+        for ms in range(latency.SAMPLES + 100):
+            latency.record('undo', 'filter', ms / 1000.0)
+
+        stats = latency.summary()
+        self.assertEqual(sorted(stats['run']), ['filter', 'lock', 'total'])
+        undo = stats['undo']['filter']
+        self.assertEqual(undo['count'], latency.SAMPLES)
+        self.assertAlmostEqual(undo['max'], latency.SAMPLES + 99)
+        self.assertAlmostEqual(undo['p50'], 100 + latency.SAMPLES // 2 - 1)
+        self.assertEqual(sum(undo['histogram'].values()), latency.SAMPLES)
+        self.assertEqual(undo['histogram']['<=100ms'], 1)
+        self.assertEqual(undo['histogram']['<=200ms'], 100)
@@ -0,0 +1,116 @@
+"""Test the profiler."""
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+from lib import profiler
+
+
+class TestProfiler(unittest.TestCase):
+    """Test the profiler."""
+
+    def setUp(self):
+        """Setup."""
+
+        self.folder = tempfile.mkdtemp()
+        self.saved = []
+        self.errors = []
+
+    def callback(self, paths, error):
+        """Record the saved paths or the error."""
+
+        if error is None:
+            self.saved.append(paths)
+        else:
+            self.errors.append(error)
+
+    def tearDown(self):
+        """Cleanup."""
+
+        profiler.disarm()
+        shutil.rmtree(self.folder)
+
+    def test_profiled(self):
+        """Test only the armed number of calls are profiled, and their results saved."""
+
+        @profiler.profiled('work')
+        def work(value):
+            """Allocate some memory."""
+
+            return len([str(i) for i in range(value)])
+
+        self.assertEqual(work(10), 10)
+        self.assertEqual(os.listdir(self.folder), [])
+
+        profiler.arm(self.folder, 2, callback=self.callback)
+        for _ in range(3):
+            self.assertEqual(work(1000), 1000)
+        self.assertEqual(profiler.remaining(), 0)
+        self.assertEqual(len(self.saved), 2)
+        self.assertEqual(len(os.listdir(self.folder)), 4)
+
+        pstats_file, report_file = self.saved[0]
+        self.assertTrue(pstats_file.endswith('-work.pstats'))
+        with open(report_file, 'r') as f:
+            report = f.read()
+        self.assertIn('Profile of work', report)
+        self.assertIn('Top allocations', report)
+
+    def test_exception(self):
+        """Test the profile is saved even if the call fails."""
+
+        def fail():
+            """Fail."""
+
+            raise ValueError('fail')
+
+        with self.assertRaises(ValueError):
+            profiler.profile(self.folder, 'fail', fail, memory=False, callback=self.callback)
+        self.assertEqual(len(self.saved), 1)
+        with open(self.saved[0][1], 'r') as f:
+            self.assertNotIn('Top allocations', f.read())
+
+    def test_save_error(self):
+        """Test failing to save doesn't hide the call's exception, and is reported."""
+
+        def fail():
+            """Fail."""
+
+            raise ValueError('fail')
+
+        folder = os.path.join(self.folder, 'file')
+        with open(folder, 'w'):
+            pass
+        with self.assertRaises(ValueError):
+            profiler.profile(folder, 'fail', fail, memory=False, callback=self.callback)
+        self.assertEqual(self.saved, [])
+        self.assertEqual(len(self.errors), 1)
+
+    def test_nested(self):
+        """Test `profiled` calls made while profiling aren't profiled again."""
+
+        @profiler.profiled('inner')
+        def inner():
+            """Return a value."""
+
+            return 1
+
+        profiler.arm(self.folder, 1, callback=self.callback)
+        self.assertEqual(profiler.profile(self.folder, 'outer', inner, memory=False, callback=self.callback), 1)
+        self.assertEqual(len(self.saved), 1)
+        self.assertEqual(profiler.remaining(), 1)
+
+    def test_tracing(self):
+        """Test tracing started before profiling is left running."""
+
+        tracemalloc.start()
+        try:
+            profiler.profile(self.folder, 'work', list, (range(100),), callback=self.callback)
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            tracemalloc.stop()
+        with open(self.saved[0][1], 'r') as f:
+            report = f.read()
+        self.assertIn('Top allocations', report)
+        self.assertNotIn('peak', report)
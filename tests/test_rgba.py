@@ -0,0 +1,64 @@
+"""Test RGBA."""
+import unittest
+from lib.rgba import RGBA
+
+
+class TestRGBA(unittest.TestCase):
+    """Test the lightweight sRGB color."""
+
+    def test_hex_round_trip(self):
+        """Test parsing and formatting hex colors."""
+
+        self.assertEqual(RGBA.from_hex('#F8F8F2').to_hex(), '#f8f8f2')
+        self.assertEqual(RGBA.from_hex('#49483E80').to_hex(), '#49483e80')
+        self.assertEqual(RGBA.from_hex('#fff').to_hex(), '#ffffff')
+        self.assertEqual(RGBA.from_hex('#0008').to_hex(), '#00000088')
+        self.assertEqual(RGBA.from_hex('#272822').to_hex(alpha=True), '#272822ff')
+        self.assertEqual(RGBA.from_hex('#27282280').to_hex(alpha=False), '#272822')
+
+    def test_bad_hex(self):
+        """Test invalid hex colors."""
+
+        for value in ('#ff', '#fffff', 'ffffff', '#ggg', '#ffffff '):
+            with self.assertRaises(ValueError):
+                RGBA.from_hex(value)
+
+    def test_clip(self):
+        """Test out of range channels are clipped on output."""
+
+        self.assertEqual(RGBA(1.2, -0.1, 0.5).to_hex(), '#ff0080')
+
+    def test_compose(self):
+        """Test alpha compositing."""
+
+        color = RGBA.from_hex('#ff000080').compose(RGBA.from_hex('#0000ff'))
+        self.assertEqual(color.to_hex(alpha=True), '#80007fff')
+        self.assertEqual(RGBA.from_hex('#123456').compose(RGBA.from_hex('#ffffff')).to_hex(), '#123456')
+
+    def test_hsl(self):
+        """Test HSL conversion."""
+
+        h, s, l = RGBA.from_hex('#ff0000').hsl()
+        self.assertEqual((h, s, l), (0.0, 1.0, 0.5))
+        h, s, l = RGBA.from_hex('#808080').hsl()
+        self.assertNotEqual(h, h)
+        self.assertEqual(s, 0.0)
+        for value in ('#f8f8f2', '#66d9ef', '#a6e22e', '#f92672', '#272822'):
+            color = RGBA.from_hex(value)
+            self.assertEqual(RGBA.from_hsl(*color.hsl()).to_hex(), value)
+
+    def test_luminance(self):
+        """Test luminance."""
+
+        self.assertAlmostEqual(RGBA(1.0, 1.0, 1.0).luminance(), 1.0)
+        self.assertEqual(RGBA(0.0, 0.0, 0.0).luminance(), 0.0)
+        self.assertAlmostEqual(RGBA.from_hex('#808080').luminance(), 0.21586, places=5)
+
+    def test_immutable(self):
+        """Test the color can't be modified."""
+
+        color = RGBA(0.0, 0.0, 0.0)
+        with self.assertRaises(AttributeError):
+            color.red = 1.0
+        with self.assertRaises(AttributeError):
+            color.other = 1.0
@@ -0,0 +1,47 @@
+"""Test the converted color scheme cache."""
+import os
+import shutil
+import tempfile
+import unittest
+from lib import scheme_cache
+
+RESOURCE = "Packages/Color Scheme - Default/Monokai.tmTheme"
+
+
+class TestSchemeCache(unittest.TestCase):
+    """Test the converted color scheme cache."""
+
+    def setUp(self):
+        """Setup."""
+
+        self.cache_dir = os.path.join(tempfile.mkdtemp(), 'cache')
+
+    def tearDown(self):
+        """Cleanup."""
+
+        shutil.rmtree(os.path.dirname(self.cache_dir))
+
+    def test_round_trip(self):
+        """Test a saved scheme is loaded for the same content only."""
+
+        digest = scheme_cache.content_hash(b'<plist/>', 'globals')
+        obj = {"globals": {"background": "#272822"}, "rules": [{"scope": "comment"}], "variables": {}}
+        self.assertIsNone(scheme_cache.load(self.cache_dir, RESOURCE, digest))
+        scheme_cache.save(self.cache_dir, RESOURCE, digest, obj)
+        self.assertTrue(scheme_cache.is_cached(self.cache_dir, RESOURCE, digest))
+        self.assertEqual(scheme_cache.load(self.cache_dir, RESOURCE, digest), obj)
+        self.assertIsNone(scheme_cache.load(self.cache_dir, RESOURCE, scheme_cache.content_hash(b'<plist/>')))
+        self.assertIsNone(scheme_cache.load(self.cache_dir, RESOURCE + '2', digest))
+
+    def test_stale(self):
+        """Test saving new content replaces the stale entry."""
+
+        old = scheme_cache.content_hash(b'old')
+        new = scheme_cache.content_hash(b'new')
+        scheme_cache.save(self.cache_dir, RESOURCE, old, {"rules": []})
+        scheme_cache.save(self.cache_dir, RESOURCE + '2', old, {"rules": []})
+        scheme_cache.save(self.cache_dir, RESOURCE, new, {"rules": []})
+        self.assertFalse(scheme_cache.is_cached(self.cache_dir, RESOURCE, old))
+        self.assertTrue(scheme_cache.is_cached(self.cache_dir, RESOURCE, new))
+        self.assertTrue(scheme_cache.is_cached(self.cache_dir, RESOURCE + '2', old))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
@@ -0,0 +1,45 @@
+"""Test the plugin."""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from tools import headless
+
+
+class TestPreferences(unittest.TestCase):
+    """Test reading the user preferences."""
+
+    def setUp(self):
+        """Setup."""
+
+        self.data = tempfile.mkdtemp()
+        headless.install(self.data)
+        self.plugin = headless.load_plugin()
+        self.plugin.ThemeTweaker.pref_memo = None
+        self.tweaker = self.plugin.ThemeTweaker()
+
+    def tearDown(self):
+        """Cleanup."""
+
+        for name in list(sys.modules):
+            if name in ('sublime', 'sublime_plugin', 'ThemeTweaker') or name.startswith('ThemeTweaker.'):
+                del sys.modules[name]
+        shutil.rmtree(self.data)
+
+    def test_read(self):
+        """Test missing preferences are empty, and unreadable or invalid ones are `None`."""
+
+        pref_file = os.path.join(self.data, 'Preferences.sublime-settings')
+        self.assertEqual(self.tweaker._read_preferences(pref_file), {})
+
+        with open(pref_file, 'w') as f:
+            f.write('{"color_scheme": "a", // comment\n}')
+        self.assertEqual(self.tweaker._read_preferences(pref_file), {"color_scheme": "a"})
+
+        # A path that can't be looked at, rather than one that doesn't exist.
+        self.assertIsNone(self.tweaker._read_preferences(os.path.join(pref_file, 'nested')))
+
+        with open(pref_file, 'w') as f:
+            f.write('{"color_scheme": ')
+        self.assertIsNone(self.tweaker._read_preferences(pref_file))
@@ -0,0 +1,87 @@
+"""Test the incremental tmTheme reader."""
+import io
+import plistlib
+import unittest
+from lib.tmtheme_reader import read_tmtheme
+
+TMTHEME = b'''
+<!-- A comment before the XML declaration -->
+<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">
+<plist version="1.0">
+<dict>
+    <key>name</key>
+    <string>Test &amp; Theme</string>
+    <!-- Comments are skipped -->
+    <key>settings</key>
+    <array>
+        <dict>
+            <key>settings</key>
+            <dict>
+                <key>background</key>
+                <string>#272822</string>
+                <key>foreground</key>
+                <string>#F8F8F2</string>
+            </dict>
+        </dict>
+        <dict>
+            <key>name</key>
+            <string>Comment</string>
+            <key>scope</key>
+            <string>comment</string>
+            <key>settings</key>
+            <dict>
+                <key>foreground</key>
+                <string>#75715E</string>
+                <key>fontStyle</key>
+                <string></string>
+            </dict>
+        </dict>
+    </array>
+    <key>uuid</key>
+    <string>D8D5E82E-3D5B-46B5-B38E-8C841C21347D</string>
+    <key>gutterSettings</key>
+    <dict>
+        <key>divider</key>
+        <string>#75715E</string>
+        <key>enabled</key>
+        <true/>
+        <key>width</key>
+        <integer>2</integer>
+        <key>items</key>
+        <array>
+            <real>1.5</real>
+            <false/>
+        </array>
+    </dict>
+</dict>
+</plist>
+'''
+
+
+class TestTmThemeReader(unittest.TestCase):
+    """Test the incremental tmTheme reader."""
+
+    def expected(self):
+        """Get the expected result from `plistlib`."""
+
+        return plistlib.loads(TMTHEME[TMTHEME.index(b'<?xml'):])
+
+    def test_read(self):
+        """Test reading matches `plistlib`."""
+
+        settings = []
+        root = read_tmtheme(TMTHEME, settings.append)
+        expected = self.expected()
+        self.assertEqual(settings, expected.pop('settings'))
+        self.assertEqual(root, expected)
+
+    def test_chunks(self):
+        """Test reading in small chunks from a file object."""
+
+        for size in (1, 3, 7, 64):
+            settings = []
+            root = read_tmtheme(io.BytesIO(TMTHEME), settings.append, chunk_size=size)
+            expected = self.expected()
+            self.assertEqual(settings, expected.pop('settings'))
+            self.assertEqual(root, expected)
@@ -0,0 +1,114 @@
+"""Test the direct tmTheme writer."""
+import io
+import os
+import plistlib
+import shutil
+import tempfile
+import unittest
+from lib.tmtheme_writer import save_tmtheme, write_tmtheme
+
+ROOT = {
+    "name": "Test & <Theme>",
+    "uuid": "D8D5E82E-3D5B-46B5-B38E-8C841C21347D",
+    "author": "Tester",
+    "gutterSettings": {
+        "divider": "#75715E",
+        "enabled": True,
+        "hidden": False,
+        "width": 2,
+        "scale": 1.5,
+        "items": ["a\r\nb", {}, []],
+        "empty": {}
+    }
+}
+
+SETTINGS = [
+    {
+        "settings": {
+            "background": "#272822",
+            "foreground": "#F8F8F2",
+            "lineHighlight": "#3E3D32",
+            "shadowWidth": 4
+        }
+    },
+    {
+        "name": "Comment",
+        "scope": "comment",
+        "settings": {
+            "foreground": "#75715E",
+            "fontStyle": ""
+        }
+    },
+    {
+        "name": "Strings — quoted",
+        "scope": "string & string.quoted -(meta > string)",
+        "settings": {
+            "foreground": "#E6DB74",
+            "selectionForeground": "#000000",
+            "background": "#27282240"
+        }
+    },
+    {
+        "scope": "invalid",
+        "settings": {}
+    },
+    {}
+]
+
+
+class TestTmThemeWriter(unittest.TestCase):
+    """Test the direct tmTheme writer."""
+
+    def write(self, root, settings):
+        """Write with the direct writer."""
+
+        f = io.BytesIO()
+        write_tmtheme(f, root, iter(settings))
+        return f.getvalue()
+
+    def expected(self, root, settings):
+        """Write with `plistlib`."""
+
+        obj = dict(root)
+        obj['settings'] = settings
+        return plistlib.dumps(obj)
+
+    def test_identical(self):
+        """Test output is identical to `plistlib`."""
+
+        self.assertEqual(self.write(ROOT, SETTINGS), self.expected(ROOT, SETTINGS))
+
+    def test_many_entries(self):
+        """Test output is identical when entries are written in batches."""
+
+        settings = SETTINGS * 50
+        self.assertEqual(self.write(ROOT, settings), self.expected(ROOT, settings))
+
+    def test_empty(self):
+        """Test empty `settings` and root."""
+
+        self.assertEqual(self.write({}, []), self.expected({}, []))
+
+    def test_control_characters(self):
+        """Test control characters are rejected like `plistlib` does."""
+
+        with self.assertRaises(ValueError):
+            self.write({}, [{"name": "bad\x01"}])
+
+    def test_save(self):
+        """Test saving only replaces the file once it is completely written."""
+
+        folder = tempfile.mkdtemp()
+        try:
+            path = os.path.join(folder, 'Test.tmTheme')
+            save_tmtheme(path, ROOT, iter(SETTINGS))
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), self.expected(ROOT, SETTINGS))
+
+            with self.assertRaises(ValueError):
+                save_tmtheme(path, {}, iter(SETTINGS + [{"name": "bad\x01"}]))
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), self.expected(ROOT, SETTINGS))
+            self.assertEqual(os.listdir(folder), ['Test.tmTheme'])
+        finally:
+            shutil.rmtree(folder)
@@ -6,7 +6,11 @@ Copyright (c) 2012-2015 Isaac Muse <isaacmuse@gmail.com>
 """
 import re
 import codecs
+import hashlib
 import json
+import os
+from bisect import bisect_right
+from multiprocessing import Pool
 
 RE_LINE_PRESERVE = re.compile(r"\r?\n", re.MULTILINE)
 RE_COMMENT = re.compile(
@@ -85,33 +89,31 @@ class CheckJsonFormat(object):
         - Malformed JSON.
     """
 
-    def __init__(self, use_tabs=False, allow_comments=False):
+    def __init__(self, use_tabs=False, allow_comments=False, quiet=False):
         """Setup the settings."""
 
         self.use_tabs = use_tabs
         self.allow_comments = allow_comments
+        self.quiet = quiet
         self.fail = False
+        self.violations = []
 
     def index_lines(self, text):
-        """Index the char range of each line."""
+        """Index the start offset of each line."""
 
-        self.line_range = []
-        count = 1
-        last = 0
-        for m in re.finditer('\n', text):
-            self.line_range.append((last, m.end(0) - 1, count))
-            last = m.end(0)
-            count += 1
+        self.line_starts = [0]
+        append = self.line_starts.append
+        find = text.find
+        pos = find('\n')
+        while pos != -1:
+            pos += 1
+            append(pos)
+            pos = find('\n', pos)
 
     def get_line(self, pt):
         """Get the line from char index."""
 
-        line = None
-        for r in self.line_range:
-            if pt >= r[0] and pt <= r[1]:
-                line = r[2]
-                break
-        return line
+        return bisect_right(self.line_starts, pt)
 
     def check_comments(self, text):
         """
@@ -158,23 +160,28 @@ class CheckJsonFormat(object):
 
         return ''.join(map(lambda m: evaluate(m), RE_TRAILING_COMMA.finditer(text)))
 
-    def log_failure(self, code, line=None):
+    def log_failure(self, code, line=None, detail=None):
         """
         Log failure.
 
         Log failure code, line number (if available) and message.
         """
 
-        if line:
-            print("%s: Line %d - %s" % (code, line, VIOLATION_MSG[code]))
-        else:
-            print("%s: %s" % (code, VIOLATION_MSG[code]))
+        self.violations.append({"code": code, "line": line, "message": VIOLATION_MSG[code], "detail": detail})
+        if not self.quiet:
+            if line:
+                print("%s: Line %d - %s" % (code, line, VIOLATION_MSG[code]))
+            else:
+                print("%s: %s" % (code, VIOLATION_MSG[code]))
+            if detail:
+                print(detail)
         self.fail = True
 
     def check_format(self, file_name):
         """Initiate the check."""
 
         self.fail = False
+        self.violations = []
         comment_align = None
         with codecs.open(file_name, encoding='utf-8') as f:
             count = 1
@@ -220,12 +227,138 @@ class CheckJsonFormat(object):
         try:
             json.loads(text)
         except Exception as e:
-            self.log_failure(E_MALFORMED)
-            print(e)
+            self.log_failure(E_MALFORMED, detail=str(e))
         return self.fail
 
 
+def file_hash(file_name):
+    """Hash the file content."""
+
+    with open(file_name, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def check_file(args):
+    """Check a single file (run in the process pool) and return its violations."""
+
+    file_name, use_tabs, allow_comments = args
+    checker = CheckJsonFormat(use_tabs, allow_comments, quiet=True)
+    checker.check_format(file_name)
+    return checker.violations
+
+
+def load_cache(cache_file, options):
+    """Load cached results for the given options, keyed by content hash."""
+
+    try:
+        with open(cache_file, 'r') as f:
+            cache = json.load(f)
+        if cache.get("options") == options:
+            return cache["results"]
+    except Exception:
+        pass
+    return {}
+
+
+def save_cache(cache_file, options, results):
+    """Save results keyed by content hash."""
+
+    folder = os.path.dirname(cache_file)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(cache_file, 'w') as f:
+        json.dump({"options": options, "results": results}, f)
+
+
+def check_files(file_names, use_tabs=False, allow_comments=False, processes=None, cache_file=None):
+    """
+    Check many files, in parallel, and return a report.
+
+    Files are checked across a process pool (`processes` defaults to the CPU count; `1`
+    checks them in this process). If `cache_file` is given, results are cached by content
+    hash, and files whose content was already checked (with the same options and version of
+    this validator) are skipped. The report is a
+    dictionary that can be dumped as JSON:
+
+        {
+            "files": [{"file": name, "hash": sha1, "cached": bool, "violations": [...]}],
+            "checked": count, "cached": count, "failed": count
+        }
+    """
+
+    # The validator's own hash is part of the options, so changing the rules invalidates the cache.
+    options = [use_tabs, allow_comments, file_hash(os.path.abspath(__file__))]
+    cache = load_cache(cache_file, options) if cache_file else {}
+    hashes = [file_hash(name) for name in file_names]
+
+    # Check each distinct, uncached content once.
+    pending = {}
+    for name, digest in zip(file_names, hashes):
+        if digest not in cache and digest not in pending:
+            pending[digest] = name
+    jobs = [(name, use_tabs, allow_comments) for name in pending.values()]
+    if processes == 1 or len(jobs) < 2:
+        results = [check_file(job) for job in jobs]
+    else:
+        pool = Pool(processes)
+        try:
+            results = pool.map(check_file, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    checked = dict(zip(pending.keys(), results))
+    cache.update(checked)
+
+    if cache_file:
+        save_cache(cache_file, options, {digest: cache[digest] for digest in set(hashes)})
+
+    files = []
+    for name, digest in zip(file_names, hashes):
+        files.append(
+            {"file": name, "hash": digest, "cached": digest not in checked, "violations": cache[digest]}
+        )
+    return {
+        "files": files,
+        "checked": len(checked),
+        "cached": sum(1 for entry in files if entry["cached"]),
+        "failed": sum(1 for entry in files if entry["violations"])
+    }
+
+
+def main():
+    """Validate the given files."""
+
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(prog='validate_json_format', description='Validate JSON format.')
+    parser.add_argument('files', nargs='+', help="Files to check.")
+    parser.add_argument('--tabs', action='store_true', help="Expect tab indentation.")
+    parser.add_argument('--no-comments', action='store_true', help="Report comments as errors.")
+    parser.add_argument('--jobs', type=int, default=None, help="Processes to use (default: CPU count).")
+    parser.add_argument('--cache', default=None, help="Cache file for results, keyed by content hash.")
+    parser.add_argument('--report', default=None, help="Write a JSON report to the file ('-' for stdout).")
+    args = parser.parse_args()
+
+    report = check_files(args.files, args.tabs, not args.no_comments, args.jobs, args.cache)
+    if args.report == '-':
+        json.dump(report, sys.stdout, indent=4)
+        print('')
+    else:
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump(report, f, indent=4)
+        for entry in report["files"]:
+            for v in entry["violations"]:
+                if v["line"]:
+                    print("%s:%d: %s: %s" % (entry["file"], v["line"], v["code"], v["message"]))
+                else:
+                    print("%s: %s: %s" % (entry["file"], v["code"], v["message"]))
+                if v["detail"]:
+                    print("    %s" % v["detail"])
+    return 1 if report["failed"] else 0
+
+
 if __name__ == "__main__":
     import sys
-    cjf = CheckJsonFormat(False, True)
-    cjf.check_format(sys.argv[1])
+    sys.exit(main())
@@ -7,12 +7,11 @@ Copyright (c) 2013 - 2016 Isaac Muse <isaacmuse@gmail.com>
 import sublime
 import sublime_plugin
 import codecs
-from os import makedirs
+import hashlib
+from os import makedirs, replace, stat
 from os.path import join, basename, exists, dirname, normpath, splitext
-from plistlib import writePlistToBytes
-from .lib.file_strip.json import sanitize_json
-from .lib.color_scheme_tweaker import ColorSchemeTweaker, get_tmtheme
-from .lib.color_scheme_matcher import ColorSchemeMatcher
+from .lib import latency
+from .lib import profiler
 import json
 import threading
 import time
@@ -27,6 +26,8 @@ PREFERENCES = 'Preferences.sublime-settings'
 TEMP_FOLDER = "ThemeTweaker"
 TEMP_PATH = "Packages/User/%s" % TEMP_FOLDER
 TWEAKED = TEMP_PATH + "/tweaked.tmTheme"
+CACHE_PATH = TEMP_PATH + "/cache"
+PROFILE_PATH = TEMP_PATH + "/profiles"
 SCHEME = "color_scheme"
 TWEAK_MODE = False
 THEME_TWEAKER_READY = False
@@ -274,19 +275,88 @@ class ThemeTweakerRedoCommand(sublime_plugin.ApplicationCommand):
         ThemeTweaker().redo()
 
 
+class ThemeTweakerCacheSchemesCommand(sublime_plugin.ApplicationCommand):
+    """Convert and cache all installed `tmTheme` color schemes ahead of time."""
+
+    def run(self):
+        """Run command."""
+
+        sublime.set_timeout_async(self.cache, 0)
+
+    def cache(self):
+        """Cache the converted schemes."""
+
+        from .lib.color_scheme_matcher import ColorSchemeMatcher
+
+        start = time.time()
+        count = ColorSchemeMatcher.cache_tmthemes(packages_path(CACHE_PATH))
+        log("Cached %d converted color scheme(s) in %.2fs" % (count, time.time() - start), status=True)
+
+
+class ThemeTweakerStatsCommand(sublime_plugin.ApplicationCommand):
+    """Show the tweak commands' latency statistics."""
+
+    def run(self, path=None, reset=False):
+        """Run command."""
+
+        if not latency.is_enabled():
+            log("Latency statistics are disabled (see the 'latency_stats' setting)", status=True)
+            return
+        text = json.dumps(latency.summary(), sort_keys=True, indent=4, separators=(',', ': '))
+        if path:
+            pth = packages_path(join(normpath(TEMP_PATH), path))
+            makedirs(dirname(pth), exist_ok=True)
+            with open(pth, 'w') as f:
+                f.write(text + "\n")
+            log("Latency statistics written to '%s'" % pth, status=True)
+        else:
+            print(text)
+            log("Latency statistics written to the console", status=True)
+        if reset:
+            latency.reset()
+
+
+class ThemeTweakerProfileCommand(sublime_plugin.ApplicationCommand):
+    """Profile tweak commands."""
+
+    def run(self, count=1, filters=None, memory=True):
+        """Run command."""
+
+        def saved(paths, error):
+            """Report the saved profile."""
+
+            if error is not None:
+                log("Failed to save the profile: %s" % error, status=True)
+            else:
+                log("Profile written to '%s'" % paths[0], status=True)
+
+        folder = packages_path(PROFILE_PATH)
+        if filters:
+            profiler.profile(folder, 'run', ThemeTweaker().run, (filters,), memory=memory, callback=saved)
+        else:
+            profiler.arm(folder, count, memory, saved)
+            log("Profiling the next %d tweak command(s)" % count, status=True)
+
+
 class ThemeTweaker(object):
     """Main tweak logic."""
 
+    # Last read (or written) user preferences: `((mtime, size), content hash, preferences)`
+    pref_memo = None
+
     def __init__(self, init_theme=None, set_safe=False):
         """Initialize."""
 
         self.set_safe = set_safe
         self.init_theme = init_theme
         self.set_tweaked_scheme = False
+        self.recorder = latency.NULL_RECORDER
 
     def _load_tweak_settings(self):
         """Load the tweak settings."""
 
+        from .lib.file_strip import json as json_strip
+
         self._ensure_temp()
         p_settings = {}
         tweaks = packages_path(join(normpath(TEMP_PATH), basename(TWEAK_SETTINGS)))
@@ -294,10 +364,10 @@ class ThemeTweaker(object):
             try:
                 with open(tweaks, "r") as f:
                     # Allow C style comments and be forgiving of trailing commas
-                    content = sanitize_json(f.read(), True)
-                p_settings = json.loads(content)
+                    p_settings = json_strip.load_json(f.read())
             except Exception:
                 pass
+            debug_log(json_strip.stats())
         return p_settings
 
     def _save_tweak_settings(self):
@@ -311,6 +381,60 @@ class ThemeTweaker(object):
         except Exception:
             pass
 
+    def _read_preferences(self, pref_file):
+        """
+        Read the user preferences.
+
+        The last parse is reused if the file's modified time and size, or its content hash,
+        are unchanged. Returns an empty dictionary if the file doesn't exist, and `None` if
+        it exists but can't be read or parsed.
+        """
+
+        from .lib.file_strip import json as json_strip
+
+        try:
+            st = stat(pref_file)
+        except FileNotFoundError:
+            return {}
+        except OSError:
+            return None
+
+        memo = ThemeTweaker.pref_memo
+        if memo is not None and memo[0] == (st.st_mtime_ns, st.st_size):
+            return dict(memo[2])
+
+        try:
+            with open(pref_file, "rb") as f:
+                content = f.read()
+        except Exception:
+            return None
+        digest = hashlib.sha1(content).hexdigest()
+        if memo is not None and memo[1] == digest:
+            pref = memo[2]
+        else:
+            try:
+                # Allow C style comments and be forgiving of trailing commas
+                pref = json_strip.load_json(content.decode('utf-8'))
+            except Exception:
+                return None
+            debug_log(json_strip.stats())
+        ThemeTweaker.pref_memo = ((st.st_mtime_ns, st.st_size), digest, pref)
+        return dict(pref)
+
+    def _write_preferences(self, pref_file, pref):
+        """Write the user preferences atomically, remembering what was written."""
+
+        content = (json.dumps(pref, sort_keys=True, indent=4, separators=(',', ': ')) + "\n").encode('utf-8')
+        temp = pref_file + '.tmp'
+        try:
+            with open(temp, 'wb') as f:
+                f.write(content)
+            replace(temp, pref_file)
+            st = stat(pref_file)
+            ThemeTweaker.pref_memo = ((st.st_mtime_ns, st.st_size), hashlib.sha1(content).hexdigest(), pref)
+        except Exception:
+            pass
+
     def _set_theme_safely(self, name):
         """
         Safe variant of setting theme.
@@ -318,26 +442,19 @@ class ThemeTweaker(object):
         At one point, Sublime would be left with an empty Preference file
         if you modified it too soon.  So manually reading was the safest.
         The problem may or may not exist now.
+
+        The file is only written if the scheme actually changes, and never if it
+        couldn't be parsed (so the user's settings aren't lost).
         """
 
-        pref_file = join(sublime.packages_path(), 'User', 'Preferences.sublime-settings')
-        pref = {}
-        if exists(pref_file):
-            try:
-                with open(pref_file, "r") as f:
-                    # Allow C style comments and be forgiving of trailing commas
-                    content = sanitize_json(f.read(), True)
-                pref = json.loads(content)
-            except Exception:
-                pass
-        if pref[SCHEME] != name:
+        pref_file = join(sublime.packages_path(), 'User', PREFERENCES)
+        pref = self._read_preferences(pref_file)
+        if pref is None:
+            log("Could not read '%s'" % pref_file)
+            return
+        if pref.get(SCHEME) != name:
             pref[SCHEME] = name
-            j = json.dumps(pref, sort_keys=True, indent=4, separators=(',', ': '))
-            try:
-                with open(pref_file, 'w') as f:
-                    f.write(j + "\n")
-            except Exception:
-                pass
+            self._write_preferences(pref_file, pref)
 
     def _ensure_temp(self):
         """Ensure temp path exists."""
@@ -372,6 +489,9 @@ class ThemeTweaker(object):
     def _theme_valid(self, scheme_file, noedit=False):
         """Check if theme is valid."""
 
+        from .lib.color_scheme_matcher import ColorSchemeMatcher
+        from .lib.color_scheme_tweaker import save_tmtheme
+
         is_working = scheme_file.startswith(TEMP_PATH + '/')
         if (
             is_working and self.scheme_map is not None and
@@ -395,8 +515,8 @@ class ThemeTweaker(object):
             return True
         elif not is_working and not noedit:
             self._ensure_temp()
-            csm = ColorSchemeMatcher(scheme_file)
-            content = get_tmtheme(csm.get_scheme_obj()) if not NEW_SCHEMES else csm.get_scheme_obj()
+            csm = ColorSchemeMatcher(scheme_file, cache_dir=packages_path(CACHE_PATH))
+            content = csm.get_scheme_obj()
             self.scheme_file = packages_path(scheme_file)
             base, old_ext = splitext(basename(scheme_file))
             if NEW_SCHEMES:
@@ -409,8 +529,7 @@ class ThemeTweaker(object):
                     with codecs.open(self.scheme_clone, "w", encoding='utf-8') as f:
                         f.write(sublime.encode_value(content, pretty=True))
                 else:
-                    with open(self.scheme_clone, "wb") as f:
-                        f.write(writePlistToBytes(content))
+                    save_tmtheme(content, self.scheme_clone)
                 self.scheme_map = {
                     "original": scheme_file,
                     "working": "%s/%s" % (TEMP_PATH, 'tweak-' + base + ext),
@@ -447,6 +566,8 @@ class ThemeTweaker(object):
     def _set_tweaked_scheme(self):
         """Set the tweaked scheme."""
 
+        # Time spent waiting for the timeout
+        self.recorder.mark('timeout')
         if self.set_tweaked_scheme["set_safe"]:
             self._set_theme_safely(self.set_tweaked_scheme["scheme"])
         else:
@@ -454,6 +575,9 @@ class ThemeTweaker(object):
                 self.settings.set(SCHEME, self.set_tweaked_scheme["scheme"])
         self.set_tweaked_scheme = False
         Lock.release_lock()
+        self.recorder.mark('settings')
+        self.recorder.done()
+        self.recorder = latency.NULL_RECORDER
 
     def _lock(self):
         """
@@ -468,36 +592,48 @@ class ThemeTweaker(object):
             locked = Lock.wait_lock(force=True)
         return locked
 
+    @profiler.profiled('clear')
     def clear(self):
         """Clear tweaks."""
 
+        from .lib.color_scheme_matcher import ColorSchemeMatcher
+        from .lib.color_scheme_tweaker import save_tmtheme
+
+        recorder = latency.start('clear')
         if not self._lock():
             log('Failed to acquire lock!')
             return
+        recorder.mark('lock')
 
         self._setup(noedit=True)
+        recorder.mark('setup')
 
         if self.theme_valid:
-            csm = ColorSchemeMatcher(self.scheme_map["original"])
-            content = self._get_tmtheme(csm.get_scheme_obj()) if not NEW_SCHEMES else csm.get_scheme_obj()
+            csm = ColorSchemeMatcher(self.scheme_map["original"], cache_dir=packages_path(CACHE_PATH))
+            recorder.mark('matcher')
+            content = csm.get_scheme_obj()
             if NEW_SCHEMES:
+                text = sublime.encode_value(content, pretty=True)
+                recorder.mark('serialize')
                 with codecs.open(self.scheme_clone, "w", encoding='utf-8') as f:
-                    f.write(sublime.encode_value(content, pretty=True))
+                    f.write(text)
                     self.scheme_map["redo"] = ""
                     self.scheme_map["undo"] = ""
                     self.p_settings["scheme_map"] = self.scheme_map
                     self._save_tweak_settings()
             else:
-                with open(self.scheme_clone, "wb") as f:
-                    f.write(writePlistToBytes(content))
-                    self.scheme_map["redo"] = ""
-                    self.scheme_map["undo"] = ""
-                    self.p_settings["scheme_map"] = self.scheme_map
-                    self._save_tweak_settings()
+                save_tmtheme(content, self.scheme_clone)
+                self.scheme_map["redo"] = ""
+                self.scheme_map["undo"] = ""
+                self.p_settings["scheme_map"] = self.scheme_map
+                self._save_tweak_settings()
+            recorder.mark('write')
             if self.set_tweaked_scheme:
+                self.recorder = recorder
                 sublime.set_timeout(self._set_tweaked_scheme, 300)
             else:
                 Lock.release_lock()
+                recorder.done()
         else:
             Lock.release_lock()
             log("Theme has not been tweaked!", status=True)
@@ -529,17 +665,25 @@ class ThemeTweaker(object):
 
         return filename.lower().endswith(('.sublime-color-scheme', '.hidden-color-scheme'))
 
+    @profiler.profiled('undo')
     def undo(self):
         """Revert last change."""
 
+        from .lib.color_scheme_matcher import ColorSchemeMatcher
+        from .lib.color_scheme_tweaker import ColorSchemeTweaker, save_tmtheme
+
+        recorder = latency.start('undo')
         if not self._lock():
             log('Failed to acquire lock!')
             return
+        recorder.mark('lock')
 
         self._setup(noedit=True)
+        recorder.mark('setup')
 
         if self.theme_valid:
-            csm = ColorSchemeMatcher(self.scheme_map["original"])
+            csm = ColorSchemeMatcher(self.scheme_map["original"], cache_dir=packages_path(CACHE_PATH))
+            recorder.mark('matcher')
 
             undo = self.scheme_map["undo"].split(";")
             if len(undo) == 0 or (len(undo) == 1 and undo[0] == ""):
@@ -550,36 +694,49 @@ class ThemeTweaker(object):
             self.scheme_map["redo"] = ";".join(redo)
             self.scheme_map["undo"] = ";".join(undo)
 
-            self.plist_file = ColorSchemeTweaker().tweak(csm.get_scheme_obj(), self.scheme_map["undo"], not NEW_SCHEMES)
+            self.plist_file = ColorSchemeTweaker().tweak(csm.get_scheme_obj(), self.scheme_map["undo"])
+            recorder.mark('filter')
             if NEW_SCHEMES:
+                text = sublime.encode_value(self.plist_file, pretty=True)
+                recorder.mark('serialize')
                 with codecs.open(self.scheme_clone, "w", encoding='utf-8') as f:
-                    f.write(sublime.encode_value(self.plist_file, pretty=True))
+                    f.write(text)
                     self.p_settings["scheme_map"] = self.scheme_map
                     self._save_tweak_settings()
             else:
-                with open(self.scheme_clone, "wb") as f:
-                    f.write(writePlistToBytes(self.plist_file))
-                    self.p_settings["scheme_map"] = self.scheme_map
-                    self._save_tweak_settings()
+                save_tmtheme(self.plist_file, self.scheme_clone)
+                self.p_settings["scheme_map"] = self.scheme_map
+                self._save_tweak_settings()
+            recorder.mark('write')
             if self.set_tweaked_scheme:
+                self.recorder = recorder
                 sublime.set_timeout(self._set_tweaked_scheme, 300)
             else:
                 Lock.release_lock()
+                recorder.done()
         else:
             Lock.release_lock()
             log("Theme has not been tweaked!", status=True)
 
+    @profiler.profiled('redo')
     def redo(self):
         """Redo last reverted change."""
 
+        from .lib.color_scheme_matcher import ColorSchemeMatcher
+        from .lib.color_scheme_tweaker import ColorSchemeTweaker, save_tmtheme
+
+        recorder = latency.start('redo')
         if not self._lock():
             log('Failed to acquire lock!')
             return
+        recorder.mark('lock')
 
         self._setup(noedit=True)
+        recorder.mark('setup')
 
         if self.theme_valid:
-            csm = ColorSchemeMatcher(self.scheme_map["original"])
+            csm = ColorSchemeMatcher(self.scheme_map["original"], cache_dir=packages_path(CACHE_PATH))
+            recorder.mark('matcher')
 
             redo = self.scheme_map["redo"].split(";")
             if len(redo) == 0 or (len(redo) == 1 and redo[0] == ""):
@@ -590,21 +747,26 @@ class ThemeTweaker(object):
             self.scheme_map["redo"] = ";".join(redo)
             self.scheme_map["undo"] = ";".join(undo)
 
-            self.plist_file = ColorSchemeTweaker().tweak(csm.get_scheme_obj(), self.scheme_map["undo"], not NEW_SCHEMES)
+            self.plist_file = ColorSchemeTweaker().tweak(csm.get_scheme_obj(), self.scheme_map["undo"])
+            recorder.mark('filter')
             if NEW_SCHEMES:
+                text = sublime.encode_value(self.plist_file, pretty=True)
+                recorder.mark('serialize')
                 with codecs.open(self.scheme_clone, "w", encoding='utf-8') as f:
-                    f.write(sublime.encode_value(self.plist_file, pretty=True))
+                    f.write(text)
                     self.p_settings["scheme_map"] = self.scheme_map
                     self._save_tweak_settings()
             else:
-                with open(self.scheme_clone, "wb") as f:
-                    f.write(writePlistToBytes(self.plist_file))
-                    self.p_settings["scheme_map"] = self.scheme_map
-                    self._save_tweak_settings()
+                save_tmtheme(self.plist_file, self.scheme_clone)
+                self.p_settings["scheme_map"] = self.scheme_map
+                self._save_tweak_settings()
+            recorder.mark('write')
             if self.set_tweaked_scheme:
+                self.recorder = recorder
                 sublime.set_timeout(self._set_tweaked_scheme, 300)
             else:
                 Lock.release_lock()
+                recorder.done()
         else:
             Lock.release_lock()
             log("Theme has not been tweaked!", status=True)
@@ -623,41 +785,54 @@ class ThemeTweaker(object):
         else:
             Lock.release_lock()
 
+    @profiler.profiled('run')
     def run(self, filters):
         """Run command."""
 
+        from .lib.color_scheme_matcher import ColorSchemeMatcher
+        from .lib.color_scheme_tweaker import ColorSchemeTweaker, save_tmtheme
+
+        recorder = latency.start('run')
         if not self._lock():
             log('Failed to acquire lock!')
             return
+        recorder.mark('lock')
 
         self._setup()
+        recorder.mark('setup')
 
         if self.theme_valid:
             csm = ColorSchemeMatcher(self.scheme_map["working"])
+            recorder.mark('matcher')
             content = csm.get_scheme_obj()
             ct = ColorSchemeTweaker()
-            self.plist_file = ct.tweak(content, filters, not NEW_SCHEMES)
+            self.plist_file = ct.tweak(content, filters)
+            recorder.mark('filter')
 
             if NEW_SCHEMES:
+                text = sublime.encode_value(self.plist_file, pretty=True)
+                recorder.mark('serialize')
                 with codecs.open(self.scheme_clone, "w", encoding='utf-8') as f:
-                    f.write(sublime.encode_value(self.plist_file, pretty=True))
+                    f.write(text)
                     undo = self.scheme_map["undo"].split(";") + ct.get_filters()
                     self.scheme_map["redo"] = ""
                     self.scheme_map["undo"] = ";".join(undo)
                     self.p_settings["scheme_map"] = self.scheme_map
                     self._save_tweak_settings()
             else:
-                with open(self.scheme_clone, "wb") as f:
-                    f.write(writePlistToBytes(self.plist_file))
-                    undo = self.scheme_map["undo"].split(";") + ct.get_filters()
-                    self.scheme_map["redo"] = ""
-                    self.scheme_map["undo"] = ";".join(undo)
-                    self.p_settings["scheme_map"] = self.scheme_map
-                    self._save_tweak_settings()
+                save_tmtheme(self.plist_file, self.scheme_clone)
+                undo = self.scheme_map["undo"].split(";") + ct.get_filters()
+                self.scheme_map["redo"] = ""
+                self.scheme_map["undo"] = ";".join(undo)
+                self.p_settings["scheme_map"] = self.scheme_map
+                self._save_tweak_settings()
+            recorder.mark('write')
             if self.set_tweaked_scheme:
+                self.recorder = recorder
                 sublime.set_timeout(self._set_tweaked_scheme, 300)
             else:
                 Lock.release_lock()
+                recorder.done()
         else:
             Lock.release_lock()
 
@@ -694,14 +869,47 @@ class ThemeTweakerListener(sublime_plugin.EventListener):
         return key == "theme_tweaker" and TWEAK_MODE
 
 
-def plugin_loaded():
-    """Setup plugin."""
+def update_latency_stats():
+    """Enable or disable the latency statistics."""
+
+    latency.enable(sublime.load_settings(PLUGIN_SETTINGS).get("latency_stats", False))
+
+
+def record_startup(phase, seconds):
+    """Record the time a startup phase took."""
+
+    debug_log("Startup %s took %.2fms" % (phase, seconds * 1000.0))
+    if latency.is_enabled():
+        latency.record('startup', phase, seconds)
+
+
+def startup_refresh():
+    """Refresh the tweaked scheme after startup."""
 
     global THEME_TWEAKER_READY
-    THEME_TWEAKER_READY = False
 
+    start = time.perf_counter()
     # Just in case something went wrong,
     # and a theme got removed or isn't there on startup
     ThemeTweaker().refresh(noedit=True)
     THEME_TWEAKER_READY = True
+    record_startup('refresh', time.perf_counter() - start)
     sublime.run_command("theme_tweaker_is_ready")
+
+
+def plugin_loaded():
+    """Setup plugin."""
+
+    global THEME_TWEAKER_READY
+
+    start = time.perf_counter()
+    THEME_TWEAKER_READY = False
+
+    settings = sublime.load_settings(PLUGIN_SETTINGS)
+    settings.clear_on_change('theme_tweaker_latency')
+    settings.add_on_change('theme_tweaker_latency', update_latency_stats)
+    update_latency_stats()
+
+    # Refreshing may have to load and parse the color scheme, so keep it off the startup path.
+    sublime.set_timeout_async(startup_refresh, 0)
+    record_startup('plugin_loaded', time.perf_counter() - start)
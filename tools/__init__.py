@@ -0,0 +1,5 @@
+"""
+Development tools for ThemeTweaker.
+
+These are not loaded by Sublime Text; run them from the repository root with `python -m tools.<name>`.
+"""
@@ -0,0 +1,273 @@
+r"""
+Batch color scheme tweaker.
+
+Tweaks color schemes outside of Sublime, with `ColorSchemeMatcher` and `ColorSchemeTweaker` run
+over the headless `sublime` stand-in, to generate variants (dimmed, high contrast, sepia, etc.) of
+a set of schemes. Each scheme is resolved once (variables, color-mod and, for resources, overrides)
+and then tweaked per variant. Schemes are processed in a process pool.
+
+Schemes are files, or resources (`Packages/...`) of the `--data` folder, in which case overrides
+in other packages are applied as Sublime would. Variants come from `--filters` (one variant) or
+`--variants`, a JSON file mapping variant names to filters:
+
+    {"Dimmed": "brightness(0.9)", "High Contrast": "contrast(1.3)", "Sepia": "sepia"}
+
+    python -m tools.batch_tweak --deps /path/to/Packages/mdpopups/st3 --variants variants.json \
+        --output out schemes/*.sublime-color-scheme
+
+Variants are written to `<output>/<scheme> (<variant>).sublime-color-scheme` (or `.tmTheme` with
+`--tmtheme`), so schemes must have different names: a scheme named like an earlier one fails. A
+manifest in the output folder records what each file was generated from, so only schemes whose
+source, overrides or filters changed are tweaked again (`--force` redoes them all), and files whose
+content didn't change aren't rewritten.
+"""
+import argparse
+import copy
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+from . import bench
+from . import headless
+
+MANIFEST = '.batch_tweak.json'
+
+# Bump when the output for the same source and filters changes.
+BATCH_VERSION = '1'
+
+PACKAGE = 'Batch Tweak'
+
+
+def load_variants(filters=None, variants=None):
+    """Get the `{name: filters}` variants from a filter string or a variants file."""
+
+    if variants is None:
+        return {'Tweaked': filters}
+    with open(variants, 'r') as f:
+        obj = json.load(f)
+    if not isinstance(obj, dict) or not all(isinstance(v, str) for v in obj.values()):
+        raise ValueError("'{}' must map variant names to filter strings".format(variants))
+    return obj
+
+
+def load_manifest(output):
+    """Load the manifest of generated files: `{file name: key}`."""
+
+    try:
+        with open(os.path.join(output, MANIFEST), 'r') as f:
+            obj = json.load(f)
+    except (IOError, ValueError):
+        return {}
+    return obj if isinstance(obj, dict) else {}
+
+
+def save_manifest(output, manifest):
+    """Save the manifest."""
+
+    with open(os.path.join(output, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+
+
+def source_content(scheme, data=None):
+    """
+    Get the content a scheme resolves from, in order: the scheme, then any overrides.
+
+    Resources (`Packages/...`) are read from the data folder (which must be installed); anything
+    else is read as a file.
+    """
+
+    if data is not None and scheme.startswith('Packages/'):
+        # Overrides are found the way `ColorSchemeMatcher.merge_overrides` finds them.
+        name, ext = os.path.splitext(os.path.basename(scheme))
+        pattern = name + ('.hidden-color-scheme' if ext == '.hidden-color-scheme' else '.sublime-color-scheme')
+        return [headless.load_binary_resource(scheme)] + [
+            headless.load_binary_resource(r) for r in headless.find_resources(pattern) if r != scheme
+        ]
+    with open(scheme, 'rb') as f:
+        return [f.read()]
+
+
+def source_key(contents, filters, tmtheme=False):
+    """Get the key of a variant: what it is generated from."""
+
+    from lib import scheme_cache
+
+    return scheme_cache.content_hash(
+        b'\0'.join(contents), filters, BATCH_VERSION, headless.version(), 'tmTheme' if tmtheme else 'json'
+    )
+
+
+def output_name(scheme, variant, tmtheme=False):
+    """Get the file name of a scheme's variant."""
+
+    name = os.path.splitext(os.path.basename(scheme))[0]
+    return '{} ({}){}'.format(name, variant, '.tmTheme' if tmtheme else '.sublime-color-scheme')
+
+
+def init_worker(deps):
+    """Make the dependencies importable in a worker."""
+
+    bench.add_dependency_paths(deps)
+
+
+def tweak_scheme(task):
+    """
+    Resolve a scheme and write its variants (a pool worker).
+
+    `task` is `(scheme, data, version, variants, tmtheme)`, with `variants` a list of
+    `(filters, path)`. Returns `(scheme, [(path, written)], error)`.
+    """
+
+    scheme, data, version, variants, tmtheme = task
+    temp = None
+    try:
+        if data is not None and scheme.startswith('Packages/'):
+            resource = scheme
+        else:
+            # A file gets a data folder of its own, so other schemes aren't merged in as overrides.
+            temp = tempfile.mkdtemp()
+            data = temp
+            resource = 'Packages/{}/{}'.format(PACKAGE, os.path.basename(scheme))
+            os.makedirs(os.path.join(data, 'Packages', PACKAGE))
+            shutil.copyfile(scheme, os.path.join(data, os.path.normpath(resource)))
+        headless.install(data, version)
+
+        from lib.color_scheme_matcher import ColorSchemeMatcher
+        from lib.color_scheme_tweaker import ColorSchemeTweaker, write_tmtheme
+
+        obj = ColorSchemeMatcher(resource).get_scheme_obj()
+        results = []
+        for filters, path in variants:
+            content = ColorSchemeTweaker().tweak(copy.deepcopy(obj), filters)
+            if tmtheme:
+                with tempfile.TemporaryFile() as f:
+                    write_tmtheme(content, f)
+                    f.seek(0)
+                    text = f.read()
+            else:
+                text = headless.encode_value(content, pretty=True).encode('utf-8')
+            results.append((path, write_if_changed(path, text)))
+        return scheme, results, None
+    except Exception as e:
+        return scheme, [], '{}: {}'.format(type(e).__name__, e)
+    finally:
+        if temp is not None:
+            shutil.rmtree(temp, ignore_errors=True)
+
+
+def write_if_changed(path, content):
+    """Write the content unless the file already has it, and return whether it was written."""
+
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == content:
+                return False
+    except IOError:
+        pass
+    temp = path + '.tmp'
+    with open(temp, 'wb') as f:
+        f.write(content)
+    os.replace(temp, path)
+    return True
+
+
+def batch(schemes, variants, output, data=None, deps=None, tmtheme=False, force=False, processes=None):
+    """
+    Tweak the schemes and write their variants to the output folder.
+
+    Returns `{"written", "unchanged", "skipped", "failed"}`: lists of output paths (the scheme and
+    error for failures). Variants are named after their scheme, so a scheme with the same name as
+    an earlier one fails instead of overwriting its variants.
+    """
+
+    if data is not None:
+        data = os.path.abspath(data)
+        headless.install(data)
+    if not os.path.exists(output):
+        os.makedirs(output)
+    manifest = {} if force else load_manifest(output)
+
+    results = {"written": [], "unchanged": [], "skipped": [], "failed": []}
+    tasks = []
+    keys = {}
+    # Variants are named after the scheme's name, so schemes of the same name would overwrite each other.
+    names = {}
+    for scheme in schemes:
+        name = os.path.splitext(os.path.basename(scheme))[0]
+        if name in names:
+            if names[name] != scheme:
+                error = "has the same name as '{}', so their variants would overwrite each other".format(names[name])
+                results["failed"].append((scheme, error))
+            continue
+        names[name] = scheme
+        try:
+            contents = source_content(scheme, data)
+        except IOError as e:
+            results["failed"].append((scheme, str(e)))
+            continue
+        pending = []
+        for variant, filters in sorted(variants.items()):
+            name = output_name(scheme, variant, tmtheme)
+            path = os.path.join(output, name)
+            key = keys[path] = source_key(contents, filters, tmtheme)
+            if manifest.get(name) == key and os.path.exists(path):
+                results["skipped"].append(path)
+            else:
+                pending.append((filters, path))
+        if pending:
+            tasks.append((scheme, data, headless.version(), pending, tmtheme))
+
+    if tasks:
+        pool = multiprocessing.Pool(processes, init_worker, (deps,))
+        try:
+            for scheme, written, error in pool.imap_unordered(tweak_scheme, tasks):
+                if error is not None:
+                    results["failed"].append((scheme, error))
+                for path, changed in written:
+                    results["written" if changed else "unchanged"].append(path)
+                    manifest[os.path.basename(path)] = keys[path]
+        finally:
+            pool.close()
+            pool.join()
+        save_manifest(output, manifest)
+    return results
+
+
+def main():
+    """Main."""
+
+    parser = argparse.ArgumentParser(prog='batch_tweak', description='Tweak color schemes in bulk.')
+    parser.add_argument('schemes', nargs='+', help="Scheme files, or resources ('Packages/...') of '--data'.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--filters', help="Filters to apply, as for the 'theme_tweaker_custom' command.")
+    group.add_argument('--variants', help="JSON file mapping variant names to filters.")
+    parser.add_argument('--output', required=True, help="Output folder.")
+    parser.add_argument('--data', default=None, help="Data folder containing 'Packages', to resolve resources.")
+    parser.add_argument(
+        '--deps', default=None,
+        help="'%s' separated dependency folders (default: ${%s})" % (os.pathsep, bench.DEPS_ENV)
+    )
+    parser.add_argument('--tmtheme', action='store_true', help="Write 'tmTheme' files.")
+    parser.add_argument('--force', action='store_true', help="Tweak all schemes, even if unchanged.")
+    parser.add_argument('--jobs', type=int, default=None, help="Worker processes (default: CPU count).")
+    args = parser.parse_args()
+
+    bench.add_dependency_paths(args.deps)
+    results = batch(
+        args.schemes, load_variants(args.filters, args.variants), args.output,
+        args.data, args.deps, args.tmtheme, args.force, args.jobs
+    )
+    for scheme, error in results["failed"]:
+        print('{}: {}'.format(scheme, error))
+    print(
+        '{} written, {} unchanged, {} skipped, {} failed'.format(
+            len(results["written"]), len(results["unchanged"]), len(results["skipped"]), len(results["failed"])
+        )
+    )
+    return 1 if results["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
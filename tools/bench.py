@@ -0,0 +1,54 @@
+"""Shared benchmark helpers."""
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEPS_ENV = "THEME_TWEAKER_DEPS"
+
+
+def add_dependency_paths(paths=None):
+    """
+    Make the repository and the Sublime dependencies importable.
+
+    `paths` (or the `THEME_TWEAKER_DEPS` environment variable) is an `os.pathsep` separated
+    list of folders to add to `sys.path`, for instance `Packages/mdpopups/st3`.
+    """
+
+    if paths is None:
+        paths = os.environ.get(DEPS_ENV, "")
+    for pth in reversed([p for p in paths.split(os.pathsep) if p] + [ROOT]):
+        if pth not in sys.path:
+            sys.path.insert(0, pth)
+
+
+def best_of(fn, number=1000, repeat=5):
+    """Return the best time, in seconds, of a single call to `fn`."""
+
+    return min(timeit.Timer(fn).repeat(repeat=repeat, number=number)) / number
+
+
+def add_arguments(parser):
+    """Add the arguments shared by all benchmarks."""
+
+    parser.add_argument(
+        '--deps', default=None,
+        help="'%s' separated dependency folders (default: ${%s})" % (os.pathsep, DEPS_ENV)
+    )
+    parser.add_argument('--number', type=int, default=1000, help="Calls per timing run.")
+    parser.add_argument('--repeat', type=int, default=5, help="Timing runs (best is kept).")
+
+
+def report(title, rows):
+    """Print `(name, seconds)` rows as a table of per-call time and throughput."""
+
+    print(title)
+    print('-' * len(title))
+    width = max([len(name) for name, _ in rows] + [4])
+    for name, seconds in rows:
+        print(
+            '{name:<{width}}  {usec:>10.2f} us  {rate:>12.0f} /s'.format(
+                name=name, width=width, usec=seconds * 1e6, rate=(1.0 / seconds) if seconds else 0.0
+            )
+        )
+    print('')
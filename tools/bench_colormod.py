@@ -0,0 +1,269 @@
+"""
+Color-mod parser benchmark.
+
+Times `ColorMod.adjust`, `Color(...)` and `Color.match` over color values of the kind shipped in the
+default and popular third party color schemes (Mariana, Monokai, Celeste, Breakers, etc.).
+
+The values in `colormod_corpus.json` (plain colors, `var()`, `alpha()`, `blend()`, `blenda()`,
+lightness/saturation and `min-contrast()` in the style of those schemes) are first checked to give
+exactly the same sRGB results as the original, unoptimized color-mod (`colormod_baseline`) run
+against the same mdpopups, so an optimization can't silently change a result, then timed to report
+parses per second. `--tolerance` allows a difference of some (8 bit) steps per channel.
+
+    python -m tools.bench_colormod --deps /path/to/Packages/mdpopups/st3
+    python -m tools.bench_colormod --deps /path/to/Packages/mdpopups/st3 --check
+"""
+import argparse
+import json
+import os
+import sys
+from . import bench
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'colormod_corpus.json')
+
+# Palette in the style of Mariana, used to resolve `var()` in `COLOR_MOD_VARS`.
+VARIABLES = {
+    "black": "hsl(0, 0%, 0%)",
+    "blue": "hsl(210, 50%, 60%)",
+    "blue2": "hsl(209, 13%, 35%)",
+    "blue3": "hsl(210, 15%, 22%)",
+    "blue4": "hsl(210, 13%, 45%)",
+    "blue5": "hsl(180, 36%, 54%)",
+    "blue6": "hsl(221, 12%, 69%)",
+    "green": "hsl(114, 31%, 68%)",
+    "grey": "hsl(0, 0%, 20%)",
+    "orange": "hsl(32, 93%, 66%)",
+    "pink": "hsl(300, 30%, 68%)",
+    "red": "hsl(357, 79%, 65%)",
+    "white": "hsl(0, 0%, 100%)",
+    "white3": "hsl(219, 28%, 88%)",
+    "yellow": "#f9ae58"
+}
+
+# Color-mod values without variables; these go straight to `ColorMod.adjust`.
+COLOR_MOD = [
+    "color(#272822 alpha(0.25))",
+    "color(#000000 alpha(0.25))",
+    "color(#5fb4b4 alpha(0.5))",
+    "color(#5fb4b4 a(0.25))",
+    "color(#f8f8f2 alpha(0.1))",
+    "color(#75715e alpha(* 0.5))",
+    "color(#e6db74 alpha(- 30%))",
+    "color(#303841 blend(#ffffff 95%))",
+    "color(#343d46 blenda(#99c794 80%))",
+    "color(#272822 blend(#f92672 70% hsl))",
+    "color(#1b2b34 blend(#6699cc 85% hwb))",
+    "color(#fdf6e3 l(- 5%))",
+    "color(#fdf6e3 lightness(+ 10%) saturation(- 5%))",
+    "color(#a6e22e s(* 50%))",
+    "color(#66d9ef min-contrast(#272822 4.5))",
+    "color(#75715e min-contrast(#fdf6e3 3))",
+    "color(hsl(210, 15%, 22%) blend(hsl(0, 0%, 100%) 90%))",
+    "color(rgb(39, 40, 34) alpha(0.5) blend(#ffffff 80%))",
+    "color(color(#272822 l(+ 5%)) alpha(0.8))",
+    "color(color(#272822 blend(#f8f8f2 90%)) min-contrast(#f8f8f2 2.5) alpha(0.7))",
+    "color(210 l(50%) s(60%))",
+    "color(#1e1e1e blend(color(#569cd6 alpha(0.5)) 75%))"
+]
+
+# Values as they appear in schemes, resolved through `Color(..., variables=VARIABLES)`.
+COLOR_MOD_VARS = [
+    "color(var(black) alpha(0.25))",
+    "color(var(blue5) alpha(0.5))",
+    "color(var(blue5) alpha(0.25))",
+    "color(var(blue3) blend(var(white) 95%))",
+    "color(var(blue2) blenda(var(green) 80%))",
+    "color(var(blue6) alpha(0.5) blend(var(blue3) 50%))",
+    "color(var(orange) min-contrast(var(blue3) 4.5))",
+    "color(var(white3) l(- 10%) s(+ 5%))",
+    "color(var(red) alpha(0.15))",
+    "color(var(yellow) blend(var(grey) 60% hsl))",
+    "var(blue)",
+    "var(yellow)"
+]
+
+# Plain colors as found in schemes, used to time `Color.match`.
+PLAIN = [
+    "#272822",
+    "#F8F8F2",
+    "#75715e",
+    "#49483E80",
+    "#fff",
+    "#0008",
+    "rgb(39, 40, 34)",
+    "rgba(255, 255, 255, 0.1)",
+    "hsl(210, 15%, 22%)",
+    "hsla(0, 0%, 100%, 0.5)",
+    "hwb(210 10% 20%)",
+    "white",
+    "transparent",
+    "lab(50% 40 59.5)"
+]
+
+
+def match_all_spaces(cls, string):
+    """Match the way `Color._match` did before prefix dispatch: try every color space, keep the last hit."""
+
+    from mdpopups.coloraide import ColorMatch
+
+    obj = None
+    for space, space_class in cls.CS_MAP.items():
+        value, match_end = space_class.match(string, 0, True)
+        if value is not None:
+            obj = ColorMatch(space_class(*value), 0, match_end)
+    return obj
+
+
+def nested(depth):
+    """Build a color-mod expression with `depth` levels of nested `color()`."""
+
+    value = "#272822"
+    for _ in range(depth):
+        value = "color({} alpha(* 0.99))".format(value)
+    return value
+
+
+def load_corpus(path=CORPUS):
+    """Load the corpus: `{"variables": {...}, "colors": [value, ...]}`."""
+
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def compare(colors, variables, tolerance=0):
+    """
+    Resolve the colors with `st_colormod` and the original color-mod, and return the differences.
+
+    Returns `(value, expected, actual)` for each value whose sRGB channels (8 bit, with alpha) differ
+    by more than `tolerance` steps, or where only one of them fails (the error is given instead).
+    """
+
+    from lib.rgba import RGBA, to_byte
+    from lib import st_colormod
+    from . import colormod_baseline
+
+    def resolve(module, value):
+        """Resolve the value to a hex color and its 8 bit channels, or the error."""
+
+        try:
+            color = module.Color(value, variables=variables).convert("srgb").to_string(hex=True)
+        except Exception as e:
+            return '{}: {}'.format(type(e).__name__, e), None
+        rgba = RGBA.from_hex(color)
+        return color, rgba.to_bytes() + (to_byte(rgba.alpha),)
+
+    differences = []
+    for value in colors:
+        expected, channels1 = resolve(colormod_baseline, value)
+        actual, channels2 = resolve(st_colormod, value)
+        if channels1 is None or channels2 is None:
+            same = channels1 is None and channels2 is None
+        else:
+            same = all(abs(a - b) <= tolerance for a, b in zip(channels1, channels2))
+        if not same:
+            differences.append((value, expected, actual))
+    return differences
+
+
+def check(corpus, tolerance=0):
+    """Check each corpus value resolves as it did originally and return the number of mismatches."""
+
+    differences = compare(corpus['colors'], corpus['variables'], tolerance)
+    for value, expected, actual in differences:
+        print('{}: expected {}, got {}'.format(value, expected, actual))
+    total = len(corpus['colors'])
+    print('Corpus check: {} of {} values match'.format(total - len(differences), total))
+    print('')
+    return len(differences)
+
+
+def run_corpus(corpus, number=1000, repeat=5):
+    """Report parses per second over the corpus."""
+
+    from lib.st_colormod import Color, ColorMod
+
+    colors = corpus['colors']
+    variables = corpus['variables']
+    # `ColorMod.adjust` doesn't resolve variables, and only takes `color()`.
+    adjust = [value for value in colors if value.startswith('color(') and 'var(' not in value]
+    plain = [value for value in colors if not value.startswith(('color(', 'var('))]
+    count = max(1, number // 10)
+    rows = []
+    for name, values, fn in (
+        ('Color(..., variables)', colors, lambda value: Color(value, variables=variables)),
+        ('Color.match', plain, lambda value: Color.match(value, fullmatch=True)),
+        ('ColorMod.adjust', adjust, lambda value: ColorMod().adjust(value))
+    ):
+        total = bench.best_of(lambda: [fn(value) for value in values], count, repeat)
+        rows.append(('{} x {}'.format(name, len(values)), total / len(values)))
+    bench.report('Corpus (per value)', rows)
+
+
+def run(number=1000, repeat=5):
+    """Run the benchmark."""
+
+    from lib.st_colormod import Color, ColorMod
+
+    rows = []
+    for value in COLOR_MOD:
+        rows.append(
+            (value, bench.best_of(lambda value=value: ColorMod().adjust(value), number, repeat))
+        )
+    bench.report('ColorMod.adjust', rows)
+
+    rows = []
+    for value in COLOR_MOD_VARS:
+        rows.append(
+            (value, bench.best_of(lambda value=value: Color(value, variables=VARIABLES), number, repeat))
+        )
+    bench.report('Color(..., variables)', rows)
+
+    before = 0.0
+    after = 0.0
+    rows = []
+    for value in PLAIN:
+        old = bench.best_of(lambda value=value: match_all_spaces(Color, value), number, repeat)
+        new = bench.best_of(lambda value=value: Color.match(value, fullmatch=True), number, repeat)
+        before += old
+        after += new
+        rows.append((value + ' (all spaces)', old))
+        rows.append((value + ' (dispatch)', new))
+    rows.append(('corpus (all spaces)', before / len(PLAIN)))
+    rows.append(('corpus (dispatch)', after / len(PLAIN)))
+    bench.report('Color.match', rows)
+
+    rows = []
+    for depth in (1, 5, 10, 20):
+        value = nested(depth)
+        rows.append(
+            ('depth {}'.format(depth), bench.best_of(lambda value=value: ColorMod().adjust(value), number, repeat))
+        )
+    bench.report('Nested color()', rows)
+
+    total = bench.best_of(lambda: [ColorMod().adjust(v) for v in COLOR_MOD], max(1, number // 10), repeat)
+    bench.report('Corpus', [('ColorMod.adjust x {}'.format(len(COLOR_MOD)), total / len(COLOR_MOD))])
+
+
+def main():
+    """Main."""
+
+    parser = argparse.ArgumentParser(prog='bench_colormod', description='Color-mod parser benchmark.')
+    bench.add_arguments(parser)
+    parser.add_argument('--check', action='store_true', help="Only check the corpus results.")
+    parser.add_argument(
+        '--tolerance', type=int, default=0, help="Allowed difference, in 8 bit steps, per channel (default: 0)."
+    )
+    parser.add_argument('--corpus', default=CORPUS, help="Corpus file.")
+    args = parser.parse_args()
+    bench.add_dependency_paths(args.deps)
+    corpus = load_corpus(args.corpus)
+    if check(corpus, args.tolerance):
+        return 1
+    if not args.check:
+        run_corpus(corpus, args.number, args.repeat)
+        run(args.number, args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+JSON sanitizer benchmark.
+
+Times `sanitize_json` against the original two pass approach (strip comments, then strip dangling
+commas) on generated multi-megabyte `Preferences.sublime-settings` and color scheme files, and
+checks both produce the same JSON, also timing the one pass `parse_json` against sanitizing and
+loading. The same files without comments and dangling commas are used
+to time the clean file fast path and `load_json` against sanitizing then loading. Reports MB/s.
+Finally, loading the generated color scheme from a file with the streaming stripper and decoder
+is compared with reading, sanitizing and loading it, reporting time and peak memory.
+
+    python -m tools.bench_file_strip --size 4
+"""
+import argparse
+import io
+import json
+import sys
+import time
+import tracemalloc
+from . import bench
+
+PREFERENCES_ENTRY = '''
+    // Setting {index}: a comment describing the setting, like the ones in the
+    // default preferences, with a URL: https://www.sublimetext.com/docs/settings_{index}.html
+    "setting_{index}": {value},
+    /* A block comment,
+       spanning lines, with "quotes" and a trailing comma, */
+    "list_{index}": ["a//b", "c/*d*/", "e'", {index}, ],
+'''
+
+SCHEME_RULE = '''        {{
+            // Rule {index}
+            "name": "Rule {index}",
+            "scope": "source.generated{index} meta.rule{index}, string.quoted.double - comment",
+            "foreground": "color(var(blue) blend(var(white) {percent}%))",
+            "background": "#{bg:06x}",
+            "font_style": "italic",
+        }},
+'''
+
+
+def generate_preferences(size):
+    """Generate a settings file of about `size` MB."""
+
+    parts = ['// Generated by tools.bench_file_strip\n{']
+    total = 0
+    index = 0
+    while total < size * 1024 * 1024:
+        part = PREFERENCES_ENTRY.format(index=index, value=('true', '"auto"', '12.5', '[]')[index % 4])
+        parts.append(part)
+        total += len(part)
+        index += 1
+    parts.append('}\n')
+    return ''.join(parts)
+
+
+def generate_scheme(size):
+    """Generate a color scheme of about `size` MB."""
+
+    parts = [
+        '// Generated by tools.bench_file_strip\n{\n    "name": "Generated",\n'
+        '    "variables": {"blue": "#6699cc", "white": "#ffffff", },\n'
+        '    "globals": {"background": "#303841", "foreground": "#d8dee9", },\n    "rules": [\n'
+    ]
+    total = 0
+    index = 0
+    while total < size * 1024 * 1024:
+        part = SCHEME_RULE.format(index=index, percent=index % 100, bg=(index * 2654435761) & 0xFFFFFF)
+        parts.append(part)
+        total += len(part)
+        index += 1
+    parts.append('    ],\n}\n')
+    return ''.join(parts)
+
+
+def two_pass(text, preserve_lines=False):
+    """Sanitize the way `sanitize_json` used to: strip comments, then strip dangling commas."""
+
+    from lib.file_strip.json import strip_comments, strip_dangling_commas
+
+    return strip_dangling_commas(strip_comments(text, preserve_lines), preserve_lines)
+
+
+def print_rows(title, rows):
+    """Print `(name, seconds, MB/s)` rows."""
+
+    print(title)
+    print('-' * len(title))
+    width = max(len(row[0]) for row in rows)
+    for label, seconds, rate in rows:
+        print('{:<{width}}  {:>8.3f}s  {:>8.1f} MB/s'.format(label, seconds, rate, width=width))
+    print('')
+
+
+def run(size=4, number=1, repeat=3):
+    """Run the benchmark and return the number of mismatched results."""
+
+    from lib.file_strip.json import sanitize_json, load_json, load_json_stream, parse_json, stats
+
+    failures = 0
+    for name, text in (
+        ('Preferences.sublime-settings', generate_preferences(size)),
+        ('Generated.sublime-color-scheme', generate_scheme(size))
+    ):
+        mb = len(text) / (1024.0 * 1024.0)
+        rows = []
+        for preserve_lines in (False, True):
+            expected = two_pass(text, preserve_lines)
+            actual = sanitize_json(text, preserve_lines)
+            if json.loads(expected) != json.loads(actual):
+                failures += 1
+                print('{} (preserve_lines={}): results differ'.format(name, preserve_lines))
+            if preserve_lines and actual.count('\n') != text.count('\n'):
+                failures += 1
+                print('{}: lines not preserved'.format(name))
+            for label, fn in (('two pass', two_pass), ('single pass', sanitize_json)):
+                seconds = bench.best_of(lambda: fn(text, preserve_lines), number, repeat)
+                rows.append(('{} (preserve_lines={})'.format(label, preserve_lines), seconds, mb / seconds))
+
+        if parse_json(text) != json.loads(sanitize_json(text)):
+            failures += 1
+            print('{}: parse_json results differ'.format(name))
+        for label, fn in (
+            ('sanitize + json.loads', lambda: json.loads(sanitize_json(text))),
+            ('parse_json', lambda: parse_json(text))
+        ):
+            seconds = bench.best_of(fn, number, repeat)
+            rows.append((label, seconds, mb / seconds))
+
+        print_rows('{} ({:.1f} MB)'.format(name, mb), rows)
+
+    for name, text in (
+        ('Preferences.sublime-settings (clean)', json.dumps(json.loads(sanitize_json(generate_preferences(size))))),
+        ('Generated.sublime-color-scheme (clean)', json.dumps(json.loads(sanitize_json(generate_scheme(size)))))
+    ):
+        mb = len(text) / (1024.0 * 1024.0)
+        rows = []
+        for label, fn in (
+            ('two pass', lambda: two_pass(text)),
+            ('single pass', lambda: sanitize_json(text)),
+            ('sanitize + json.loads', lambda: json.loads(sanitize_json(text))),
+            ('load_json', lambda: load_json(text))
+        ):
+            seconds = bench.best_of(fn, number, repeat)
+            rows.append((label, seconds, mb / seconds))
+        print_rows('{} ({:.1f} MB)'.format(name, mb), rows)
+
+    print(stats())
+    print('')
+
+    text = generate_scheme(size)
+    expected = json.loads(sanitize_json(text))
+    print('Loading Generated.sublime-color-scheme ({:.1f} MB) from a file'.format(len(text) / (1024.0 * 1024.0)))
+    for label, fn in (
+        ('read + sanitize + json.loads', lambda f: json.loads(sanitize_json(f.read(), True))),
+        ('load_json_stream', load_json_stream)
+    ):
+        if fn(io.StringIO(text)) != expected:
+            failures += 1
+            print('{}: results differ'.format(label))
+        start = time.perf_counter()
+        fn(io.StringIO(text))
+        elapsed = time.perf_counter() - start
+        # The file object itself isn't counted.
+        f = io.StringIO(text)
+        tracemalloc.start()
+        try:
+            fn(f)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        print('{:<28}  {:>8.3f}s  {:>8.1f} MB peak'.format(label, elapsed, peak / (1024.0 * 1024.0)))
+    print('')
+    return failures
+
+
+def main():
+    """Main."""
+
+    parser = argparse.ArgumentParser(prog='bench_file_strip', description='JSON sanitizer benchmark.')
+    bench.add_arguments(parser)
+    parser.add_argument('--size', type=float, default=4, help="Approximate size, in MB, of each generated file.")
+    parser.set_defaults(number=1, repeat=3)
+    args = parser.parse_args()
+    bench.add_dependency_paths(args.deps)
+    return 1 if run(args.size, args.number, args.repeat) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
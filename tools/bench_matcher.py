@@ -0,0 +1,361 @@
+"""
+`ColorSchemeMatcher` benchmark.
+
+Generates a synthetic color scheme of configurable size (rules, variables, gradients,
+`foreground_adjust`, alpha colors and override files) in a temporary data folder, and loads it
+through the headless `sublime` stand-in. `ColorSchemeMatcher.__init__` is timed per phase (load,
+`merge_overrides`, `parse_scheme`, `setup_matcher`); load is reading and decoding the scheme and
+override resources, or converting a `tmTheme`, wherever it happens (new schemes are read while
+their overrides are merged). `guess_color` is timed cold (empty match cache) and warm over a scope
+stream with the repetition of a real buffer, and the matcher's `guess_color` counters are reported
+for one cold and one warm pass. Results can be written as JSON to track regressions across commits.
+
+    python -m tools.bench_matcher --deps /path/to/Packages/mdpopups/st3 --rules 2000 --json matcher.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from . import bench
+from . import headless
+
+SCHEME_NAME = 'Bench.sublime-color-scheme'
+
+KINDS = (
+    'keyword.control', 'string.quoted.double', 'comment.line', 'entity.name.function',
+    'variable.other', 'constant.numeric', 'storage.type', 'support.function'
+)
+
+PHASES = ('load', 'merge_overrides', 'parse_scheme', 'setup_matcher')
+
+
+def generate_variables(rand, count):
+    """Generate variables, some referencing others."""
+
+    variables = {}
+    for index in range(count):
+        if index >= 2 and index % 3 == 0:
+            variables['c{}'.format(index)] = 'color(var(c{}) blend(var(c{}) {}%))'.format(
+                rand.randrange(index), rand.randrange(index), rand.randint(10, 90)
+            )
+        else:
+            variables['c{}'.format(index)] = 'hsl({}, {}%, {}%)'.format(
+                rand.randint(0, 359), rand.randint(20, 80), rand.randint(20, 80)
+            )
+    return variables
+
+
+def generate_rules(rand, count, variables, options, offset=0):
+    """Generate rules using a mix of plain, variable, color-mod, gradient and alpha colors."""
+
+    names = list(variables)
+    rules = []
+    for number in range(offset, offset + count):
+        kind = KINDS[number % len(KINDS)]
+        scope = '{}.rule{}'.format(kind, number)
+        if number % 5 == 0:
+            scope = 'source.gen meta.rule{} {}'.format(number, scope)
+        elif number % 7 == 0:
+            scope = '{} - comment'.format(scope)
+        rule = {"name": "Rule {}".format(number), "scope": scope}
+
+        value = rand.random()
+        color = '#{:06x}'.format(rand.getrandbits(24))
+        if value < options['gradients']:
+            rule['foreground'] = [color, '#{:06x}'.format(rand.getrandbits(24))]
+        elif value < options['gradients'] + options['alpha']:
+            rule['foreground'] = '{}{:02x}'.format(color, rand.randint(0x20, 0xe0))
+        elif names and value < 0.7:
+            rule['foreground'] = 'var({})'.format(rand.choice(names))
+        elif names:
+            rule['foreground'] = 'color(var({}) alpha(0.{}))'.format(rand.choice(names), rand.randint(3, 9))
+        else:
+            rule['foreground'] = color
+
+        if rand.random() < options['backgrounds']:
+            rule['background'] = '#{:06x}'.format(rand.getrandbits(24))
+            if rand.random() < options['foreground_adjust']:
+                rule['foreground_adjust'] = rand.choice(('l(+ 10%)', 's(- 20%)', 'blend(#ffffff 80%)'))
+        if number % 4 == 0:
+            rule['font_style'] = rand.choice(('bold', 'italic', 'bold italic', 'underline'))
+        rules.append(rule)
+    return rules
+
+
+def generate(data, rules=1000, variables=50, overrides=2, gradients=0.05, alpha=0.1,
+             backgrounds=0.2, foreground_adjust=0.5, seed=0):
+    """Write the scheme and its overrides to the data folder and return the scheme resource."""
+
+    rand = random.Random(seed)
+    options = {
+        'gradients': gradients, 'alpha': alpha, 'backgrounds': backgrounds, 'foreground_adjust': foreground_adjust
+    }
+    scheme_vars = generate_variables(rand, variables)
+    files = [(
+        'Bench',
+        {
+            "name": "Bench",
+            "variables": scheme_vars,
+            "globals": {
+                "background": "#272822",
+                "foreground": "#f8f8f2",
+                "selection": "color(#49483e alpha(0.8))",
+                "selection_foreground": "#ffffff",
+                "gutter": "var(c0)"
+            },
+            "rules": generate_rules(rand, rules, scheme_vars, options)
+        }
+    )]
+    per_override = max(1, rules // 10)
+    for index in range(overrides):
+        files.append((
+            'User' if index == overrides - 1 else 'Override{}'.format(index),
+            {
+                "variables": {"c0": "#{:06x}".format(rand.getrandbits(24))},
+                "globals": {"line_highlight": "color(var(c0) alpha(0.2))"},
+                "rules": generate_rules(rand, per_override, scheme_vars, options, rules + index * per_override)
+            }
+        ))
+
+    for package, obj in files:
+        folder = os.path.join(data, 'Packages', package)
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, SCHEME_NAME), 'w', encoding='utf-8') as f:
+            json.dump(obj, f, indent=4)
+    return 'Packages/Bench/' + SCHEME_NAME
+
+
+def scope_stream(rules, count, seed=0):
+    """Generate scopes the way a buffer would produce them: a few scopes repeated often."""
+
+    rand = random.Random(seed)
+    stream = []
+    for _ in range(count):
+        number = min(int(rand.paretovariate(1.2)) - 1, rules - 1)
+        number = (number * 7919) % rules
+        kind = KINDS[number % len(KINDS)]
+        leaf = '{}.rule{}.gen'.format(kind, number)
+        if rand.random() < 0.1:
+            leaf = 'comment.block.gen {}'.format(leaf)
+        stream.append('source.gen meta.block.gen meta.rule{} {}'.format(number, leaf))
+    return stream
+
+
+def timed_matcher():
+    """Get a matcher class that records how long each phase of `__init__` takes."""
+
+    import sublime
+    from lib.color_scheme_matcher import ColorSchemeMatcher
+
+    class TimedColorSchemeMatcher(ColorSchemeMatcher):
+        """Matcher with per-phase timings."""
+
+        def __init__(self, *args, **kwargs):
+            """Initialize."""
+
+            self.timings = dict.fromkeys(PHASES, 0.0)
+            self._phase = None
+            self._loading = 0.0
+            # Resources are read and decoded inline (and in `merge_overrides` for new schemes),
+            # so those calls are timed as loading while the matcher is built.
+            originals = {
+                name: getattr(sublime, name) for name in ('load_resource', 'load_binary_resource', 'decode_value')
+            }
+            for name, fn in originals.items():
+                setattr(sublime, name, self._timed_load(fn))
+            try:
+                ColorSchemeMatcher.__init__(self, *args, **kwargs)
+            finally:
+                for name, fn in originals.items():
+                    setattr(sublime, name, fn)
+
+        def _timed(self, phase, fn, *args):
+            """Time the call as the given phase, unless already inside a phase, less any loading."""
+
+            if self._phase is not None:
+                return fn(*args)
+            self._phase = phase
+            self._loading = 0.0
+            start = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self.timings[phase] += time.perf_counter() - start - self._loading
+                self._phase = None
+
+        def _timed_load(self, fn):
+            """Wrap the function to time its calls as loading."""
+
+            def wrapper(*args, **kwargs):
+                """Time the call."""
+
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - start
+                    self.timings['load'] += elapsed
+                    if self._phase is not None:
+                        self._loading += elapsed
+            return wrapper
+
+        def load_tmtheme(self, *args):
+            """Load `tmTheme` content."""
+
+            return self._timed('load', ColorSchemeMatcher.load_tmtheme, self, *args)
+
+        def read_tmtheme(self, *args):
+            """Read `tmTheme` content."""
+
+            return self._timed('load', ColorSchemeMatcher.read_tmtheme, self, *args)
+
+        def merge_overrides(self):
+            """Merge override schemes."""
+
+            return self._timed('merge_overrides', ColorSchemeMatcher.merge_overrides, self)
+
+        def parse_scheme(self):
+            """Parse the color scheme."""
+
+            return self._timed('parse_scheme', ColorSchemeMatcher.parse_scheme, self)
+
+        def setup_matcher(self):
+            """Setup colors for color matcher."""
+
+            return self._timed('setup_matcher', ColorSchemeMatcher.setup_matcher, self)
+
+    return TimedColorSchemeMatcher
+
+
+def summarize(samples):
+    """Summarize timings (seconds) as best, median and worst."""
+
+    return {"min": min(samples), "median": statistics.median(samples), "max": max(samples)}
+
+
+def run(scheme, rules, repeat=5, scopes=20000):
+    """Run the benchmark and return the results."""
+
+    matcher_class = timed_matcher()
+
+    init = []
+    phases = {phase: [] for phase in PHASES}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        csm = matcher_class(scheme)
+        init.append(time.perf_counter() - start)
+        for phase in PHASES:
+            phases[phase].append(csm.timings[phase])
+
+    stream = scope_stream(rules, scopes)
+    unique = len(set(stream))
+    cold = []
+    warm = []
+    for _ in range(repeat):
+        csm.matched = {}
+        start = time.perf_counter()
+        for scope in stream:
+            csm.guess_color(scope)
+        cold.append((time.perf_counter() - start) / len(stream))
+        start = time.perf_counter()
+        for scope in stream:
+            csm.guess_color(scope)
+        warm.append((time.perf_counter() - start) / len(stream))
+
+    # One more cold and warm pass, untimed, to count what the calls do.
+    csm.matched = {}
+    csm.track_stats = True
+    csm.reset_stats()
+    for _ in range(2):
+        for scope in stream:
+            csm.guess_color(scope)
+
+    return {
+        "rules": len(csm.scheme_obj['rules']),
+        "variables": len(csm.scheme_obj['variables']),
+        "overrides": len(csm.overrides),
+        "init": summarize(init),
+        "phases": {phase: summarize(samples) for phase, samples in phases.items()},
+        "guess_color": {
+            "scopes": len(stream),
+            "unique_scopes": unique,
+            "cold": summarize(cold),
+            "warm": summarize(warm),
+            "stats": csm.stats()
+        }
+    }
+
+
+def print_results(results):
+    """Print the results as a table."""
+
+    title = 'ColorSchemeMatcher ({rules} rules, {variables} variables, {overrides} overrides)'.format(**results)
+    print(title)
+    print('-' * len(title))
+    rows = [('__init__', results['init'])] + [(phase, results['phases'][phase]) for phase in PHASES]
+    for name, value in rows:
+        print('{:<16}  {:>10.2f} ms  (median {:.2f} ms)'.format(name, value['min'] * 1e3, value['median'] * 1e3))
+    gc = results['guess_color']
+    label = 'guess_color ({scopes} scopes, {unique_scopes} unique)'.format(**gc)
+    print('')
+    print(label)
+    print('-' * len(label))
+    for name in ('cold', 'warm'):
+        print('{:<16}  {:>10.2f} us  (median {:.2f} us)'.format(name, gc[name]['min'] * 1e6, gc[name]['median'] * 1e6))
+    print('')
+    label = 'guess_color counters (one cold and one warm pass)'
+    print(label)
+    print('-' * len(label))
+    for name in ('guess_color', 'hits', 'misses', 'score_selector', 'foreground_adjust'):
+        print('{:<18}  {:>10d}'.format(name, gc['stats'][name]))
+    print('{:<18}  {:>10.2f} ms'.format('time', gc['stats']['time'] * 1e3))
+    print('')
+
+
+def main():
+    """Main."""
+
+    parser = argparse.ArgumentParser(prog='bench_matcher', description='ColorSchemeMatcher benchmark.')
+    bench.add_arguments(parser)
+    parser.add_argument('--rules', type=int, default=1000, help="Rules in the generated scheme.")
+    parser.add_argument('--variables', type=int, default=50, help="Variables in the generated scheme.")
+    parser.add_argument('--overrides', type=int, default=2, help="Override files (the last one is in 'User').")
+    parser.add_argument('--gradients', type=float, default=0.05, help="Fraction of rules with gradients.")
+    parser.add_argument('--alpha', type=float, default=0.1, help="Fraction of rules with alpha colors.")
+    parser.add_argument('--backgrounds', type=float, default=0.2, help="Fraction of rules with backgrounds.")
+    parser.add_argument(
+        '--foreground-adjust', type=float, default=0.5, help="Fraction of backgrounds with 'foreground_adjust'."
+    )
+    parser.add_argument('--scopes', type=int, default=20000, help="Scopes in the 'guess_color' stream.")
+    parser.add_argument('--json', default=None, help="Write the results as JSON to the file.")
+    parser.set_defaults(repeat=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data:
+        headless.install(data)
+        bench.add_dependency_paths(args.deps)
+        scheme = generate(
+            data, args.rules, args.variables, args.overrides, args.gradients, args.alpha,
+            args.backgrounds, args.foreground_adjust
+        )
+        results = run(scheme, args.rules, args.repeat, args.scopes)
+
+    results['options'] = {
+        name: getattr(args, name) for name in (
+            'rules', 'variables', 'overrides', 'gradients', 'alpha', 'backgrounds', 'foreground_adjust', 'scopes',
+            'repeat'
+        )
+    }
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
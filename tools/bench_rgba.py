@@ -0,0 +1,83 @@
+"""
+Color value benchmark.
+
+Compares the per color work done by `ColorSchemeMatcher.process_color` and the tweaker
+(parse hex, composite over the background, format hex) using the full `Color` object versus
+the lightweight `RGBA` type. Reports time and `tracemalloc` allocations.
+
+    python -m tools.bench_rgba --deps /path/to/Packages/mdpopups/st3
+"""
+import argparse
+import tracemalloc
+from . import bench
+
+COLORS = [
+    "#272822", "#f8f8f2", "#75715e", "#49483e80", "#66d9ef", "#a6e22e", "#f92672",
+    "#fd971f", "#ae81ff", "#e6db74", "#3e3d32", "#f8f8f0", "#00000066", "#ffffff0d"
+]
+BACKGROUND = "#272822"
+
+
+def with_color():
+    """Process the colors with `Color`."""
+
+    from lib.st_colormod import Color
+
+    bground = Color(BACKGROUND)
+    return [Color(c).compose(bground).to_string(hex=True, alpha=True) for c in COLORS]
+
+
+def with_rgba():
+    """Process the colors with `RGBA`."""
+
+    from lib.rgba import RGBA
+
+    bground = RGBA.from_hex(BACKGROUND)
+    return [RGBA.from_hex(c).compose(bground).to_hex(alpha=True) for c in COLORS]
+
+
+def allocations(fn):
+    """Return the number of allocated blocks and the peak size, in bytes, while running `fn`."""
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        fn()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'lineno') if stat.count_diff > 0)
+    return blocks, peak
+
+
+def run(number=1000, repeat=5):
+    """Run the benchmark."""
+
+    # Warm up imports and caches so they aren't counted as allocations.
+    with_color()
+    with_rgba()
+
+    rows = []
+    for name, fn in (('Color', with_color), ('RGBA', with_rgba)):
+        rows.append((name, bench.best_of(fn, number, repeat) / len(COLORS)))
+    bench.report('Parse, compose and format (per color)', rows)
+
+    print('Allocations for {} colors'.format(len(COLORS)))
+    for name, fn in (('Color', with_color), ('RGBA', with_rgba)):
+        blocks, peak = allocations(fn)
+        print('{:<6} {:>8} blocks  {:>10} bytes peak'.format(name, blocks, peak))
+
+
+def main():
+    """Main."""
+
+    parser = argparse.ArgumentParser(prog='bench_rgba', description='Color value benchmark.')
+    bench.add_arguments(parser)
+    args = parser.parse_args()
+    bench.add_dependency_paths(args.deps)
+    run(args.number, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
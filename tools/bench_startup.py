@@ -0,0 +1,126 @@
+"""
+Plugin startup benchmark.
+
+Times what loading the plugin adds to editor startup: importing `theme_tweaker` and running
+`plugin_loaded`, each in a fresh process (imports are only slow once) loading the plugin through
+the headless `sublime` stand-in. The deferred refresh `plugin_loaded` queues is timed separately,
+as it runs in the background, and the modules that should only be imported on first use are
+checked not to have been imported by then.
+
+    python -m tools.bench_startup --deps /path/to/Packages/mdpopups/st3 --rules 1000
+
+The color scheme is a generated one of `--rules` rules.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from . import bench
+from . import bench_matcher
+from . import headless
+
+# Modules that are only needed once something is tweaked.
+LAZY = (
+    'mdpopups.coloraide', 'ThemeTweaker.lib.color_scheme_matcher', 'ThemeTweaker.lib.color_scheme_tweaker',
+    'ThemeTweaker.lib.st_colormod', 'ThemeTweaker.lib.file_strip.json', 'plistlib', 'xml.parsers.expat'
+)
+
+
+def measure(rules=100):
+    """Load the plugin in this process and return the timings and the lazy modules imported at each step."""
+
+    with tempfile.TemporaryDirectory() as data:
+        headless.install(data)
+        scheme = bench_matcher.generate(data, rules, overrides=1)
+        headless.load_settings('Preferences.sublime-settings').set('color_scheme', scheme)
+
+        start = time.perf_counter()
+        plugin = headless.load_plugin()
+        imported = time.perf_counter() - start
+        after_import = [name for name in LAZY if name in sys.modules]
+
+        start = time.perf_counter()
+        plugin.plugin_loaded()
+        loaded = time.perf_counter() - start
+        after_loaded = [name for name in LAZY if name in sys.modules]
+
+        start = time.perf_counter()
+        headless.run_timeouts()
+        refresh = time.perf_counter() - start
+
+    return {
+        "import": imported,
+        "plugin_loaded": loaded,
+        "refresh": refresh,
+        "imported": {"import": after_import, "plugin_loaded": after_loaded}
+    }
+
+
+def run(deps=None, rules=100, repeat=5):
+    """Measure startup in fresh processes and return the timings."""
+
+    samples = []
+    for _ in range(repeat):
+        cmd = [sys.executable, '-m', 'tools.bench_startup', '--child', '--rules', str(rules)]
+        if deps is not None:
+            cmd.extend(['--deps', deps])
+        output = subprocess.check_output(cmd, cwd=bench.ROOT)
+        # The plugin may log to the console, the timings are the last line.
+        samples.append(json.loads(output.decode('utf-8').splitlines()[-1]))
+
+    results = {"imported": samples[-1]["imported"]}
+    for phase in ('import', 'plugin_loaded', 'refresh'):
+        values = [sample[phase] for sample in samples]
+        results[phase] = {"min": min(values), "median": statistics.median(values)}
+    return results
+
+
+def print_results(results, rules):
+    """Print the results."""
+
+    title = 'Startup ({} rules)'.format(rules)
+    print(title)
+    print('-' * len(title))
+    for phase, label in (('import', 'import'), ('plugin_loaded', 'plugin_loaded'), ('refresh', 'refresh (async)')):
+        value = results[phase]
+        print('{:<16}  {:>10.2f} ms  (median {:.2f} ms)'.format(label, value['min'] * 1e3, value['median'] * 1e3))
+    print('')
+    for step in ('import', 'plugin_loaded'):
+        names = results["imported"][step]
+        print('Lazy modules imported by {}: {}'.format(step, ', '.join(names) if names else 'none'))
+    print('')
+
+
+def main():
+    """Main."""
+
+    parser = argparse.ArgumentParser(prog='bench_startup', description='Plugin startup benchmark.')
+    parser.add_argument(
+        '--deps', default=None,
+        help="'%s' separated dependency folders (default: ${%s})" % (os.pathsep, bench.DEPS_ENV)
+    )
+    parser.add_argument('--repeat', type=int, default=5, help="Processes to time (best is kept).")
+    parser.add_argument('--rules', type=int, default=100, help="Rules in the generated scheme.")
+    parser.add_argument('--json', default=None, help="Write the results as JSON to the file.")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        bench.add_dependency_paths(args.deps)
+        print(json.dumps(measure(args.rules)))
+        return 0
+
+    results = run(args.deps, args.rules, args.repeat)
+    print_results(results, args.rules)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
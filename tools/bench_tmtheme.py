@@ -0,0 +1,288 @@
+"""
+`tmTheme` color benchmark.
+
+Times `ColorSRGBX11(...).to_string()` as used when converting `tmTheme` files and checks the
+output against the original (fit, template and regex based) formatter. Also compares reading a
+generated `tmTheme` with `plistlib` (after stripping comments with a regex) against the
+incremental reader, and writing it with `plistlib` against the direct writer (checking the
+output is identical), reporting time and peak memory.
+
+    python -m tools.bench_tmtheme --deps /path/to/Packages/mdpopups/st3 --rules 20000
+"""
+import argparse
+import io
+import plistlib
+import re
+import sys
+import time
+import tracemalloc
+from . import bench
+
+XML_COMMENT_RE = re.compile(br"^[\r\n\s]*<!--[\s\S]*?-->[\s\r\n]*|<!--[\s\S]*?-->")
+
+TMTHEME_HEAD = '''<!-- Generated by tools.bench_tmtheme -->
+<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">
+<plist version="1.0">
+<dict>
+    <key>name</key>
+    <string>Generated</string>
+    <key>settings</key>
+    <array>
+        <dict>
+            <key>settings</key>
+            <dict>
+                <key>background</key>
+                <string>#272822</string>
+                <key>foreground</key>
+                <string>#F8F8F2</string>
+                <key>selection</key>
+                <string>#49483E</string>
+            </dict>
+        </dict>
+'''
+
+TMTHEME_RULE = '''        <!-- Rule {index} -->
+        <dict>
+            <key>name</key>
+            <string>Rule {index}</string>
+            <key>scope</key>
+            <string>source.generated{index} meta.rule{index}</string>
+            <key>settings</key>
+            <dict>
+                <key>foreground</key>
+                <string>#{fg:06X}</string>
+                <key>background</key>
+                <string>#{bg:06X}40</string>
+                <key>fontStyle</key>
+                <string>italic</string>
+            </dict>
+        </dict>
+'''
+
+TMTHEME_TAIL = '''    </array>
+    <key>uuid</key>
+    <string>00000000-0000-0000-0000-000000000000</string>
+</dict>
+</plist>
+'''
+
+# Color values as found in `tmTheme` files (`#RRGGBBAA` is alpha last, X11 names are allowed).
+COLORS = [
+    "#272822", "#F8F8F2", "#75715E", "#49483E", "#F8F8F0", "#3E3D32", "#66D9EF", "#A6E22E",
+    "#F92672", "#FD971F", "#AE81FF", "#E6DB74", "#FFFFFF40", "#00000080", "#fff", "#abc8",
+    "#ffffff", "#000000", "red", "navyblue", "lightsteelblue2"
+]
+
+OPTIONS = [
+    {"hex": True},
+    {"hex": True, "alpha": True},
+    {"hex": True, "compress": True},
+    {"hex": True, "upper": True, "compress": True},
+    {"hex": True, "names": True}
+]
+
+
+def reference_to_string(color, alpha=None, fit=True, **options):
+    """The original `SRGBX11.to_string`."""
+
+    from lib.tmtheme import hex2name
+    from mdpopups.coloraide.spaces import _parse
+    from mdpopups.coloraide import util
+
+    re_compress = re.compile(r'(?i)^#({hex})\1({hex})\2({hex})\3(?:({hex})\4)?$'.format(**_parse.COLOR_PARTS))
+
+    value = ''
+    a = util.no_nan(color.alpha)
+    alpha = alpha is not False and (alpha is True or a < 1.0)
+    hex_upper = options.get("upper", False)
+    compress = options.get("compress", False)
+    method = None if not isinstance(fit, str) else fit
+    coords = util.no_nan(color.fit(method=method).coords())
+
+    template = "#{:02x}{:02x}{:02x}{:02x}" if alpha else "#{:02x}{:02x}{:02x}"
+    if hex_upper:
+        template = template.upper()
+
+    if alpha:
+        h = template.format(
+            int(util.round_half_up(coords[0] * 255.0)),
+            int(util.round_half_up(coords[1] * 255.0)),
+            int(util.round_half_up(coords[2] * 255.0)),
+            int(util.round_half_up(util.no_nan(color.alpha) * 255.0))
+        )
+    else:
+        h = template.format(
+            int(util.round_half_up(coords[0] * 255.0)),
+            int(util.round_half_up(coords[1] * 255.0)),
+            int(util.round_half_up(coords[2] * 255.0))
+        )
+
+    value = h
+    if compress:
+        m = re_compress.match(value)
+        if m:
+            value = m.expand(r"#\1\2\3\4") if alpha else m.expand(r"#\1\2\3")
+
+    if options.get("names"):
+        length = len(h) - 1
+        index = int(length / 4)
+        if length in (8, 4) and h[-index:].lower() == ("f" * index):
+            h = h[:-index]
+        n = hex2name(h)
+        if n is not None:
+            value = n
+
+    return value
+
+
+def generate_tmtheme(rules):
+    """Generate a `tmTheme` with the given number of rules."""
+
+    parts = [TMTHEME_HEAD]
+    for index in range(rules):
+        parts.append(TMTHEME_RULE.format(index=index, fg=(index * 2654435761) & 0xFFFFFF, bg=index & 0xFFFFFF))
+    parts.append(TMTHEME_TAIL)
+    return ''.join(parts).encode('utf-8')
+
+
+def read_plistlib(content):
+    """Read the way `ColorSchemeMatcher` used to: strip comments, build the plist, then walk it."""
+
+    loads = getattr(plistlib, 'readPlistFromBytes', None) or plistlib.loads
+    obj = loads(XML_COMMENT_RE.sub(b'', content))
+    rules = [item for item in obj['settings']]
+    return obj, rules
+
+
+def read_incremental(content):
+    """Read with the incremental reader."""
+
+    from lib.tmtheme_reader import read_tmtheme
+
+    rules = []
+    obj = read_tmtheme(content, rules.append)
+    return obj, rules
+
+
+def measure(fn, content):
+    """Return the time and peak traced memory of `fn(content)`."""
+
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        fn(content)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def run_import(rules=20000):
+    """Compare reading a generated `tmTheme`."""
+
+    content = generate_tmtheme(rules)
+    print('Reading a {} rule tmTheme ({:.1f} MB)'.format(rules, len(content) / (1024.0 * 1024.0)))
+    for name, fn in (('plistlib', read_plistlib), ('incremental', read_incremental)):
+        # Time without tracing, then trace for memory.
+        start = time.perf_counter()
+        fn(content)
+        elapsed = time.perf_counter() - start
+        _, peak = measure(fn, content)
+        print('{:<12} {:>8.3f}s  {:>8.1f} MB peak'.format(name, elapsed, peak / (1024.0 * 1024.0)))
+    print('')
+
+
+def write_plistlib(obj):
+    """Write the way `ThemeTweaker` used to: serialize the whole tree with `plistlib`."""
+
+    dumps = getattr(plistlib, 'writePlistToBytes', None) or plistlib.dumps
+    return dumps(obj)
+
+
+def write_direct(obj):
+    """Write with the direct writer."""
+
+    from lib.tmtheme_writer import write_tmtheme
+
+    f = io.BytesIO()
+    write_tmtheme(f, {k: v for k, v in obj.items() if k != 'settings'}, iter(obj['settings']))
+    return f.getvalue()
+
+
+def run_export(rules=20000):
+    """Compare writing a generated `tmTheme` and return whether the output differs."""
+
+    obj, _ = read_plistlib(generate_tmtheme(rules))
+    print('Writing a {} rule tmTheme'.format(rules))
+    output = []
+    for name, fn in (('plistlib', write_plistlib), ('direct', write_direct)):
+        start = time.perf_counter()
+        output.append(fn(obj))
+        elapsed = time.perf_counter() - start
+        _, peak = measure(fn, obj)
+        print('{:<12} {:>8.3f}s  {:>8.1f} MB peak'.format(name, elapsed, peak / (1024.0 * 1024.0)))
+    identical = output[0] == output[1]
+    print('Output identical: {}'.format(identical))
+    print('')
+    return not identical
+
+
+def check():
+    """Compare the formatter with the original and return the number of differences."""
+
+    from lib.tmtheme import ColorSRGBX11
+
+    failures = 0
+    for value in COLORS:
+        color = ColorSRGBX11(value)
+        for options in OPTIONS:
+            expected = reference_to_string(color, **options)
+            actual = color.to_string(**options)
+            if expected != actual:
+                failures += 1
+                print('{} {}: expected {}, got {}'.format(value, options, expected, actual))
+    return failures
+
+
+def run(number=1000, repeat=5):
+    """Run the benchmark."""
+
+    from lib.tmtheme import ColorSRGBX11
+
+    colors = [ColorSRGBX11(value) for value in COLORS]
+    rows = [
+        (
+            'original to_string(hex=True)',
+            bench.best_of(lambda: [reference_to_string(c, hex=True) for c in colors], number, repeat) / len(colors)
+        ),
+        (
+            'to_string(hex=True)',
+            bench.best_of(lambda: [c.to_string(hex=True) for c in colors], number, repeat) / len(colors)
+        ),
+        (
+            'parse + to_string(hex=True)',
+            bench.best_of(lambda: [ColorSRGBX11(v).to_string(hex=True) for v in COLORS], number, repeat) / len(COLORS)
+        )
+    ]
+    bench.report('tmTheme colors (per color)', rows)
+
+
+def main():
+    """Main."""
+
+    parser = argparse.ArgumentParser(prog='bench_tmtheme', description='tmTheme benchmark.')
+    bench.add_arguments(parser)
+    parser.add_argument('--rules', type=int, default=20000, help="Rules in the generated tmTheme.")
+    args = parser.parse_args()
+    bench.add_dependency_paths(args.deps)
+    run_import(args.rules)
+    failures = run_export(args.rules)
+    failures += check()
+    run(args.number, args.repeat)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+Tweak pipeline benchmark.
+
+Times `ColorSchemeTweaker.tweak` per filter and per filter chain length on a generated (resolved)
+color scheme, `ColorTweaker.tweak` per color, and `ThemeTweaker.run/undo/redo` against a temporary
+data folder served by the headless `sublime` stand-in, with undo histories of 10, 100 and 1,000
+steps (undo and redo replay the whole history on the original scheme). Reports p50/p95 latency and
+peak allocated memory (measured in a separate, untimed call under `tracemalloc`).
+
+    python -m tools.bench_tweak --deps /path/to/Packages/mdpopups/st3 --rules 1000 --json tweak.json
+
+`ThemeTweaker` needs the plugin's dependencies (mdpopups); if they can't be imported, its
+benchmarks are skipped.
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from lib import latency
+from . import bench
+from . import bench_matcher
+from . import headless
+
+FILTERS = [
+    'brightness(1.1)', 'brightness(0.9)@bg', 'saturation(0.8)', 'hue(30)', 'contrast(1.2)',
+    'colorize(200)', 'glow(0.2)', 'sepia', 'grayscale', 'invert'
+]
+
+COLORS = [
+    ('#272822', None), (None, '#272822'), ('#f8f8f2', '#272822'), ('#49483e80', '#272822'),
+    ('#a6e22e', '#3e3d3280'), ('#fff', '#000')
+]
+
+CHAINS = (1, 2, 4, 8, 16)
+
+HISTORIES = (10, 100, 1000)
+
+
+def generate_scheme(rules=1000, seed=0):
+    """Generate a resolved scheme, as `ColorSchemeMatcher.get_scheme_obj` returns it."""
+
+    rand = random.Random(seed)
+    scheme = {
+        "name": "Bench",
+        "variables": {},
+        "globals": {
+            "background": "#272822",
+            "foreground": "#f8f8f2",
+            "caret": "#f8f8f0",
+            "selection": "#49483ecc",
+            "line_highlight": "#3e3d3233",
+            "gutter": "#272822"
+        },
+        "rules": []
+    }
+    for number in range(rules):
+        rule = {"name": "Rule {}".format(number), "scope": "source.gen keyword.rule{}".format(number)}
+        value = rand.random()
+        if value < 0.05:
+            rule['foreground'] = ['#{:06x}'.format(rand.getrandbits(24)) for _ in range(3)]
+        elif value < 0.15:
+            rule['foreground'] = '#{:08x}'.format(rand.getrandbits(32))
+        else:
+            rule['foreground'] = '#{:06x}'.format(rand.getrandbits(24))
+        if rand.random() < 0.2:
+            rule['background'] = '#{:06x}'.format(rand.getrandbits(24))
+        if rand.random() < 0.1:
+            rule['selection_foreground'] = '#{:06x}'.format(rand.getrandbits(24))
+        scheme['rules'].append(rule)
+    return scheme
+
+
+def measure(fn, samples=20, setup=None):
+    """Time `fn` (after an untimed `setup`) and measure its peak allocations in one more call."""
+
+    times = []
+    for _ in range(samples):
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - start)
+
+    arg = setup() if setup is not None else None
+    tracemalloc.start()
+    try:
+        fn(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    times.sort()
+    return {
+        "p50": latency.percentile(times, 50),
+        "p95": latency.percentile(times, 95),
+        "peak_bytes": peak,
+        "samples": samples
+    }
+
+
+def print_rows(title, rows):
+    """Print `(name, measurement)` rows."""
+
+    print(title)
+    print('-' * len(title))
+    width = max([len(name) for name, _ in rows] + [4])
+    for name, value in rows:
+        print(
+            '{:<{width}}  p50 {:>10.3f} ms  p95 {:>10.3f} ms  peak {:>10.1f} KiB'.format(
+                name, value['p50'] * 1e3, value['p95'] * 1e3, value['peak_bytes'] / 1024.0, width=width
+            )
+        )
+    print('')
+
+
+def run_tweak(rules, samples):
+    """Benchmark `ColorSchemeTweaker.tweak` and `ColorTweaker.tweak`."""
+
+    from lib.color_scheme_tweaker import ColorSchemeTweaker, ColorTweaker
+
+    scheme = generate_scheme(rules)
+    results = {"filters": {}, "chains": {}, "colors": {}}
+
+    def tweak(filters):
+        """Tweak a fresh copy of the scheme."""
+
+        return lambda obj: ColorSchemeTweaker().tweak(obj, filters)
+
+    def fresh():
+        """Copy the scheme (`tweak` modifies it)."""
+
+        return copy.deepcopy(scheme)
+
+    for name in FILTERS:
+        results["filters"][name] = measure(tweak(name), samples, fresh)
+    print_rows('ColorSchemeTweaker.tweak per filter ({} rules)'.format(rules), list(results["filters"].items()))
+
+    for length in CHAINS:
+        chain = ';'.join(FILTERS[i % len(FILTERS)] for i in range(length))
+        results["chains"][str(length)] = measure(tweak(chain), samples, fresh)
+    print_rows(
+        'ColorSchemeTweaker.tweak per chain length ({} rules)'.format(rules),
+        [('{} filters'.format(k), v) for k, v in results["chains"].items()]
+    )
+
+    tweaker = ColorTweaker('brightness(1.1);saturation(0.9);hue(15)')
+    tweaker.bground = "#272822"
+    for fg, bg in COLORS:
+        name = '{} on {}'.format(fg, bg)
+        results["colors"][name] = measure(lambda _, fg=fg, bg=bg: tweaker.tweak(fg, bg), samples * 50)
+    print_rows('ColorTweaker.tweak per color (3 filters)', list(results["colors"].items()))
+    return results
+
+
+def run_history(data, rules, samples):
+    """Benchmark `ThemeTweaker.run/undo/redo` with different history lengths."""
+
+    import importlib
+
+    try:
+        plugin = headless.load_plugin()
+        # The plugin only imports the color scheme modules (and mdpopups) when first used.
+        importlib.import_module(plugin.__package__ + '.lib.color_scheme_matcher')
+    except ImportError as e:
+        print('ThemeTweaker skipped: {}'.format(e))
+        print('')
+        return None
+
+    scheme = bench_matcher.generate(data, rules, overrides=1)
+    headless.load_settings(plugin.PREFERENCES).set(plugin.SCHEME, scheme)
+    plugin.ThemeTweaker().run('brightness(1.0)')
+    headless.run_timeouts()
+    tweaks = plugin.packages_path(os.path.join(plugin.TEMP_PATH, plugin.TWEAK_SETTINGS))
+
+    def set_history(length):
+        """Set the undo history, clearing redo."""
+
+        with open(tweaks, 'r') as f:
+            settings = json.load(f)
+        settings['scheme_map']['undo'] = ';'.join(FILTERS[i % len(FILTERS)] for i in range(length))
+        settings['scheme_map']['redo'] = ''
+        with open(tweaks, 'w') as f:
+            json.dump(settings, f)
+
+    def call(method, *args):
+        """Call the `ThemeTweaker` method and run what it defers."""
+
+        def fn(_):
+            """Call it."""
+
+            getattr(plugin.ThemeTweaker(), method)(*args)
+            headless.run_timeouts()
+        return fn
+
+    results = {}
+    for length in HISTORIES:
+        results[str(length)] = {
+            "run": measure(call('run', 'hue(1)'), samples, lambda: set_history(length)),
+            "undo": measure(call('undo'), samples, lambda: set_history(length)),
+            # Redo needs an undone step, so undo (untimed) first.
+            "redo": measure(call('redo'), samples, lambda: call('undo')(set_history(length)))
+        }
+        print_rows(
+            'ThemeTweaker with {} steps of history ({} rules)'.format(length, rules),
+            list(results[str(length)].items())
+        )
+    return results
+
+
+def main():
+    """Main."""
+
+    parser = argparse.ArgumentParser(prog='bench_tweak', description='Tweak pipeline benchmark.')
+    bench.add_arguments(parser)
+    parser.add_argument('--rules', type=int, default=1000, help="Rules in the generated scheme.")
+    parser.add_argument('--samples', type=int, default=20, help="Timed calls per measurement.")
+    parser.add_argument('--json', default=None, help="Write the results as JSON to the file.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data:
+        headless.install(data)
+        bench.add_dependency_paths(args.deps)
+        results = {
+            "options": {"rules": args.rules, "samples": args.samples},
+            "tweak": run_tweak(args.rules, args.samples),
+            "history": run_history(data, args.rules, args.samples)
+        }
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+JSON format validator benchmark.
+
+Validates a generated color scheme with comments and dangling commas (so there are many
+violations to look up lines for) with `tests.validate_json_format.CheckJsonFormat`. The original
+linear line lookup is run on a smaller file alongside the `bisect` lookup to check they report
+the same violations, then the `bisect` lookup is timed on the full size file.
+
+    python -m tools.bench_validate_json --lines 100000
+"""
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+from . import bench
+
+RULE = '''        // Rule {index}
+        {{
+            "name": "Rule {index}",
+            "scope": "source.generated{index}",
+            "foreground": "#{fg:06x}",
+        }},
+'''
+
+
+def generate(lines):
+    """Generate a color scheme of about the given number of lines."""
+
+    parts = ['{\n    "name": "Generated",\n    "rules":\n    [\n']
+    index = 0
+    while index * 7 < lines:
+        parts.append(RULE.format(index=index, fg=(index * 2654435761) & 0xFFFFFF))
+        index += 1
+    parts.append('    ]\n}\n')
+    return ''.join(parts)
+
+
+def linear_checker():
+    """Get the validator with the original linear line lookup."""
+
+    from tests.validate_json_format import CheckJsonFormat
+
+    class LinearCheckJsonFormat(CheckJsonFormat):
+        """Validator with the original line index."""
+
+        def index_lines(self, text):
+            """Index the char range of each line."""
+
+            self.line_range = []
+            count = 1
+            last = 0
+            for m in re.finditer('\n', text):
+                self.line_range.append((last, m.end(0) - 1, count))
+                last = m.end(0)
+                count += 1
+
+        def get_line(self, pt):
+            """Get the line from char index."""
+
+            line = None
+            for r in self.line_range:
+                if pt >= r[0] and pt <= r[1]:
+                    line = r[2]
+                    break
+            return line
+
+    return LinearCheckJsonFormat(False, False)
+
+
+def validate(checker, file_name):
+    """Validate the file and return the report and the time taken."""
+
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        start = time.perf_counter()
+        checker.check_format(file_name)
+        elapsed = time.perf_counter() - start
+    return out.getvalue(), elapsed
+
+
+def run(lines=100000, reference_lines=10000):
+    """Run the benchmark and return whether the reports differ."""
+
+    from tests.validate_json_format import CheckJsonFormat
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for count, compare in ((reference_lines, True), (lines, False)):
+            file_name = os.path.join(tmp, 'scheme-{}.sublime-color-scheme'.format(count))
+            with open(file_name, 'w', encoding='utf-8', newline='\n') as f:
+                f.write(generate(count))
+
+            report, elapsed = validate(CheckJsonFormat(False, False), file_name)
+            print('{} lines, {} violations'.format(count, report.count('\n')))
+            print('{:<8} {:>8.3f}s'.format('bisect', elapsed))
+            if compare:
+                expected, elapsed = validate(linear_checker(), file_name)
+                print('{:<8} {:>8.3f}s'.format('linear', elapsed))
+                if report != expected:
+                    failures += 1
+                    print('Reports differ')
+            print('')
+    return failures
+
+
+def main():
+    """Main."""
+
+    parser = argparse.ArgumentParser(prog='bench_validate_json', description='JSON format validator benchmark.')
+    parser.add_argument('--lines', type=int, default=100000, help="Lines in the generated file.")
+    parser.add_argument(
+        '--reference-lines', type=int, default=10000, help="Lines in the file also checked with the linear lookup."
+    )
+    args = parser.parse_args()
+    bench.add_dependency_paths()
+    return 1 if run(args.lines, args.reference_lines) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
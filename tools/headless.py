@@ -0,0 +1,406 @@
+r"""
+Headless `sublime` API stand-in.
+
+Provides the parts of the `sublime` module the color scheme engine uses (`load_resource`,
+`load_binary_resource`, `find_resources`, `decode_value`, `encode_value`, `score_selector`,
+`version`, `platform` and `packages_path`) over a local data folder laid out like Sublime's,
+with packages as folders under `<data>/Packages`. `install` registers it as the `sublime` module,
+so `ColorSchemeMatcher`, `ColorSchemeTweaker` and `st_colormod` can be run with plain Python.
+
+    from tools import headless
+    headless.install('/path/to/data', version='4169')
+    from lib.color_scheme_matcher import ColorSchemeMatcher
+
+Enough of the rest of the API (settings, timeouts, messages and a `sublime_plugin` with the command
+base classes) is provided to load the plugin itself with `load_plugin`. Timeouts are queued and
+only run, in order and without waiting, when `run_timeouts` is called.
+
+It can also be run directly to look up resources, score selectors and resolve scope colors:
+
+    python -m tools.headless --data /path/to/data resources '*.tmTheme'
+    python -m tools.headless score 'source.python string.quoted' 'string - comment'
+    python -m tools.headless --data /path/to/data --deps Packages/mdpopups/st3 \
+        scheme 'Packages/Color Scheme - Default/Monokai.sublime-color-scheme' comment string
+"""
+import argparse
+import fnmatch
+import json
+import os
+import re
+import sys
+import types
+from . import bench
+
+DEFAULT_VERSION = "4169"
+
+RE_SELECTOR_SPLIT = re.compile(r'\s*[,|]\s*')
+RE_EXCLUDE_SPLIT = re.compile(r'\s+-\s*|\s*-\s+')
+
+_data_path = None
+_version = DEFAULT_VERSION
+_platform = "linux"
+_settings = {}
+_timeouts = []
+
+# Status and error messages shown by the plugin.
+messages = []
+
+
+class Settings(object):
+    """Settings, loaded from all the resources of the same name."""
+
+    def __init__(self, name):
+        """Initialize."""
+
+        self.name = name
+        self.values = {}
+        self.callbacks = {}
+
+    def get(self, key, default=None):
+        """Get a setting."""
+
+        return self.values.get(key, default)
+
+    def has(self, key):
+        """Check if a setting is set."""
+
+        return key in self.values
+
+    def set(self, key, value):  # noqa A003
+        """Set a setting."""
+
+        self.values[key] = value
+        for callback in list(self.callbacks.values()):
+            callback()
+
+    def erase(self, key):
+        """Erase a setting."""
+
+        self.values.pop(key, None)
+
+    def add_on_change(self, tag, callback):
+        """Call the callback when a setting changes."""
+
+        self.callbacks[tag] = callback
+
+    def clear_on_change(self, tag):
+        """Remove the change callback."""
+
+        self.callbacks.pop(tag, None)
+
+
+class ApplicationCommand(object):
+    """Application command."""
+
+
+class WindowCommand(object):
+    """Window command."""
+
+    def __init__(self, window):
+        """Initialize."""
+
+        self.window = window
+
+
+class TextCommand(object):
+    """Text command."""
+
+    def __init__(self, view):
+        """Initialize."""
+
+        self.view = view
+
+
+class EventListener(object):
+    """Event listener."""
+
+
+def install(data_path, version=None, platform=None):
+    """Point the stand-in at the data folder and register it as the `sublime` module."""
+
+    global _data_path
+    global _version
+    global _platform
+
+    _data_path = os.path.abspath(data_path)
+    if version is not None:
+        _version = str(version)
+    if platform is not None:
+        _platform = platform
+    _settings.clear()
+    del _timeouts[:]
+    del messages[:]
+    bench.add_dependency_paths()
+    plugin = types.ModuleType('sublime_plugin')
+    for cls in (ApplicationCommand, WindowCommand, TextCommand, EventListener):
+        setattr(plugin, cls.__name__, cls)
+    sys.modules['sublime'] = sys.modules[__name__]
+    sys.modules['sublime_plugin'] = plugin
+    return sys.modules[__name__]
+
+
+def load_plugin(name='ThemeTweaker'):
+    """Import `theme_tweaker` from the repository as the package it is installed as in `Packages`."""
+
+    import importlib
+
+    if name not in sys.modules:
+        package = types.ModuleType(name)
+        package.__path__ = [bench.ROOT]
+        sys.modules[name] = package
+    return importlib.import_module(name + '.theme_tweaker')
+
+
+def version():
+    """Get the Sublime version."""
+
+    return _version
+
+
+def platform():
+    """Get the platform."""
+
+    return _platform
+
+
+def packages_path():
+    """Get the `Packages` folder."""
+
+    return os.path.join(_data_path, 'Packages')
+
+
+def _package_order(name):
+    """Sort packages the way Sublime loads them: `Default` first, `User` last."""
+
+    return (0 if name == 'Default' else 2 if name == 'User' else 1, name.lower())
+
+
+def _resource_path(name):
+    """Get the file path of a `Packages/...` resource."""
+
+    if not name.startswith('Packages/'):
+        raise IOError("resource not found")
+    pth = os.path.join(packages_path(), os.path.normpath(name[9:]))
+    if not os.path.isfile(pth):
+        raise IOError("resource not found")
+    return pth
+
+
+def find_resources(pattern):
+    """Find resources whose file name matches the pattern."""
+
+    results = []
+    root = packages_path()
+    if not os.path.isdir(root):
+        return results
+    for package in sorted(os.listdir(root), key=_package_order):
+        package_path = os.path.join(root, package)
+        if not os.path.isdir(package_path):
+            continue
+        for base, dirnames, filenames in os.walk(package_path):
+            dirnames.sort()
+            for filename in sorted(fnmatch.filter(filenames, pattern)):
+                rel = os.path.relpath(os.path.join(base, filename), root)
+                results.append('Packages/' + rel.replace(os.sep, '/'))
+    return results
+
+
+def load_binary_resource(name):
+    """Load a resource as bytes."""
+
+    with open(_resource_path(name), 'rb') as f:
+        return f.read()
+
+
+def load_resource(name):
+    """Load a resource as text (with Unix line endings, like Sublime)."""
+
+    return load_binary_resource(name).decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def decode_value(data):
+    """Decode JSON, allowing comments and dangling commas, like Sublime."""
+
+    from lib.file_strip.json import load_json
+
+    return load_json(data)
+
+
+def encode_value(value, pretty=False):
+    """Encode a value as JSON."""
+
+    if pretty:
+        return json.dumps(value, indent=4, ensure_ascii=False)
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+def load_settings(name):
+    """Load settings (the same object is returned for the same name)."""
+
+    if name not in _settings:
+        settings = Settings(name)
+        for resource in find_resources(name):
+            try:
+                settings.values.update(decode_value(load_resource(resource)))
+            except Exception:
+                pass
+        _settings[name] = settings
+    return _settings[name]
+
+
+def save_settings(name):
+    """Save settings to the `User` package."""
+
+    folder = os.path.join(packages_path(), 'User')
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(os.path.join(folder, name), 'w', encoding='utf-8') as f:
+        f.write(encode_value(load_settings(name).values, pretty=True))
+
+
+def set_timeout(callback, delay=0):
+    """Queue the callback until `run_timeouts` is called."""
+
+    _timeouts.append(callback)
+
+
+def set_timeout_async(callback, delay=0):
+    """Queue the callback until `run_timeouts` is called."""
+
+    _timeouts.append(callback)
+
+
+def run_timeouts():
+    """Run queued callbacks (including any they queue) and return how many ran."""
+
+    count = 0
+    while _timeouts:
+        _timeouts.pop(0)()
+        count += 1
+    return count
+
+
+def status_message(msg):
+    """Record a status message."""
+
+    messages.append(msg)
+
+
+def error_message(msg):
+    """Record an error message."""
+
+    messages.append(msg)
+
+
+def run_command(cmd, args=None):
+    """Ignore application commands."""
+
+
+def ui_info():
+    """Get the UI info, resolving the color scheme from the preferences."""
+
+    scheme = load_settings('Preferences.sublime-settings').get('color_scheme', '')
+    return {"color_scheme": {"value": scheme, "resolved_value": scheme}}
+
+
+def _score_atom(selector_atom, scope_atom):
+    """Score a selector atom (`string.quoted`) against a scope atom (`string.quoted.double`)."""
+
+    wanted = selector_atom.split('.')
+    parts = scope_atom.split('.')
+    if len(wanted) > len(parts) or parts[:len(wanted)] != wanted:
+        return 0
+    return len(wanted)
+
+
+def _score_path(selector_atoms, scope_atoms):
+    """
+    Score a descendant selector (`source string`) against a scope stack.
+
+    Selector atoms must match scope atoms in order, but not necessarily next to each other. Matching
+    is done from the deepest atom out, so the deepest match is kept. Each matched atom scores its
+    segment count shifted by its depth, so a deeper match always wins over a shallower one, and more
+    segments win at the same depth.
+    """
+
+    if not selector_atoms:
+        return 0
+    score = 0
+    index = len(scope_atoms) - 1
+    for selector_atom in reversed(selector_atoms):
+        while index >= 0:
+            segments = _score_atom(selector_atom, scope_atoms[index])
+            index -= 1
+            if segments:
+                score += min(segments, 7) << (3 * (index + 1))
+                break
+        else:
+            return 0
+    return score
+
+
+def score_selector(scope, selector):
+    """
+    Score how well a selector matches a scope, `0` meaning it doesn't match.
+
+    Supports alternatives (`,`, `|`), descendants (`a b`) and exclusions (`a - b`), which is what
+    color schemes use. Of the alternatives, the best score is returned.
+    """
+
+    scope_atoms = scope.split()
+    best = 0
+    for alternative in RE_SELECTOR_SPLIT.split(selector.strip().strip('()')):
+        parts = RE_EXCLUDE_SPLIT.split(alternative.strip())
+        score = _score_path(parts[0].split(), scope_atoms) if parts[0] else 0
+        if score and any(_score_path(part.split(), scope_atoms) for part in parts[1:]):
+            score = 0
+        if score > best:
+            best = score
+    return best
+
+
+def main():
+    """Main."""
+
+    parser = argparse.ArgumentParser(prog='headless', description='Headless Sublime API stand-in.')
+    parser.add_argument('--data', default='.', help="Data folder containing 'Packages'.")
+    parser.add_argument('--version', default=DEFAULT_VERSION, help="Sublime version to report.")
+    parser.add_argument(
+        '--deps', default=None,
+        help="'%s' separated dependency folders (default: ${%s})" % (os.pathsep, bench.DEPS_ENV)
+    )
+    subparsers = parser.add_subparsers(dest='command')
+    resources = subparsers.add_parser('resources', help="List resources matching a pattern.")
+    resources.add_argument('pattern')
+    score = subparsers.add_parser('score', help="Score a selector against a scope.")
+    score.add_argument('scope')
+    score.add_argument('selector')
+    scheme = subparsers.add_parser('scheme', help="Resolve the colors of scopes in a color scheme.")
+    scheme.add_argument('scheme')
+    scheme.add_argument('scopes', nargs='*')
+    args = parser.parse_args()
+
+    install(args.data, args.version)
+    bench.add_dependency_paths(args.deps)
+    if args.command == 'resources':
+        for resource in find_resources(args.pattern):
+            print(resource)
+    elif args.command == 'score':
+        print(score_selector(args.scope, args.selector))
+    elif args.command == 'scheme':
+        from lib.color_scheme_matcher import ColorSchemeMatcher
+
+        csm = ColorSchemeMatcher(args.scheme)
+        for name in ('foreground', 'background'):
+            print('{}: {}'.format(name, csm.get_special_color(name)))
+        for scope in args.scopes:
+            style = csm.guess_color(scope)
+            print('{}: {} on {} {}'.format(scope, style.fg_simulated, style.bg_simulated, style.style or ''))
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Verify `ColorMod.min_contrast` against the original HWB bisection (in `colormod_baseline`).
+
+Generates random 8 bit color pairs and targets, solves each with both implementations and
+reports how many results differ along with the time taken by each.
+
+    python -m tools.verify_min_contrast --deps /path/to/Packages/mdpopups/st3 --count 100000
+"""
+import argparse
+import random
+import sys
+import time
+from . import bench
+
+
+def corpus(count, seed):
+    """Generate `(color1, color2, target)` hex string triples."""
+
+    rand = random.Random(seed)
+    for _ in range(count):
+        yield (
+            '#{:06x}'.format(rand.randint(0, 0xFFFFFF)),
+            '#{:06x}'.format(rand.randint(0, 0xFFFFFF)),
+            rand.choice((3.0, 4.5, 7.0, round(rand.uniform(1.0, 21.0), 2)))
+        )
+
+
+def solve(module, cases):
+    """Solve `(color1, color2, target)` cases with the color-mod module and return the hex results."""
+
+    solver = module.ColorMod().min_contrast
+    results = []
+    for c1, c2, target in cases:
+        color = module.Color(c1)
+        solver(color, module.Color(c2), target)
+        results.append(color.to_string(hex=True))
+    return results
+
+
+def run(count=10000, seed=0):
+    """Compare the solvers and return the number of results that disagree by more than rounding."""
+
+    from lib import st_colormod
+    from . import colormod_baseline
+
+    cases = list(corpus(count, seed))
+    results = []
+    for module in (colormod_baseline, st_colormod):
+        start = time.perf_counter()
+        out = solve(module, cases)
+        results.append((out, time.perf_counter() - start))
+
+    (expected, ref_time), (actual, new_time) = results
+    exact = 0
+    rounding = 0
+    failures = []
+    for case, a, b in zip(cases, expected, actual):
+        if a == b:
+            exact += 1
+        elif max(abs(int(a[i:i + 2], 16) - int(b[i:i + 2], 16)) for i in (1, 3, 5)) <= 1:
+            rounding += 1
+        else:
+            failures.append((case, a, b))
+
+    print('Cases:           {}'.format(count))
+    print('Exact:           {}'.format(exact))
+    print('Off by one (8 bit channel): {}'.format(rounding))
+    print('Failures:        {}'.format(len(failures)))
+    for case, a, b in failures[:20]:
+        print('    {} -> expected {}, got {}'.format(case, a, b))
+    print('Bisection:       {:.3f}s'.format(ref_time))
+    print('Solver (cached): {:.3f}s'.format(new_time))
+    return len(failures)
+
+
+def main():
+    """Main."""
+
+    parser = argparse.ArgumentParser(prog='verify_min_contrast', description='Verify the min-contrast solver.')
+    parser.add_argument('--deps', default=None, help="Dependency folders (default: ${%s})" % bench.DEPS_ENV)
+    parser.add_argument('--count', type=int, default=10000, help="Number of random cases.")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+    bench.add_dependency_paths(args.deps)
+    return 1 if run(args.count, args.seed) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())